@@ -1,13 +1,12 @@
 """
 This file is an example of how to process streaming data.
 While you can process completely in the response handler this could leave the stream with a backlog.
-The preferred method is to use a shared list, shown here as "shared_list"
+The preferred method is to use a bounded buffer, shown here as "buffer"
 """
 from datetime import datetime
 import schwabdev
 import logging
 import dotenv
-import time
 import json
 import os
 
@@ -21,20 +20,20 @@ logging.basicConfig(level=logging.INFO)
 client = schwabdev.Client(os.getenv('app_key'), os.getenv('app_secret'), os.getenv('callback_url'))
 streamer = client.stream
 
-#define a response handler
-shared_list = []
-def response_handler(message):
-    shared_list.append(message)
+# define a buffer to hold messages, the buffer is used as the response handler
+# level one messages only carry the fields that changed, so none can be dropped: when full the stream waits for processing to catch up
+# ("drop_oldest" never waits but loses updates, only use it for data where the latest message replaces the older ones)
+buffer = schwabdev.StreamBuffer(maxsize=10000, policy="block")
 
 # start the stream and send in what symbols we want.
-streamer.start(response_handler)
+streamer.start(buffer)
 streamer.send(streamer.level_one_equities("AMD,INTC", "0,1,2,3,4,5,6,7,8"))
 
+last_dropped = 0
 
-while True: #proccessing on list is done here
-    #print the most recent message
-    while len(shared_list) > 0: # while there is still data to consume from the list
-        oldest_response = json.loads(shared_list.pop(0)) # get the oldest data from the list
+while True: #proccessing on buffer is done here
+    for message in buffer.drain(timeout=None): # wait for data then take everything queued in the buffer
+        oldest_response = json.loads(message)
         #print(oldest_response)
         for rtype, services in oldest_response.items():
             if rtype == "data":
@@ -53,4 +52,6 @@ while True: #proccessing on list is done here
             else:
                 #unidentified response type
                 print(oldest_response)
-    time.sleep(0.5) # slow down difference checking
\ No newline at end of file
+    if buffer.dropped != last_dropped: # only print when more messages were dropped, processing is too slow
+        last_dropped = buffer.dropped
+        print(f"Buffer stats: {buffer.stats()}")
\ No newline at end of file
@@ -1,2 +1,14 @@
 from .client import Client
+from .buffer import StreamBuffer
+from .dispatch import StreamDispatcher
+from .conflate import StreamConflator
+from .router import StreamRouter
+from .book import BookEngine
+from .bars import BarAggregator
+from .gaps import ChartGapFiller
+from .recorder import TickRecorder
+from .archive import TickArchive
+from .replay import StreamReplayer
+from .fanout import StreamPublisher
+from .quote_table import QuoteTable
 #from .stream import Stream
\ No newline at end of file
@@ -0,0 +1,513 @@
+"""
+This file contains a reader for recorded stream segments (memory mapped, indexed by time and symbol)
+Github: https://github.com/tylerebowers/Schwab-API-Python
+"""
+
+import os
+import json
+import mmap
+import zlib
+import heapq
+import bisect
+import logging
+import datetime
+import zoneinfo
+from .book import _numpy
+from . import recorder as fmt
+
+
+class Block:
+
+    def __init__(self, buffer, offset: int, header: tuple):
+        """
+        One block of a segment, the tables are decoded from the memory mapped file on first use (compressed blocks are decompressed first)
+        :param buffer: segment contents
+        :type buffer: mmap.mmap
+        :param offset: offset of the payload
+        :type offset: int
+        :param header: header values
+        :type header: tuple
+        """
+        (_, _, self.flags, self.n_frames, self.n_rows, self.n_index, self.n_strings, self.strings_bytes,
+         self.t_min, self.t_max, self.payload_bytes, self.crc) = header
+        self.ordered = bool(self.flags & fmt.ORDERED)           # whether frame times never decrease (set by the recorder)
+        self._buffer = buffer                                   # segment contents
+        self._offset = offset                                   # payload offset
+        self._tables = None                                     # (frames, rows, index, offsets, blob)
+        self._keys = None                                       # key string -> id
+        self._by_frame = None                                   # rows in frame order
+        self._bounds = None                                     # frame -> first row of the frame in _by_frame
+        self._strings = {}                                      # id -> decoded string
+
+    def _load(self) -> tuple:
+        """
+        Get the tables of the block
+        :return: (frames, rows, index, string offsets, string blob)
+        :rtype: tuple
+        """
+        if self._tables is None:
+            payload = memoryview(self._buffer)[self._offset:self._offset + self.payload_bytes]
+            if self.flags & fmt.COMPRESSED:
+                payload = memoryview(zlib.decompressobj().decompress(payload))
+            self._tables = fmt.unpack(payload, self.n_frames, self.n_rows, self.n_index, self.n_strings)
+        return self._tables
+
+    def by_frame(self) -> tuple:
+        """
+        Get the rows in frame order (computed once per block)
+        :return: (rows sorted by frame, first row of each frame (one more than there are frames))
+        :rtype: tuple
+        """
+        if self._by_frame is None:
+            np = _numpy()
+            rows = self.rows
+            self._by_frame = rows[np.argsort(rows["frame"], kind="stable")]
+            self._bounds = np.searchsorted(self._by_frame["frame"], np.arange(len(self.frames) + 1))
+        return self._by_frame, self._bounds
+
+    @property
+    def frames(self):
+        return self._load()[0]
+
+    @property
+    def rows(self):
+        return self._load()[1]
+
+    @property
+    def index(self):
+        return self._load()[2]
+
+    def string(self, sid: int) -> str | None:
+        """
+        Get a string from the block's string table
+        :param sid: string id (-1 = None)
+        :type sid: int
+        :return: string
+        :rtype: str | None
+        """
+        if sid < 0:
+            return None
+        value = self._strings.get(sid, None)
+        if value is None:
+            offsets, blob = self._load()[3:]
+            value = self._strings[sid] = bytes(blob[offsets[sid]:offsets[sid + 1]]).decode()
+        return value
+
+    def key_id(self, key: str) -> int | None:
+        """
+        Get the string id of a key (symbol) in this block
+        :param key: symbol
+        :type key: str
+        :return: string id or None if the key is not in the block
+        :rtype: int | None
+        """
+        if self._keys is None:  # built once per block
+            self._keys = {self.string(int(sid)): int(sid) for sid in self.index["key"] if sid >= 0}
+        return self._keys.get(key, None)
+
+    def value(self, row) -> any:
+        """
+        Decode the value of a row
+        :param row: row
+        :type row: numpy.void
+        :return: value
+        :rtype: any
+        """
+        kind, value = row["kind"], row["value"]
+        if kind == fmt.FLOAT:
+            return float(value)
+        if kind == fmt.INT:
+            return int(value)
+        if kind == fmt.BOOL:
+            return bool(value)
+        if kind == fmt.STR:
+            return self.string(int(value))
+        if kind == fmt.JSON:
+            return json.loads(self.string(int(value)))
+        return None
+
+    def field(self, row) -> str:
+        """
+        Get the field name of a row
+        :param row: row
+        :type row: numpy.void
+        :return: field name
+        :rtype: str
+        """
+        if row["flags"] & fmt.NAMED:
+            return self.string(int(row["field"]))
+        return str(row["field"])
+
+    def parts(self, service: str, start: int = None, end: int = None):
+        """
+        Rebuild the message parts of the block in order, frames are in receive order so a receive time range is found by binary search
+        :param service: service of the segment
+        :type service: str
+        :param start: start receive time (ms), None = from the beginning
+        :type start: int | None
+        :param end: end receive time (ms, inclusive), None = to the end
+        :type end: int | None
+        :return: iterator of (seq, recv_ns, part, parts, raw text | None, style, part dict | None)
+        :rtype: iterator
+        """
+        np = _numpy()
+        frames = self.frames
+        rows, bounds = self.by_frame()
+        recv_ns = frames["recv_ns"]
+        f0 = 0 if start is None else int(np.searchsorted(recv_ns, start * 1000000, "left"))
+        f1 = len(frames) if end is None else int(np.searchsorted(recv_ns, (end + 1) * 1000000, "left"))
+        for i in range(f0, f1):
+            frame = frames[i]
+            raw = self.string(int(frame["raw"]))
+            part = None
+            if raw is None:
+                entries = [{} for _ in range(int(frame["entries"]))]
+                for row in rows[bounds[i]:bounds[i + 1]]:
+                    entry = entries[row["entry"]]
+                    if not entry and row["key"] >= 0:  # the key is the first field, it is stored in the index
+                        entry["key"] = self.string(int(row["key"]))
+                    entry[self.field(row)] = self.value(row)
+                part = {"service": service, "timestamp": int(frame["ts"]), "command": self.string(int(frame["command"])), "content": entries}
+            yield int(frame["seq"]), int(frame["recv_ns"]), int(frame["part"]), int(frame["parts"]), raw, int(frame["style"]), part
+
+
+class Segment:
+
+    def __init__(self, path: str):
+        """
+        A memory mapped segment file, only the block headers are read when opened
+        :param path: path of the segment file
+        :type path: str
+        """
+        np = _numpy()
+        self.path = path                                        # file path
+        self.service = os.path.basename(path)[:-4]              # service name
+        self._file = open(path, "rb")
+        self._buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(path) else b""
+        self.blocks = [Block(self._buffer, offset, header) for offset, header in fmt.scan(self._buffer) if header[1] == fmt.VERSION]
+        self.t_min = np.array([b.t_min for b in self.blocks], dtype=np.int64)  # sparse time index (per block)
+        self.t_max = np.array([b.t_max for b in self.blocks], dtype=np.int64)
+
+    def parts(self, start: int = None, end: int = None):
+        """
+        Rebuild the message parts of all blocks in order, only the blocks received between start and end are decoded
+        (blocks are written in receive order, so the first one is found by binary search)
+        :param start: start receive time (ms), None = from the beginning
+        :type start: int | None
+        :param end: end receive time (ms, inclusive), None = to the end
+        :type end: int | None
+        :return: iterator of (seq, recv_ns, part, parts, raw text | None, style, part dict | None)
+        :rtype: iterator
+        """
+        blocks = [block for block in self.blocks if block.n_frames]
+        first = 0 if start is None else bisect.bisect_left(blocks, start, key=lambda block: int(block.frames["recv_ns"][-1]) // 1000000)
+        for block in blocks[first:]:
+            yield from block.parts(self.service, start, end)
+            if end is not None and int(block.frames["recv_ns"][-1]) // 1000000 > end:
+                break  # the following blocks were received later
+
+    def blocks_between(self, start: int = None, end: int = None) -> list:
+        """
+        Get the blocks that may have data between two times
+        :param start: start time (ms), None = from the beginning
+        :type start: int | None
+        :param end: end time (ms, inclusive), None = to the end
+        :type end: int | None
+        :return: list of blocks
+        :rtype: list
+        """
+        np = _numpy()
+        mask = np.ones(len(self.blocks), dtype=bool)
+        if start is not None:
+            mask &= self.t_max >= start
+        if end is not None:
+            mask &= self.t_min <= end
+        return [self.blocks[i] for i in np.flatnonzero(mask)]
+
+    def close(self):
+        """
+        Close the segment (the memory map stays open until views returned by queries are released)
+        """
+        for block in self.blocks:
+            block._tables = None
+        if isinstance(self._buffer, mmap.mmap):
+            try:
+                self._buffer.close()
+            except BufferError:
+                pass  # views of the file are still in use
+        self._file.close()
+
+
+class TickArchive:
+
+    def __init__(self, directory: str, timezone: str = "America/New_York"):
+        """
+        Initialize a reader for segments written by TickRecorder
+        Segments are memory mapped when first used, each block is decoded once when first queried and queries return numpy views of its tables.
+        :param directory: directory the recorder wrote into
+        :type directory: str
+        :param timezone: timezone of the recorder (decides the day of a time)
+        :type timezone: str
+        """
+        _numpy()  # fail early if numpy is missing
+        self.directory = directory                              # segment directory
+        self._timezone = zoneinfo.ZoneInfo(timezone)            # timezone for days
+        self._segments = {}                                     # (day, service) -> Segment
+        self._logger = logging.getLogger("Schwabdev.Archive")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def days(self) -> list:
+        """
+        Get the recorded days
+        :return: list of days (YYYY-MM-DD)
+        :rtype: list
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(d for d in os.listdir(self.directory) if os.path.isdir(os.path.join(self.directory, d)))
+
+    def services(self, day: str) -> list:
+        """
+        Get the recorded services of a day
+        :param day: day (YYYY-MM-DD)
+        :type day: str
+        :return: list of services
+        :rtype: list
+        """
+        path = os.path.join(self.directory, day)
+        return sorted(f[:-4] for f in os.listdir(path) if f.endswith(".seg")) if os.path.isdir(path) else []
+
+    def segment(self, day: str, service: str) -> Segment | None:
+        """
+        Get (open) the segment of a day and service
+        :param day: day (YYYY-MM-DD)
+        :type day: str
+        :param service: service name
+        :type service: str
+        :return: segment or None if there is no recording
+        :rtype: Segment | None
+        """
+        segment = self._segments.get((day, service), None)
+        if segment is None:
+            path = os.path.join(self.directory, day, f"{service}.seg")
+            if not os.path.exists(path):
+                return None
+            segment = self._segments[(day, service)] = Segment(path)
+        return segment
+
+    def _ms(self, value) -> int | None:
+        """
+        Convert a time to ms since epoch
+        :param value: time (datetime, seconds as float, or ms as int)
+        :type value: datetime.datetime | float | int | None
+        :return: ms since epoch
+        :rtype: int | None
+        """
+        if value is None or isinstance(value, int):
+            return value
+        if isinstance(value, datetime.datetime):
+            if value.tzinfo is None:
+                value = value.replace(tzinfo=self._timezone)
+            return int(value.timestamp() * 1000)
+        return int(value * 1000)
+
+    def _days(self, start: int | None, end: int | None) -> list:
+        """
+        Get the recorded days between two times
+        :param start: start time (ms) or None
+        :type start: int | None
+        :param end: end time (ms) or None
+        :type end: int | None
+        :return: list of days
+        :rtype: list
+        """
+        days = self.days()
+        if start is not None:
+            first = datetime.datetime.fromtimestamp(start / 1000, self._timezone).strftime("%Y-%m-%d")
+            days = [d for d in days if d >= first]
+        if end is not None:
+            last = datetime.datetime.fromtimestamp(end / 1000, self._timezone).strftime("%Y-%m-%d")
+            days = [d for d in days if d <= last]
+        return days
+
+    def query(self, service: str, key: str = None, start=None, end=None) -> list:
+        """
+        Get the rows of a service (and key) between two times, using the block and key indexes and binary search
+        :param service: service name
+        :type service: str
+        :param key: symbol, None = all symbols
+        :type key: str | None
+        :param start: start time (datetime (naive = archive timezone), seconds as float, or ms as int), None = from the beginning
+        :type start: datetime.datetime | float | int | None
+        :param end: end time (inclusive), None = to the end
+        :type end: datetime.datetime | float | int | None
+        :return: list of (block, rows) where rows is a numpy view of the block's rows (a copy if the block's times are not in order), rows of all symbols are in frame order
+        :rtype: list
+        """
+        np = _numpy()
+        start, end = self._ms(start), self._ms(end)
+        results = []
+        for day in self._days(start, end):
+            segment = self.segment(day, service)
+            if segment is None:
+                continue
+            for block in segment.blocks_between(start, end):
+                ts = block.frames["ts"]
+                ordered = block.ordered
+                if ordered:  # frame range by binary search
+                    f0 = 0 if start is None else int(np.searchsorted(ts, start, "left"))
+                    f1 = len(ts) if end is None else int(np.searchsorted(ts, end, "right"))
+                if key is None:
+                    rows, bounds = block.by_frame()
+                    if ordered:  # the rows of a frame range are a slice
+                        rows = rows[int(bounds[f0]):int(bounds[f1])]
+                    else:
+                        rows = rows[self._in_range(ts[rows["frame"]], start, end)]
+                else:
+                    sid = block.key_id(key)
+                    if sid is None:
+                        continue
+                    index = block.index
+                    entry = index[int(np.searchsorted(index["key"], sid))]
+                    if (start is not None and entry["t1"] < start) or (end is not None and entry["t0"] > end):
+                        continue
+                    rows = block.rows[int(entry["start"]):int(entry["stop"])]
+                    if ordered:  # the key's rows are in frame order, so its time range is a slice
+                        frame = rows["frame"]
+                        rows = rows[int(np.searchsorted(frame, f0, "left")):int(np.searchsorted(frame, f1, "left"))]
+                    else:
+                        rows = rows[self._in_range(ts[rows["frame"]], start, end)]
+                if len(rows):
+                    results.append((block, rows))
+        return results
+
+    @staticmethod
+    def _in_range(times, start: int | None, end: int | None):
+        """
+        Mask of times between start and end (inclusive)
+        """
+        mask = times == times
+        if start is not None:
+            mask &= times >= start
+        if end is not None:
+            mask &= times <= end
+        return mask
+
+    def series(self, service: str, key: str, field: int | str, start=None, end=None) -> tuple:
+        """
+        Get the values of one numeric field of a key between two times
+        :param service: service name
+        :type service: str
+        :param key: symbol
+        :type key: str
+        :param field: field number (e.g. 3 for the last price of LEVELONE_EQUITIES)
+        :type field: int | str
+        :param start: start time, see query
+        :type start: datetime.datetime | float | int | None
+        :param end: end time (inclusive), see query
+        :type end: datetime.datetime | float | int | None
+        :return: (times in ms, values) arrays
+        :rtype: tuple
+        """
+        np = _numpy()
+        field = int(field)
+        times, values = [], []
+        for block, rows in self.query(service, key, start, end):
+            mask = (rows["field"] == field) & (rows["flags"] & fmt.NAMED == 0)
+            selected = rows[mask]
+            times.append(block.frames["ts"][selected["frame"]])
+            values.append(selected["value"])
+        if not times:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        return np.concatenate(times), np.concatenate(values)
+
+    def updates(self, service: str, key: str = None, start=None, end=None):
+        """
+        Get the decoded updates of a service (and key) between two times
+        :param service: service name
+        :type service: str
+        :param key: symbol, None = all symbols
+        :type key: str | None
+        :param start: start time, see query
+        :type start: datetime.datetime | float | int | None
+        :param end: end time (inclusive), see query
+        :type end: datetime.datetime | float | int | None
+        :return: iterator of {"timestamp": ms, "key": key, field: value, ...}
+        :rtype: iterator
+        """
+        for block, rows in self.query(service, key, start, end):
+            ts = block.frames["ts"]
+            update, current = None, None
+            for row in rows:
+                ident = (int(row["frame"]), int(row["entry"]))
+                if ident != current:
+                    if update is not None:
+                        yield update
+                    current = ident
+                    update = {"timestamp": int(ts[ident[0]]), "key": block.string(int(row["key"]))}
+                update[block.field(row)] = block.value(row)
+            if update is not None:
+                yield update
+
+    def messages(self, day: str, services: list = None, start=None, end=None):
+        """
+        Rebuild the recorded messages of a day in the order they were received, exactly as they were received
+        Messages that contain several services are rebuilt from all their parts, leaving out services only rebuilds the others.
+        :param day: day (YYYY-MM-DD)
+        :type day: str
+        :param services: services to include (None = all, including responses and heartbeats)
+        :type services: list | None
+        :param start: start time (receive time), see query
+        :type start: datetime.datetime | float | int | None
+        :param end: end time (receive time, inclusive), see query
+        :type end: datetime.datetime | float | int | None
+        :return: iterator of (receive time in ns, message text)
+        :rtype: iterator
+        """
+        start, end = self._ms(start), self._ms(end)
+        if services is None:
+            services = self.services(day)
+        streams = []
+        for service in services:
+            segment = self.segment(day, service)
+            if segment is not None:
+                streams.append(segment.parts(start, end))
+        group = []
+        for part in heapq.merge(*streams, key=lambda p: (p[0], p[2])):
+            if group and part[0] != group[0][0]:
+                yield from self._message(group, start, end)
+                group = []
+            group.append(part)
+        if group:
+            yield from self._message(group, start, end)
+
+    @staticmethod
+    def _message(group: list, start: int | None, end: int | None):
+        """
+        Rebuild one message from its parts
+        :param group: parts with the same sequence number, in part order
+        :type group: list
+        :return: iterator of (receive time in ns, message text), empty if outside the time range
+        :rtype: iterator
+        """
+        recv_ns = group[0][1]
+        if (start is not None and recv_ns // 1000000 < start) or (end is not None and recv_ns // 1000000 > end):
+            return
+        for part in group:
+            if part[4] is not None:
+                yield recv_ns, part[4]
+                return
+        yield recv_ns, fmt.encode({"data": [part[6] for part in group]}, group[0][5])
+
+    def close(self):
+        """
+        Close all open segments
+        """
+        for segment in self._segments.values():
+            segment.close()
+        self._segments.clear()
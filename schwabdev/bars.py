@@ -0,0 +1,341 @@
+"""
+This file contains an aggregator that builds OHLCV bars from level one stream data
+Github: https://github.com/tylerebowers/Schwab-API-Python
+"""
+
+import json
+import math
+import time
+import logging
+import threading
+from .book import _numpy
+from .scheduler import Scheduler
+
+OPEN, HIGH, LOW, CLOSE, VOLUME, TICKS, START, END = range(8)  # columns of bar arrays
+
+
+class _Series:
+
+    def __init__(self, spec: str, history: int):
+        """
+        Running and finished bars of one timeframe for all symbols, symbol rows are added as needed
+        :param spec: timeframe ("5s", "1m", "1h" for time bars, "1000v" for volume bars, "100t" for tick bars)
+        :type spec: str
+        :param history: number of finished bars kept per symbol
+        :type history: int
+        """
+        np = _numpy()
+        unit = spec[-1]
+        try:
+            size = float(spec[:-1])
+        except ValueError:
+            size = 0
+        if unit not in "smhvt" or size <= 0:
+            raise Exception(f"[Schwabdev] Invalid timeframe \"{spec}\"; use a number followed by s, m, h (time), v (volume), or t (ticks)")
+        self.spec = spec                                        # timeframe
+        self.kind = {"v": "volume", "t": "tick"}.get(unit, "time")  # type of bar
+        self.size = size * {"m": 60, "h": 3600}.get(unit, 1)    # seconds, volume, or ticks per bar
+        self.history = history                                  # finished bars kept per symbol
+        self.current = np.zeros((8, 8))                         # running bar per symbol row
+        self.finished = np.zeros((8, history, 8))               # ring of finished bars per symbol row
+        self.count = np.zeros(8, dtype=np.int64)                # finished bars per symbol row (total)
+
+    def grow(self, rows: int):
+        """
+        Make room for more symbol rows (doubles the capacity)
+        :param rows: number of rows needed
+        :type rows: int
+        """
+        np = _numpy()
+        capacity = len(self.current)
+        while capacity < rows:
+            capacity *= 2
+        if capacity != len(self.current):
+            self.current = np.concatenate((self.current, np.zeros((capacity - len(self.current), 8))))
+            self.finished = np.concatenate((self.finished, np.zeros((capacity - len(self.finished), self.history, 8))))
+            self.count = np.concatenate((self.count, np.zeros(capacity - len(self.count), dtype=np.int64)))
+
+    def finish(self, row: int, end: float) -> tuple:
+        """
+        Move the running bar of a row into its finished ring
+        :param row: symbol row
+        :type row: int
+        :param end: end time of the bar
+        :type end: float
+        :return: finished bar (open, high, low, close, volume, ticks, start, end)
+        :rtype: tuple
+        """
+        bar = self.current[row]
+        bar[END] = end
+        self.finished[row, self.count[row] % self.history] = bar
+        self.count[row] += 1
+        finished = tuple(float(v) for v in bar)
+        bar[:] = 0
+        return finished
+
+
+class BarAggregator:
+
+    fields = {"LEVELONE_EQUITIES": ("3", "8", "35"),            # service -> (last price, total volume, trade time) fields
+              "LEVELONE_FUTURES": ("3", "8", "11"),
+              "LEVELONE_FUTURES_OPTIONS": ("3", "8", "11"),
+              "LEVELONE_OPTIONS": ("4", "8", "39")}
+
+    def __init__(self, timeframes=("5s", "1m"), history: int = 500, on_bar=None, clock: bool = True, delay: float = 0.25, other_receiver=None,
+                 scheduler: Scheduler = None):
+        """
+        Initialize a bar aggregator that builds bars of several timeframes at once from level one trades, pass it as the receiver: streamer.start(aggregator)
+        Subscribe to the last price, total volume, and trade time fields (e.g. "0,3,8,35" for equities).
+        :param timeframes: timeframes to build ("5s", "1m", "1h" time bars, "1000v" volume bars, "100t" tick bars)
+        :type timeframes: list | tuple
+        :param history: number of finished bars kept per symbol and timeframe
+        :type history: int
+        :param on_bar: function called with each finished bar, on_bar(bar: dict) (same as subscribe(on_bar))
+        :type on_bar: function | None
+        :param clock: whether to close time bars on the clock (a scheduler job), otherwise they are closed by the next trade or close()
+        :type clock: bool
+        :param delay: seconds to wait after a time bar ends before closing it (for late trades)
+        :type delay: float
+        :param other_receiver: function called with messages that contain no level one data, other_receiver(message)
+        :type other_receiver: function | None
+        :param scheduler: scheduler to run the clock on (e.g. client.scheduler), None = a scheduler of its own
+        :type scheduler: Scheduler | None
+        """
+        self._series = {spec: _Series(spec, history) for spec in timeframes}  # timeframe -> series
+        self._rows = {}                                         # symbol -> row
+        self._keys = []                                         # row -> symbol
+        self._volume = {}                                       # symbol -> last total volume
+        self._last = {}                                         # symbol -> last price
+        self._subscribers = []                                  # [(function, key, timeframe), ...]
+        self._lock = threading.Lock()                           # guards bars (stream thread and clock)
+        self.other_receiver = other_receiver                    # receiver for other messages
+        self.delay = delay                                      # grace time for late trades
+        self._own_scheduler = scheduler is None                 # whether the scheduler is stopped with the aggregator
+        self._scheduler = scheduler or Scheduler()              # runs the clock
+        self._clock = None                                      # clock job
+        self._logger = logging.getLogger("Schwabdev.BarAggregator")
+        if on_bar is not None:
+            self.subscribe(on_bar)
+        if clock:
+            self.start_clock()
+
+    def __call__(self, message, **kwargs):
+        """
+        Receiver interface so the aggregator can be passed directly to streamer.start(...)
+        :param message: message from the stream
+        :type message: str | dict
+        """
+        self.process(message)
+
+    def subscribe(self, func, key: str = None, timeframe: str = None):
+        """
+        Call a function with each finished bar
+        :param func: function called with the bar, func(bar: dict)
+        :type func: function
+        :param key: only bars of this symbol (None = all)
+        :type key: str | None
+        :param timeframe: only bars of this timeframe (None = all)
+        :type timeframe: str | None
+        """
+        self._subscribers.append((func, key, timeframe))
+
+    def unsubscribe(self, func):
+        """
+        Stop calling a function with finished bars
+        :param func: function passed to subscribe
+        :type func: function
+        """
+        self._subscribers = [s for s in self._subscribers if s[0] is not func]
+
+    def process(self, message: str | dict):
+        """
+        Add the trades in a message
+        :param message: message from the stream
+        :type message: str | dict
+        """
+        if isinstance(message, str):
+            message = json.loads(message)
+        data = message.get("data", None)
+        forward = data is None
+        for service in data or []:
+            fields = self.fields.get(service.get("service", None), None)
+            if fields is None:
+                forward = True
+                continue
+            price_field, volume_field, time_field = fields
+            timestamp = service.get("timestamp", None)
+            for content in service.get("content", []):
+                if price_field not in content and volume_field not in content:
+                    continue  # quote only, no trade
+                key = content.get("key", None)
+                total = content.get(volume_field, None)
+                volume = 0
+                if total is not None:
+                    previous = self._volume.get(key, None)
+                    self._volume[key] = total
+                    volume = max(total - previous, 0) if previous is not None else 0
+                price = content.get(price_field, self._last.get(key, None))
+                if price is None:
+                    continue
+                self._last[key] = price
+                trade_time = content.get(time_field, timestamp)
+                self.tick(key, price, volume, trade_time / 1000 if trade_time else time.time())
+        if forward and self.other_receiver is not None:
+            self.other_receiver(message)
+
+    def _row(self, key: str) -> int:
+        """
+        Get (or add) the row of a symbol (lock must be held)
+        :param key: symbol
+        :type key: str
+        :return: row
+        :rtype: int
+        """
+        row = self._rows.get(key, None)
+        if row is None:
+            row = self._rows[key] = len(self._keys)
+            self._keys.append(key)
+            for series in self._series.values():
+                series.grow(len(self._keys))
+        return row
+
+    def tick(self, key: str, price: float, volume: float = 0, timestamp: float = None):
+        """
+        Add one trade to the running bars of every timeframe, O(1) per timeframe
+        :param key: symbol
+        :type key: str
+        :param price: trade price
+        :type price: float
+        :param volume: trade volume
+        :type volume: float
+        :param timestamp: trade time (seconds since epoch), default: now
+        :type timestamp: float | None
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        finished = []
+        with self._lock:
+            row = self._row(key)
+            for spec, series in self._series.items():
+                bar = series.current[row]
+                if series.kind == "time" and bar[TICKS] and timestamp >= bar[START] + series.size:
+                    finished.append((spec, series.finish(row, bar[START] + series.size)))
+                if not bar[TICKS]:
+                    bar[OPEN] = bar[HIGH] = bar[LOW] = price
+                    bar[START] = timestamp - timestamp % series.size if series.kind == "time" else timestamp
+                elif price > bar[HIGH]:
+                    bar[HIGH] = price
+                elif price < bar[LOW]:
+                    bar[LOW] = price
+                bar[CLOSE] = price
+                bar[VOLUME] += volume
+                bar[TICKS] += 1
+                if (series.kind == "volume" and bar[VOLUME] >= series.size) or (series.kind == "tick" and bar[TICKS] >= series.size):
+                    finished.append((spec, series.finish(row, timestamp)))
+        for spec, bar in finished:
+            self._emit(key, spec, bar)
+
+    def close(self, now: float = None) -> int:
+        """
+        Close the time bars that have ended (called by the clock)
+        :param now: current time (seconds since epoch), default: now minus the delay
+        :type now: float | None
+        :return: number of bars closed
+        :rtype: int
+        """
+        if now is None:
+            now = time.time() - self.delay
+        finished = []
+        with self._lock:
+            for spec, series in self._series.items():
+                if series.kind != "time" or not self._keys:
+                    continue
+                current = series.current[:len(self._keys)]
+                for row in _numpy().flatnonzero((current[:, TICKS] > 0) & (current[:, START] + series.size <= now)):
+                    finished.append((self._keys[row], spec, series.finish(row, current[row, START] + series.size)))
+        for key, spec, bar in finished:
+            self._emit(key, spec, bar)
+        return len(finished)
+
+    def _emit(self, key: str, timeframe: str, bar: tuple):
+        """
+        Send a finished bar to the subscribers
+        :param key: symbol
+        :type key: str
+        :param timeframe: timeframe
+        :type timeframe: str
+        :param bar: bar values (open, high, low, close, volume, ticks, start, end)
+        :type bar: tuple
+        """
+        if not self._subscribers:
+            return
+        bar = {"key": key, "timeframe": timeframe, "start": bar[START], "end": bar[END], "open": bar[OPEN], "high": bar[HIGH],
+               "low": bar[LOW], "close": bar[CLOSE], "volume": bar[VOLUME], "ticks": int(bar[TICKS])}
+        for func, sub_key, sub_timeframe in self._subscribers:
+            if (sub_key is None or sub_key == key) and (sub_timeframe is None or sub_timeframe == timeframe):
+                try:
+                    func(bar)
+                except Exception as e:
+                    self._logger.error(f"Subscriber error for {key} {timeframe}: {e}")
+
+    def bars(self, key: str, timeframe: str):
+        """
+        Get the finished bars of a symbol, oldest first
+        :param key: symbol
+        :type key: str
+        :param timeframe: timeframe
+        :type timeframe: str
+        :return: array of bars with columns (open, high, low, close, volume, ticks, start, end)
+        :rtype: numpy.ndarray
+        """
+        np = _numpy()
+        series = self._series[timeframe]
+        with self._lock:
+            row = self._rows.get(key, None)
+            if row is None:
+                return np.zeros((0, 8))
+            count = int(series.count[row])
+            if count <= series.history:
+                return series.finished[row, :count].copy()
+            return np.roll(series.finished[row], -(count % series.history), axis=0)
+
+    def current(self, key: str, timeframe: str) -> dict | None:
+        """
+        Get the running (unfinished) bar of a symbol
+        :param key: symbol
+        :type key: str
+        :param timeframe: timeframe
+        :type timeframe: str
+        :return: bar or None if there are no trades in it yet
+        :rtype: dict | None
+        """
+        with self._lock:
+            row = self._rows.get(key, None)
+            if row is None or not self._series[timeframe].current[row, TICKS]:
+                return None
+            bar = self._series[timeframe].current[row]
+            return {"key": key, "timeframe": timeframe, "start": float(bar[START]), "open": float(bar[OPEN]), "high": float(bar[HIGH]),
+                    "low": float(bar[LOW]), "close": float(bar[CLOSE]), "volume": float(bar[VOLUME]), "ticks": int(bar[TICKS])}
+
+    def start_clock(self, interval: float = None):
+        """
+        Start closing time bars on the clock
+        :param interval: seconds between checks, None = whenever a time bar ends (plus the delay)
+        :type interval: float | None
+        """
+        sizes = [series.size for series in self._series.values() if series.kind == "time"]
+        if self._clock is not None or not sizes:
+            return
+        interval = interval or math.gcd(*(round(size * 1000) for size in sizes)) / 1000  # every time frame ends on a multiple
+        first = interval - time.time() % interval + self.delay  # bars start on multiples of their size
+        self._clock = self._scheduler.every(interval, self.close, first=first, name="bar clock")
+
+    def stop(self):
+        """
+        Stop the clock
+        """
+        if self._clock is not None:
+            self._clock.cancel()
+            self._clock = None
+        if self._own_scheduler:
+            self._scheduler.stop()
@@ -0,0 +1,205 @@
+"""
+This file contains a batcher that combines single symbol quote calls into one quotes call
+Github: https://github.com/tylerebowers/Schwab-API-Python
+"""
+
+import json
+import time
+import logging
+import requests
+import threading
+import concurrent.futures
+from requests.structures import CaseInsensitiveDict
+
+
+class QuoteBatcher:
+
+    def __init__(self, client, window: float = 0.002, max_symbols: int = 250, workers: int = 4):
+        """
+        Initialize a batcher for client.quote(...) calls, the calls that arrive within window seconds (or until max_symbols are waiting)
+        are sent as one client.quotes(...) call and each caller gets a response for its own symbol, as if it had called client.quote(...).
+        Calls are grouped by their fields; a symbol asked for more than once in a batch is only requested once.
+        :param client: client used for the quotes calls
+        :type client: Client
+        :param window: seconds to gather calls for after the first one arrives
+        :type window: float
+        :param max_symbols: maximum number of symbols per quotes call (the batch is sent as soon as it is full)
+        :type max_symbols: int
+        :param workers: number of quotes calls that can be in flight at once
+        :type workers: int
+        """
+        if window < 0:
+            raise Exception("[Schwabdev] window cannot be negative.")
+        if max_symbols <= 0:
+            raise Exception("[Schwabdev] max_symbols must be greater than 0.")
+        self._client = client                                   # client for the quotes calls
+        self.window = window                                    # seconds to gather calls for
+        self.max_symbols = max_symbols                          # maximum symbols per quotes call
+        self._batches = {}                                      # fields -> (first call time, symbol -> futures), oldest first
+        self._lock = threading.Lock()                           # guards the batches
+        self._ready = threading.Condition(self._lock)           # signalled when a batch is started (or on stop)
+        self._workers = workers                                 # number of quotes calls in flight at once
+        self._executor = None                                   # sends the quotes calls (created with the thread)
+        self._thread = None                                     # thread that closes the batches
+        self.active = False                                     # whether the batching thread is running
+        self._logger = logging.getLogger("Schwabdev.QuoteBatcher")
+
+        # counters
+        self.calls = 0                                          # quote calls received
+        self.requests = 0                                       # quotes calls sent
+        self.symbols = 0                                        # symbols requested
+
+    def submit(self, symbol_id: str, fields: str = None) -> concurrent.futures.Future:
+        """
+        Add a quote call to the current batch (never blocks)
+        :param symbol_id: symbol
+        :type symbol_id: str
+        :param fields: fields to get ("all", "quote", "fundamental")
+        :type fields: str | None
+        :return: future of the response for the symbol
+        :rtype: concurrent.futures.Future
+        """
+        future = concurrent.futures.Future()
+        with self._lock:
+            if not self.active:
+                self.active = True
+                self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="QuoteBatcher")
+                self._thread = threading.Thread(target=self._run, name="QuoteBatcher", daemon=True)
+                self._thread.start()
+            self.calls += 1
+            batch = self._batches.get(fields, None)
+            if batch is None:
+                batch = self._batches[fields] = (time.monotonic(), {})
+                self._ready.notify()
+            batch[1].setdefault(symbol_id, []).append(future)
+            if len(batch[1]) >= self.max_symbols:  # full, send it now
+                self._executor.submit(self._send, *self._take(fields))
+        return future
+
+    def quote(self, symbol_id: str, fields: str = None, timeout: float = None) -> requests.Response:
+        """
+        Get a quote through the batcher (same result as client.quote(...))
+        :param symbol_id: symbol
+        :type symbol_id: str
+        :param fields: fields to get ("all", "quote", "fundamental")
+        :type fields: str | None
+        :param timeout: maximum time to wait
+        :type timeout: float | None
+        :return: response for the symbol
+        :rtype: requests.Response
+        """
+        return self.submit(symbol_id, fields).result(timeout)
+
+    def _run(self):
+        """
+        Close each batch when its window ends and hand it to a worker, full batches are sent by submit (runs on its own thread)
+        """
+        executor = self._executor
+        while True:
+            with self._lock:
+                while self.active and not self._batches:
+                    self._ready.wait()
+                stopping = not self.active
+                if stopping:
+                    closed = [self._take(fields) for fields in list(self._batches)]
+                else:
+                    fields = next(iter(self._batches))
+                    batch = self._batches[fields]
+                    while self.active and self._batches.get(fields, None) is batch:
+                        remaining = batch[0] + self.window - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._ready.wait(remaining)
+                    if self.active and self._batches.get(fields, None) is not batch:
+                        continue  # sent when it was full
+                    closed = [self._take(fields)] if self.active else []
+            for fields, symbols in closed:
+                executor.submit(self._send, fields, symbols)
+            if stopping:
+                return
+
+    def _take(self, fields: str) -> tuple:
+        """
+        Close a batch (lock must be held)
+        :param fields: fields of the batch
+        :type fields: str | None
+        :return: (fields, symbol -> futures)
+        :rtype: tuple
+        """
+        started, symbols = self._batches.pop(fields)
+        self.requests += 1
+        self.symbols += len(symbols)
+        return fields, symbols
+
+    def _send(self, fields: str, symbols: dict):
+        """
+        Send one quotes call and give each caller the response for its symbol
+        :param fields: fields to get
+        :type fields: str | None
+        :param symbols: symbol -> futures of the callers
+        :type symbols: dict
+        """
+        try:
+            response = self._client.quotes(list(symbols), fields)
+            quotes = response.json() if response.ok else None
+        except Exception as e:
+            self._logger.error(f"Quotes request for {len(symbols)} symbols failed: {e}")
+            for futures in symbols.values():
+                for future in futures:
+                    future.set_exception(e)
+            return
+        keys = {} if quotes is None else {key.upper(): key for key in quotes}  # symbols are matched case insensitively
+        for symbol, futures in symbols.items():
+            result = response if quotes is None else self._response(response, keys.get(symbol.upper(), symbol), quotes)
+            for future in futures:
+                future.set_result(result)
+
+    @staticmethod
+    def _response(combined: requests.Response, symbol: str, quotes: dict) -> requests.Response:
+        """
+        Make the response of one symbol from the response of the quotes call
+        :param combined: response of the quotes call
+        :type combined: requests.Response
+        :param symbol: symbol as it is keyed in the quotes call
+        :type symbol: str
+        :param quotes: decoded body of the quotes call
+        :type quotes: dict
+        :return: response with only the symbol's quote (404 with the errors of the quotes call if it has none)
+        :rtype: requests.Response
+        """
+        response = requests.Response()
+        if symbol in quotes:
+            response.status_code, response.reason, body = 200, "OK", {symbol: quotes[symbol]}
+        else:
+            response.status_code, response.reason, body = 404, "Not Found", {"errors": quotes.get("errors", {})}
+        response._content = json.dumps(body).encode("utf-8")
+        response.encoding = "utf-8"
+        response.headers = CaseInsensitiveDict(combined.headers)
+        response.headers.pop("Content-Length", None)
+        response.url = combined.url
+        response.request = combined.request
+        response.elapsed = combined.elapsed
+        return response
+
+    def stats(self) -> dict:
+        """
+        Get the counters
+        :return: counters (calls, requests, symbols, saved), saved is the number of round trips saved
+        :rtype: dict
+        """
+        with self._lock:
+            return {"calls": self.calls, "requests": self.requests, "symbols": self.symbols, "saved": self.calls - self.requests}
+
+    def stop(self):
+        """
+        Send the batches that are waiting and stop the batching thread
+        """
+        with self._lock:
+            self.active = False
+            self._ready.notify_all()
+            thread, executor = self._thread, self._executor
+            self._thread, self._executor = None, None
+        if thread is not None:
+            thread.join()
+        if executor is not None:
+            executor.shutdown(wait=True)
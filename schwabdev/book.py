@@ -0,0 +1,271 @@
+"""
+This file contains an order book engine for the NYSE_BOOK, NASDAQ_BOOK, and OPTIONS_BOOK stream services
+Github: https://github.com/tylerebowers/Schwab-API-Python
+"""
+
+import json
+import logging
+
+
+def _numpy():
+    """
+    Import numpy (only needed for books, bars, the recorder, and the archive; installed with the "numpy" extra)
+    :return: numpy module
+    :rtype: module
+    """
+    try:
+        import numpy
+    except ImportError:
+        raise Exception("[Schwabdev] numpy is required for order books, bars, the recorder, and the archive, install it with: pip install schwabdev[numpy]")
+    return numpy
+
+
+class OrderBook:
+
+    def __init__(self, service: str, key: str, depth: int = 10):
+        """
+        Fixed depth order book of one symbol, each side is stored as price, size, and count arrays (best level first)
+        Best bid/offer, mid, depth-weighted mid, and imbalance are computed on each update so reading them is O(1).
+        :param service: service name
+        :type service: str
+        :param key: symbol
+        :type key: str
+        :param depth: number of price levels kept per side
+        :type depth: int
+        """
+        np = _numpy()
+        self.service = service                                  # service name
+        self.key = key                                          # symbol
+        self.depth = depth                                      # price levels per side
+        self.time = None                                        # book time (ms since epoch)
+        self.updates = 0                                        # number of snapshots applied
+        self.bid_price = np.zeros(depth, dtype=np.float64)      # bid prices, highest first
+        self.bid_size = np.zeros(depth, dtype=np.float64)       # bid sizes
+        self.bid_count = np.zeros(depth, dtype=np.int32)        # number of market makers per bid level
+        self.ask_price = np.zeros(depth, dtype=np.float64)      # ask prices, lowest first
+        self.ask_size = np.zeros(depth, dtype=np.float64)       # ask sizes
+        self.ask_count = np.zeros(depth, dtype=np.int32)        # number of market makers per ask level
+        self.bid_levels = 0                                     # number of bid levels filled
+        self.ask_levels = 0                                     # number of ask levels filled
+        self.bid_total = 0.0                                    # total bid size over all kept levels
+        self.ask_total = 0.0                                    # total ask size over all kept levels
+        self.weighted_mid = None                                # depth-weighted mid price
+        self.imbalance = None                                   # (bid_total - ask_total) / (bid_total + ask_total)
+
+    def __repr__(self):
+        return f"OrderBook({self.service}, {self.key}, bid={self.best_bid}x{self.best_bid_size}, ask={self.best_ask}x{self.best_ask_size})"
+
+    @property
+    def best_bid(self) -> float | None:
+        return float(self.bid_price[0]) if self.bid_levels else None
+
+    @property
+    def best_ask(self) -> float | None:
+        return float(self.ask_price[0]) if self.ask_levels else None
+
+    @property
+    def best_bid_size(self) -> float | None:
+        return float(self.bid_size[0]) if self.bid_levels else None
+
+    @property
+    def best_ask_size(self) -> float | None:
+        return float(self.ask_size[0]) if self.ask_levels else None
+
+    @property
+    def mid(self) -> float | None:
+        return (float(self.bid_price[0]) + float(self.ask_price[0])) / 2 if self.bid_levels and self.ask_levels else None
+
+    @property
+    def spread(self) -> float | None:
+        return float(self.ask_price[0]) - float(self.bid_price[0]) if self.bid_levels and self.ask_levels else None
+
+    def bids(self):
+        """
+        Get the filled bid levels
+        :return: (prices, sizes, counts) array views, best first
+        :rtype: tuple
+        """
+        return self.bid_price[:self.bid_levels], self.bid_size[:self.bid_levels], self.bid_count[:self.bid_levels]
+
+    def asks(self):
+        """
+        Get the filled ask levels
+        :return: (prices, sizes, counts) array views, best first
+        :rtype: tuple
+        """
+        return self.ask_price[:self.ask_levels], self.ask_size[:self.ask_levels], self.ask_count[:self.ask_levels]
+
+    @staticmethod
+    def _decode(levels: list, price, size, count, depth: int) -> int:
+        """
+        Decode a list of book levels into the side arrays (in place)
+        :param levels: levels from the stream [{"0": price, "1": size, "2": count, "3": [market makers]}, ...]
+        :type levels: list
+        :param price: price array of the side
+        :type price: numpy.ndarray
+        :param size: size array of the side
+        :type size: numpy.ndarray
+        :param count: count array of the side
+        :type count: numpy.ndarray
+        :param depth: number of levels kept
+        :type depth: int
+        :return: number of levels filled
+        :rtype: int
+        """
+        levels = levels[:depth]
+        filled = len(levels)
+        price[:filled] = [level.get("0", 0.0) for level in levels]
+        size[:filled] = [level.get("1", 0.0) for level in levels]
+        count[:filled] = [level.get("2", 0) for level in levels]
+        price[filled:] = 0.0
+        size[filled:] = 0.0
+        count[filled:] = 0
+        return filled
+
+    @staticmethod
+    def _diff(np, side: str, old_price, old_size, old_count, new_price, new_size, new_count) -> list:
+        """
+        Compare two snapshots of one side by price
+        :param np: numpy module
+        :type np: module
+        :param side: "bid" or "ask"
+        :type side: str
+        :return: list of changes (side, action ("add"|"update"|"remove"), price, size, count)
+        :rtype: list
+        """
+        changes = []
+        common, old_index, new_index = np.intersect1d(old_price, new_price, assume_unique=True, return_indices=True)
+        changed = (old_size[old_index] != new_size[new_index]) | (old_count[old_index] != new_count[new_index])
+        for i in new_index[changed]:
+            changes.append((side, "update", float(new_price[i]), float(new_size[i]), int(new_count[i])))
+        for i in np.flatnonzero(~np.isin(new_price, common, assume_unique=True)):
+            changes.append((side, "add", float(new_price[i]), float(new_size[i]), int(new_count[i])))
+        for i in np.flatnonzero(~np.isin(old_price, common, assume_unique=True)):
+            changes.append((side, "remove", float(old_price[i]), 0.0, 0))
+        return changes
+
+    def update(self, content: dict, diff: bool = True) -> list:
+        """
+        Apply a book snapshot from the stream
+        :param content: content entry of a book message {"key": ..., "1": time, "2": bids, "3": asks}
+        :type content: dict
+        :param diff: whether to compare against the previous snapshot
+        :type diff: bool
+        :return: list of level changes (side, action ("add"|"update"|"remove"), price, size, count), empty if diff is False
+        :rtype: list
+        """
+        np = _numpy()
+        if diff:
+            old_bids = [a[:self.bid_levels].copy() for a in (self.bid_price, self.bid_size, self.bid_count)]
+            old_asks = [a[:self.ask_levels].copy() for a in (self.ask_price, self.ask_size, self.ask_count)]
+        self.time = content.get("1", self.time)
+        self.bid_levels = self._decode(content.get("2", []), self.bid_price, self.bid_size, self.bid_count, self.depth)
+        self.ask_levels = self._decode(content.get("3", []), self.ask_price, self.ask_size, self.ask_count, self.depth)
+        self.updates += 1
+
+        # precompute derived values so reads are O(1)
+        self.bid_total = float(self.bid_size.sum())
+        self.ask_total = float(self.ask_size.sum())
+        total = self.bid_total + self.ask_total
+        if self.bid_total and self.ask_total:
+            bid_vwap = float(self.bid_price @ self.bid_size) / self.bid_total
+            ask_vwap = float(self.ask_price @ self.ask_size) / self.ask_total
+            self.weighted_mid = (bid_vwap * self.ask_total + ask_vwap * self.bid_total) / total
+        else:
+            self.weighted_mid = None
+        self.imbalance = (self.bid_total - self.ask_total) / total if total else None
+
+        if not diff:
+            return []
+        return (self._diff(np, "bid", *old_bids, *self.bids()) +
+                self._diff(np, "ask", *old_asks, *self.asks()))
+
+
+class BookEngine:
+
+    services = ("NYSE_BOOK", "NASDAQ_BOOK", "OPTIONS_BOOK")
+
+    def __init__(self, depth: int = 10, on_change=None, other_receiver=None):
+        """
+        Initialize a book engine that keeps an OrderBook per (service, symbol), pass it as the receiver: streamer.start(engine)
+        :param depth: number of price levels kept per side
+        :type depth: int
+        :param on_change: function called after each snapshot with level changes, on_change(book, changes)
+        :type on_change: function | None
+        :param other_receiver: function called with messages that are not book data, other_receiver(message)
+        :type other_receiver: function | None
+        """
+        _numpy()  # fail early if numpy is missing
+        self.depth = depth                                      # price levels per side
+        self.on_change = on_change                              # level change callback
+        self.other_receiver = other_receiver                    # receiver for other messages
+        self.books = {}                                         # (service, key) -> OrderBook
+        self._logger = logging.getLogger("Schwabdev.BookEngine")
+
+    def __call__(self, message, **kwargs):
+        """
+        Receiver interface so the engine can be passed directly to streamer.start(...)
+        :param message: message from the stream
+        :type message: str | dict
+        """
+        self.process(message)
+
+    def process(self, message: str | dict):
+        """
+        Apply the book snapshots in a message
+        :param message: message from the stream
+        :type message: str | dict
+        """
+        if isinstance(message, str):
+            message = json.loads(message)
+        data = message.get("data", None)
+        forward = data is None
+        for service in data or []:
+            name = service.get("service", None)
+            if name not in self.services:
+                forward = True
+                continue
+            for content in service.get("content", []):
+                self.update(name, content)
+        if forward and self.other_receiver is not None:
+            self.other_receiver(message)
+
+    def update(self, service: str, content: dict) -> list:
+        """
+        Apply one book snapshot
+        :param service: service name
+        :type service: str
+        :param content: content entry of a book message
+        :type content: dict
+        :return: list of level changes
+        :rtype: list
+        """
+        key = content.get("key", None)
+        book = self.books.get((service, key), None)
+        if book is None:
+            book = self.books[(service, key)] = OrderBook(service, key, self.depth)
+        changes = book.update(content, diff=self.on_change is not None)
+        if changes and self.on_change is not None:
+            try:
+                self.on_change(book, changes)
+            except Exception as e:
+                self._logger.error(f"on_change error for {service} {key}: {e}")
+        return changes
+
+    def book(self, key: str, service: str = None) -> OrderBook | None:
+        """
+        Get the book of a symbol
+        :param key: symbol
+        :type key: str
+        :param service: service name, None = the first service that has the symbol
+        :type service: str | None
+        :return: order book or None
+        :rtype: OrderBook | None
+        """
+        if service is not None:
+            return self.books.get((service, key), None)
+        for name in self.services:
+            book = self.books.get((name, key), None)
+            if book is not None:
+                return book
+        return None
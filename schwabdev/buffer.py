@@ -0,0 +1,279 @@
+"""
+This file contains a bounded buffer to hand off stream messages to consumers
+Github: https://github.com/tylerebowers/Schwab-API-Python
+"""
+
+import json
+import queue
+import asyncio
+import threading
+import collections
+from .conflate import StreamConflator
+
+
+class StreamBuffer:
+
+    policies = ("block", "drop_oldest", "conflate")
+
+    def __init__(self, maxsize: int = 10000, policy: str = "block", key=None):
+        """
+        Initialize a bounded buffer between the stream (producer) and consumers, pass it as the receiver: streamer.start(buffer)
+        :param maxsize: maximum number of messages held in the buffer
+        :type maxsize: int
+        :param policy: what to do when the buffer is full ("block"|"drop_oldest"|"conflate")
+        :type policy: str
+        :param key: function that returns the conflation key of a message (None = never conflated), only used by "conflate";
+                    by default the key is the services and keys of a data message, level one changes are merged field by field into the queued message
+        :type key: function | None
+        """
+        if maxsize <= 0:
+            raise Exception("[Schwabdev] maxsize must be greater than 0.")
+        if policy not in self.policies:
+            raise Exception(f"[Schwabdev] Invalid buffer policy; options are {self.policies}")
+
+        self.maxsize = maxsize                                  # maximum number of queued messages
+        self.policy = policy                                    # policy to use when full
+        self._key = key                                         # function to get the conflation key, None = _default_key
+        self._queue = collections.deque()                       # queued messages (or conflation keys)
+        self._latest = {}                                       # conflation key -> [latest message, decoded data message or None, merged]
+        self._lock = threading.Lock()                           # guards everything below
+        self._not_empty = threading.Condition(self._lock)       # signalled when a message is added
+        self._not_full = threading.Condition(self._lock)        # signalled when a message is removed
+        self._waiters = []                                      # asyncio futures waiting for a message
+        self.closed = False                                     # no more messages will be added
+
+        # counters
+        self.put_count = 0                                      # messages put into the buffer
+        self.get_count = 0                                      # messages taken out of the buffer
+        self.dropped = 0                                        # messages dropped because the buffer was full
+        self.conflated = 0                                      # messages combined with a queued one with the same key
+        self.high_water = 0                                     # largest number of messages held at once
+
+    def __len__(self):
+        return len(self._queue)
+
+    def __call__(self, message, **kwargs):
+        """
+        Receiver interface so the buffer can be passed directly to streamer.start(...)
+        :param message: message from the stream
+        :type message: str
+        """
+        self.put(message)
+
+    @staticmethod
+    def _decode(message) -> dict | None:
+        """
+        Decode a data message
+        :param message: message from the stream
+        :type message: str | dict
+        :return: decoded message, None if it is not a data message
+        :rtype: dict | None
+        """
+        if isinstance(message, str):
+            if not message.startswith('{"data"'):
+                return None
+            message = json.loads(message)
+        return message if isinstance(message, dict) and message.get("data", None) else None
+
+    @staticmethod
+    def _default_key(message: dict | None):
+        """
+        Default conflation key, the services and keys contained in a data message (other messages are never conflated)
+        :param message: decoded data message or None
+        :type message: dict | None
+        :return: conflation key or None
+        :rtype: tuple | None
+        """
+        if message is None:
+            return None
+        return tuple((service.get("service"), tuple(content.get("key") for content in service.get("content", []))) for service in message["data"])
+
+    @staticmethod
+    def _merge(queued: dict, message: dict) -> dict | None:
+        """
+        Combine a newer data message with a queued one of the same services and keys, level one changes are merged field by field
+        and whole data is replaced (see StreamConflator.merged)
+        :param queued: decoded queued message
+        :type queued: dict
+        :param message: decoded newer message
+        :type message: dict
+        :return: combined message, None if the messages do not have the same services and keys
+        :rtype: dict | None
+        """
+        if StreamBuffer._default_key(queued) != StreamBuffer._default_key(message):
+            return None
+        data = []
+        for old, new in zip(queued["data"], message["data"]):
+            if new.get("service", None) in StreamConflator.merged:
+                new = {**new, "content": [{**old_content, **content} for old_content, content in zip(old.get("content", []), new.get("content", []))]}
+            data.append(new)
+        return {**message, "data": data}
+
+    def _wake_async(self):
+        """
+        Wake asyncio consumers waiting for a message (lock must be held)
+        """
+        for loop, future in self._waiters:
+            loop.call_soon_threadsafe(lambda f=future: f.done() or f.set_result(None))
+        self._waiters.clear()
+
+    def put(self, message, timeout: float = None) -> bool:
+        """
+        Put a message into the buffer, the full policy decides whether this blocks, drops the oldest message, or conflates
+        :param message: message to put
+        :type message: any
+        :param timeout: maximum time to block for (only used by the "block" policy), None = forever
+        :type timeout: float | None
+        :return: whether the message was added (False if the buffer is closed or the timeout expired)
+        :rtype: bool
+        """
+        if self.policy == "conflate":  # decoded before taking the lock, the producer is the stream's thread
+            decoded = self._decode(message)
+            key = self._default_key(decoded) if self._key is None else self._key(message)
+        with self._lock:
+            if self.closed:
+                return False
+            if self.policy == "conflate":
+                latest = self._latest.get(key, None) if key is not None else None
+                if latest is not None:  # keep the queue position, combine with the latest message
+                    merged = self._merge(latest[1], decoded) if latest[1] is not None and decoded is not None else None
+                    self._latest[key] = [message, decoded, False] if merged is None else [message, merged, True]
+                    self.conflated += 1
+                    self.put_count += 1
+                    return True
+                if len(self._queue) >= self.maxsize:
+                    self._latest.pop(self._queue.popleft())
+                    self.dropped += 1
+                if key is None:
+                    key = object()  # unique, so it is never conflated
+                self._queue.append(key)
+                self._latest[key] = [message, decoded, False]
+            else:
+                if len(self._queue) >= self.maxsize:
+                    if self.policy == "drop_oldest":
+                        self._queue.popleft()
+                        self.dropped += 1
+                    elif not self._not_full.wait_for(lambda: len(self._queue) < self.maxsize or self.closed, timeout):
+                        self.dropped += 1
+                        return False
+                    elif self.closed:
+                        return False
+                self._queue.append(message)
+            self.put_count += 1
+            self.high_water = max(self.high_water, len(self._queue))
+            self._not_empty.notify()
+            if self._waiters:
+                self._wake_async()
+            return True
+
+    def _pop(self):
+        """
+        Pop the oldest message (lock must be held and buffer must not be empty)
+        :return: oldest message
+        :rtype: any
+        """
+        item = self._queue.popleft()
+        if self.policy == "conflate":
+            item, decoded, merged = self._latest.pop(item)
+            if merged:  # same format as the message that was put
+                item = json.dumps(decoded) if isinstance(item, str) else decoded
+        self.get_count += 1
+        return item
+
+    def get(self, block: bool = True, timeout: float = None):
+        """
+        Get the oldest message from the buffer
+        :param block: whether to wait for a message
+        :type block: bool
+        :param timeout: maximum time to wait for, None = forever
+        :type timeout: float | None
+        :return: oldest message
+        :rtype: any
+        :raises queue.Empty: if no message is available (or the buffer is closed and empty)
+        """
+        with self._lock:
+            if block:
+                self._not_empty.wait_for(lambda: self._queue or self.closed, timeout)
+            if not self._queue:
+                raise queue.Empty
+            item = self._pop()
+            self._not_full.notify()
+            return item
+
+    def drain(self, max_items: int = None, timeout: float = 0) -> list:
+        """
+        Get all (or up to max_items) queued messages at once, waits up to timeout for at least one message
+        :param max_items: maximum number of messages to return, None = all
+        :type max_items: int | None
+        :param timeout: maximum time to wait for the first message (0 = do not wait, None = forever)
+        :type timeout: float | None
+        :return: list of messages, oldest first (may be empty)
+        :rtype: list
+        """
+        with self._lock:
+            if timeout != 0:
+                self._not_empty.wait_for(lambda: self._queue or self.closed, timeout)
+            count = len(self._queue) if max_items is None else min(max_items, len(self._queue))
+            items = [self._pop() for _ in range(count)]
+            if items:
+                self._not_full.notify_all()
+            return items
+
+    async def get_async(self):
+        """
+        Get the oldest message from the buffer (must be awaited), waits on the running event loop instead of a thread
+        :return: oldest message
+        :rtype: any
+        :raises queue.Empty: if the buffer is closed and empty
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if self._queue:
+                    item = self._pop()
+                    self._not_full.notify()
+                    return item
+                if self.closed:
+                    raise queue.Empty
+                future = loop.create_future()
+                self._waiters.append((loop, future))
+            await future
+
+    def close(self):
+        """
+        Close the buffer, wakes all waiting consumers and producers; queued messages can still be consumed
+        """
+        with self._lock:
+            self.closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+            self._wake_async()
+
+    def __iter__(self):
+        """
+        Iterate over messages (blocking) until the buffer is closed and empty
+        """
+        while True:
+            try:
+                yield self.get()
+            except queue.Empty:
+                return
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await self.get_async()
+        except queue.Empty:
+            raise StopAsyncIteration
+
+    def stats(self) -> dict:
+        """
+        Get the buffer counters
+        :return: counters (size, high_water, put, get, dropped, conflated)
+        :rtype: dict
+        """
+        with self._lock:
+            return {"size": len(self._queue), "high_water": self.high_water, "put": self.put_count,
+                    "get": self.get_count, "dropped": self.dropped, "conflated": self.conflated}
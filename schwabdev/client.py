@@ -10,11 +10,14 @@ import requests
 import urllib.parse
 from .stream import Stream
 from .tokens import Tokens
+from .scheduler import Scheduler
+from .coalesce import RequestCoalescer
+from .batching import QuoteBatcher
 
 
 class Client:
 
-    def __init__(self, app_key, app_secret, callback_url="https://127.0.0.1", tokens_file="tokens.json", timeout=5, update_tokens_auto=True):
+    def __init__(self, app_key, app_secret, callback_url="https://127.0.0.1", tokens_file="tokens.json", timeout=5, update_tokens_auto=True, subscriptions_file=None, coalesce=True, batch_quotes=None):
         """
         Initialize a client to access the Schwab API.
         :param app_key: app key credentials
@@ -29,6 +32,12 @@ class Client:
         :type timeout: int
         :param update_tokens_auto: update tokens automatically
         :type update_tokens_auto: bool
+        :param subscriptions_file: path to a file to persist stream subscriptions in (restored at startup), None = not persisted
+        :type subscriptions_file: str | None
+        :param coalesce: whether identical GET requests made at the same time (e.g. from different threads) share one request (order reads are never shared)
+        :type coalesce: bool
+        :param batch_quotes: seconds to gather quote(...) calls for and send them as one quotes(...) call, None = not batched
+        :type batch_quotes: float | None
         """
 
         if timeout <= 0:
@@ -36,8 +45,12 @@ class Client:
 
         self.version = "Schwabdev 2.4.4"                        # version of the client
         self.timeout = timeout                                  # timeout to use in requests
+        self._session = requests.Session()                      # pooled connections (kept open between requests)
+        self.coalescer = RequestCoalescer() if coalesce else None  # shares identical GET requests in flight
+        self.quote_batcher = None if batch_quotes is None else QuoteBatcher(self, batch_quotes)  # combines quote calls
+        self.scheduler = Scheduler()                            # timed jobs (token updates, stream schedules, user jobs)
         self.tokens = Tokens(self, app_key, app_secret, callback_url, tokens_file, update_tokens_auto)
-        self.stream = Stream(self)                              # init the streaming object
+        self.stream = Stream(self, subscriptions_file)          # init the streaming object
         self._logger = logging.getLogger("Schwabdev.Client")    # init the logger
 
         self._logger.info("Client Initialization Complete")
@@ -93,6 +106,26 @@ class Client:
         else:
             return l
         
+    def _get(self, url: str, headers: dict = None, params: dict = None, timeout: float = None, coalesce: bool = True) -> requests.Response:
+        """
+        Make a GET request on the pooled session, an identical request already in flight is shared instead (if coalescing)
+        :param url: url
+        :type url: str
+        :param headers: headers
+        :type headers: dict | None
+        :param params: query params
+        :type params: dict | None
+        :param timeout: request timeout
+        :type timeout: float | None
+        :param coalesce: whether the request may be shared, False for order reads (a shared response may predate an order change)
+        :type coalesce: bool
+        :return: response
+        :rtype: requests.Response
+        """
+        if self.coalescer is None or not coalesce:
+            return self._session.get(url, headers=headers, params=params, timeout=timeout)
+        return self.coalescer.call(RequestCoalescer.key(url, params), self._session.get, url, headers=headers, params=params, timeout=timeout)
+
     _base_api_url = "https://api.schwabapi.com"
 
     """
@@ -105,9 +138,9 @@ class Client:
         :return: All linked account numbers and hashes
         :rtype: request.Response
         """
-        return requests.get(f'{self._base_api_url}/trader/v1/accounts/accountNumbers',
-                            headers={'Authorization': f'Bearer {self.tokens.access_token}'},
-                            timeout=self.timeout)
+        return self._get(f'{self._base_api_url}/trader/v1/accounts/accountNumbers',
+                         headers={'Authorization': f'Bearer {self.tokens.access_token}'},
+                         timeout=self.timeout)
 
     def account_details_all(self, fields: str = None) -> requests.Response:
         """
@@ -117,10 +150,10 @@ class Client:
         :return: details for all linked accounts
         :rtype: request.Response
         """
-        return requests.get(f'{self._base_api_url}/trader/v1/accounts/',
-                            headers={'Authorization': f'Bearer {self.tokens.access_token}'},
-                            params=self._params_parser({'fields': fields}),
-                            timeout=self.timeout)
+        return self._get(f'{self._base_api_url}/trader/v1/accounts/',
+                         headers={'Authorization': f'Bearer {self.tokens.access_token}'},
+                         params=self._params_parser({'fields': fields}),
+                         timeout=self.timeout)
 
     def account_details(self, accountHash: str, fields: str = None) -> requests.Response:
         """
@@ -132,10 +165,10 @@ class Client:
         :return: details for one linked account
         :rtype: request.Response
         """
-        return requests.get(f'{self._base_api_url}/trader/v1/accounts/{accountHash}',
-                            headers={'Authorization': f'Bearer {self.tokens.access_token}'},
-                            params=self._params_parser({'fields': fields}),
-                            timeout=self.timeout)
+        return self._get(f'{self._base_api_url}/trader/v1/accounts/{accountHash}',
+                         headers={'Authorization': f'Bearer {self.tokens.access_token}'},
+                         params=self._params_parser({'fields': fields}),
+                         timeout=self.timeout)
 
     def account_orders(self, accountHash: str, fromEnteredTime: datetime.datetime | str, toEnteredTime: datetime.datetime | str, maxResults: int = None, status: str = None) -> requests.Response:
         """
@@ -153,12 +186,13 @@ class Client:
         :return: orders for one linked account hash
         :rtype: request.Response
         """
-        return requests.get(f'{self._base_api_url}/trader/v1/accounts/{accountHash}/orders',
-                            headers={"Accept": "application/json", 'Authorization': f'Bearer {self.tokens.access_token}'},
-                            params=self._params_parser(
-                                {'maxResults': maxResults, 'fromEnteredTime': self._time_convert(fromEnteredTime, "8601"),
-                                 'toEnteredTime': self._time_convert(toEnteredTime, "8601"), 'status': status}),
-                            timeout=self.timeout)
+        return self._get(f'{self._base_api_url}/trader/v1/accounts/{accountHash}/orders',
+                         headers={"Accept": "application/json", 'Authorization': f'Bearer {self.tokens.access_token}'},
+                         params=self._params_parser(
+                             {'maxResults': maxResults, 'fromEnteredTime': self._time_convert(fromEnteredTime, "8601"),
+                              'toEnteredTime': self._time_convert(toEnteredTime, "8601"), 'status': status}),
+                         timeout=self.timeout,
+                         coalesce=False)
 
     def order_place(self, accountHash: str, order: dict) -> requests.Response:
         """
@@ -170,11 +204,11 @@ class Client:
         :return: order number in response header (if immediately filled then order number not returned)
         :rtype: request.Response
         """
-        return requests.post(f'{self._base_api_url}/trader/v1/accounts/{accountHash}/orders',
-                             headers={"Accept": "application/json", 'Authorization': f'Bearer {self.tokens.access_token}',
-                                      "Content-Type": "application/json"},
-                             json=order,
-                             timeout=self.timeout)
+        return self._session.post(f'{self._base_api_url}/trader/v1/accounts/{accountHash}/orders',
+                                  headers={"Accept": "application/json", 'Authorization': f'Bearer {self.tokens.access_token}',
+                                           "Content-Type": "application/json"},
+                                  json=order,
+                                  timeout=self.timeout)
 
     def order_details(self, accountHash: str, orderId: int | str) -> requests.Response:
         """
@@ -186,9 +220,10 @@ class Client:
         :return: order details
         :rtype: request.Response
         """
-        return requests.get(f'{self._base_api_url}/trader/v1/accounts/{accountHash}/orders/{orderId}',
-                            headers={'Authorization': f'Bearer {self.tokens.access_token}'},
-                            timeout=self.timeout)
+        return self._get(f'{self._base_api_url}/trader/v1/accounts/{accountHash}/orders/{orderId}',
+                         headers={'Authorization': f'Bearer {self.tokens.access_token}'},
+                         timeout=self.timeout,
+                         coalesce=False)
 
     def order_cancel(self, accountHash: str, orderId: int | str) -> requests.Response:
         """
@@ -200,9 +235,9 @@ class Client:
         :return: response code
         :rtype: request.Response
         """
-        return requests.delete(f'{self._base_api_url}/trader/v1/accounts/{accountHash}/orders/{orderId}',
-                               headers={'Authorization': f'Bearer {self.tokens.access_token}'},
-                               timeout=self.timeout)
+        return self._session.delete(f'{self._base_api_url}/trader/v1/accounts/{accountHash}/orders/{orderId}',
+                                    headers={'Authorization': f'Bearer {self.tokens.access_token}'},
+                                    timeout=self.timeout)
 
     def order_replace(self, accountHash: str, orderId: int | str, order: dict) -> requests.Response:
         """
@@ -216,11 +251,11 @@ class Client:
         :return: response code
         :rtype: request.Response
         """
-        return requests.put(f'{self._base_api_url}/trader/v1/accounts/{accountHash}/orders/{orderId}',
-                            headers={"Accept": "application/json", 'Authorization': f'Bearer {self.tokens.access_token}',
-                                     "Content-Type": "application/json"},
-                            json=order,
-                            timeout=self.timeout)
+        return self._session.put(f'{self._base_api_url}/trader/v1/accounts/{accountHash}/orders/{orderId}',
+                                 headers={"Accept": "application/json", 'Authorization': f'Bearer {self.tokens.access_token}',
+                                          "Content-Type": "application/json"},
+                                 json=order,
+                                 timeout=self.timeout)
 
     def account_orders_all(self, fromEnteredTime: datetime.datetime | str, toEnteredTime: datetime.datetime | str, maxResults: int = None, status: str = None) -> requests.Response:
         """
@@ -236,19 +271,20 @@ class Client:
         :return: all orders
         :rtype: request.Response
         """
-        return requests.get(f'{self._base_api_url}/trader/v1/orders',
-                            headers={"Accept": "application/json", 'Authorization': f'Bearer {self.tokens.access_token}'},
-                            params=self._params_parser(
-                                {'maxResults': maxResults, 'fromEnteredTime': self._time_convert(fromEnteredTime, "8601"),
-                                 'toEnteredTime': self._time_convert(toEnteredTime, "8601"), 'status': status}),
-                            timeout=self.timeout)
+        return self._get(f'{self._base_api_url}/trader/v1/orders',
+                         headers={"Accept": "application/json", 'Authorization': f'Bearer {self.tokens.access_token}'},
+                         params=self._params_parser(
+                             {'maxResults': maxResults, 'fromEnteredTime': self._time_convert(fromEnteredTime, "8601"),
+                              'toEnteredTime': self._time_convert(toEnteredTime, "8601"), 'status': status}),
+                         timeout=self.timeout,
+                         coalesce=False)
 
     """
     def order_preview(self, accountHash, orderObject) -> requests.Response:
         #COMING SOON (waiting on Schwab)
-        return requests.post(f'{self._base_api_url}/trader/v1/accounts/{accountHash}/previewOrder',
-                             headers={'Authorization': f'Bearer {self.tokens.access_token}',
-                                      "Content-Type": "application.json"}, data=orderObject)
+        return self._session.post(f'{self._base_api_url}/trader/v1/accounts/{accountHash}/previewOrder',
+                                  headers={'Authorization': f'Bearer {self.tokens.access_token}',
+                                           "Content-Type": "application.json"}, data=orderObject)
     """
 
     def transactions(self, accountHash: str, startDate: datetime.datetime | str, endDate: datetime.datetime | str, types: str, symbol: str = None) -> requests.Response:
@@ -266,12 +302,12 @@ class Client:
         :return: list of transactions for a specific account
         :rtype: request.Response
         """
-        return requests.get(f'{self._base_api_url}/trader/v1/accounts/{accountHash}/transactions',
-                            headers={'Authorization': f'Bearer {self.tokens.access_token}'},
-                            params=self._params_parser(
-                                {'accountNumber': accountHash, 'startDate': self._time_convert(startDate, "8601"),
-                                 'endDate': self._time_convert(endDate, "8601"), 'symbol': symbol, 'types': types}),
-                            timeout=self.timeout)
+        return self._get(f'{self._base_api_url}/trader/v1/accounts/{accountHash}/transactions',
+                         headers={'Authorization': f'Bearer {self.tokens.access_token}'},
+                         params=self._params_parser(
+                             {'accountNumber': accountHash, 'startDate': self._time_convert(startDate, "8601"),
+                              'endDate': self._time_convert(endDate, "8601"), 'symbol': symbol, 'types': types}),
+                         timeout=self.timeout)
 
     def transaction_details(self, accountHash: str, transactionId: str | int) -> requests.Response:
         """
@@ -283,10 +319,10 @@ class Client:
         :return: transaction details of transaction id using accountHash
         :rtype: request.Response
         """
-        return requests.get(f'{self._base_api_url}/trader/v1/accounts/{accountHash}/transactions/{transactionId}',
-                            headers={'Authorization': f'Bearer {self.tokens.access_token}'},
-                            params={'accountNumber': accountHash, 'transactionId': transactionId},
-                            timeout=self.timeout)
+        return self._get(f'{self._base_api_url}/trader/v1/accounts/{accountHash}/transactions/{transactionId}',
+                         headers={'Authorization': f'Bearer {self.tokens.access_token}'},
+                         params={'accountNumber': accountHash, 'transactionId': transactionId},
+                         timeout=self.timeout)
 
     def preferences(self) -> requests.Response:
         """
@@ -294,9 +330,9 @@ class Client:
         :return: User Preferences and Streaming Info
         :rtype: request.Response
         """
-        return requests.get(f'{self._base_api_url}/trader/v1/userPreference',
-                            headers={'Authorization': f'Bearer {self.tokens.access_token}'},
-                            timeout=self.timeout)
+        return self._get(f'{self._base_api_url}/trader/v1/userPreference',
+                         headers={'Authorization': f'Bearer {self.tokens.access_token}'},
+                         timeout=self.timeout)
 
     """
     Market Data
@@ -314,15 +350,15 @@ class Client:
         :return: list of quotes
         :rtype: request.Response
         """
-        return requests.get(f'{self._base_api_url}/marketdata/v1/quotes',
-                            headers={'Authorization': f'Bearer {self.tokens.access_token}'},
-                            params=self._params_parser(
-                                {'symbols': self._format_list(symbols), 'fields': fields, 'indicative': indicative}),
-                            timeout=self.timeout)
+        return self._get(f'{self._base_api_url}/marketdata/v1/quotes',
+                         headers={'Authorization': f'Bearer {self.tokens.access_token}'},
+                         params=self._params_parser(
+                             {'symbols': self._format_list(symbols), 'fields': fields, 'indicative': indicative}),
+                         timeout=self.timeout)
 
     def quote(self, symbol_id: str, fields: str = None) -> requests.Response:
         """
-        Get quote for a single symbol
+        Get quote for a single symbol (sent with other quote calls as one quotes call if the client batches quotes)
         :param symbol_id: ticker symbol
         :type symbol_id: str (e.g. "AAPL", "/ES", "USD/EUR")
         :param fields: string of fields to get ("all", "quote", "fundamental")
@@ -330,10 +366,12 @@ class Client:
         :return: quote for a single symbol
         :rtype: request.Response
         """
-        return requests.get(f'{self._base_api_url}/marketdata/v1/{urllib.parse.quote(symbol_id,safe="")}/quotes',
-                            headers={'Authorization': f'Bearer {self.tokens.access_token}'},
-                            params=self._params_parser({'fields': fields}),
-                            timeout=self.timeout)
+        if self.quote_batcher is not None:
+            return self.quote_batcher.quote(symbol_id, fields)
+        return self._get(f'{self._base_api_url}/marketdata/v1/{urllib.parse.quote(symbol_id,safe="")}/quotes',
+                         headers={'Authorization': f'Bearer {self.tokens.access_token}'},
+                         params=self._params_parser({'fields': fields}),
+                         timeout=self.timeout)
 
     def option_chains(self, symbol: str, contractType: str = None, strikeCount: any = None, includeUnderlyingQuote: bool = None, strategy: str = None,
                interval: any = None, strike: any = None, range: str = None, fromDate: datetime.datetime | str = None, toDate: datetime.datetime | str = None, volatility: any = None, underlyingPrice: any = None,
@@ -377,16 +415,16 @@ class Client:
         :return: list of option chains
         :rtype: request.Response
         """
-        return requests.get(f'{self._base_api_url}/marketdata/v1/chains',
-                            headers={'Authorization': f'Bearer {self.tokens.access_token}'},
-                            params=self._params_parser(
-                                {'symbol': symbol, 'contractType': contractType, 'strikeCount': strikeCount,
-                                 'includeUnderlyingQuote': includeUnderlyingQuote, 'strategy': strategy,
-                                 'interval': interval, 'strike': strike, 'range': range, 'fromDate': self._time_convert(fromDate, "YYYY-MM-DD"),
-                                 'toDate': self._time_convert(toDate, "YYYY-MM-DD"), 'volatility': volatility, 'underlyingPrice': underlyingPrice,
-                                 'interestRate': interestRate, 'daysToExpiration': daysToExpiration,
-                                 'expMonth': expMonth, 'optionType': optionType, 'entitlement': entitlement}),
-                            timeout=self.timeout)
+        return self._get(f'{self._base_api_url}/marketdata/v1/chains',
+                         headers={'Authorization': f'Bearer {self.tokens.access_token}'},
+                         params=self._params_parser(
+                             {'symbol': symbol, 'contractType': contractType, 'strikeCount': strikeCount,
+                              'includeUnderlyingQuote': includeUnderlyingQuote, 'strategy': strategy,
+                              'interval': interval, 'strike': strike, 'range': range, 'fromDate': self._time_convert(fromDate, "YYYY-MM-DD"),
+                              'toDate': self._time_convert(toDate, "YYYY-MM-DD"), 'volatility': volatility, 'underlyingPrice': underlyingPrice,
+                              'interestRate': interestRate, 'daysToExpiration': daysToExpiration,
+                              'expMonth': expMonth, 'optionType': optionType, 'entitlement': entitlement}),
+                         timeout=self.timeout)
 
     def option_expiration_chain(self, symbol: str) -> requests.Response:
         """
@@ -396,10 +434,10 @@ class Client:
         :return: option expiration chain
         :rtype: request.Response
         """
-        return requests.get(f'{self._base_api_url}/marketdata/v1/expirationchain',
-                            headers={'Authorization': f'Bearer {self.tokens.access_token}'},
-                            params=self._params_parser({'symbol': symbol}),
-                            timeout=self.timeout)
+        return self._get(f'{self._base_api_url}/marketdata/v1/expirationchain',
+                         headers={'Authorization': f'Bearer {self.tokens.access_token}'},
+                         params=self._params_parser({'symbol': symbol}),
+                         timeout=self.timeout)
 
     def price_history(self, symbol: str, periodType: str = None, period: any = None, frequencyType: str = None, frequency: any = None, startDate: datetime.datetime | str = None,
                       endDate: any = None, needExtendedHoursData: bool = None, needPreviousClose: bool = None) -> requests.Response:
@@ -426,15 +464,15 @@ class Client:
         :return: dictionary of containing candle history
         :rtype: request.Response
         """
-        return requests.get(f'{self._base_api_url}/marketdata/v1/pricehistory',
-                            headers={'Authorization': f'Bearer {self.tokens.access_token}'},
-                            params=self._params_parser({'symbol': symbol, 'periodType': periodType, 'period': period,
-                                                        'frequencyType': frequencyType, 'frequency': frequency,
-                                                        'startDate': self._time_convert(startDate, 'epoch_ms'),
-                                                        'endDate': self._time_convert(endDate, 'epoch_ms'),
-                                                        'needExtendedHoursData': needExtendedHoursData,
-                                                        'needPreviousClose': needPreviousClose}),
-                            timeout=self.timeout)
+        return self._get(f'{self._base_api_url}/marketdata/v1/pricehistory',
+                         headers={'Authorization': f'Bearer {self.tokens.access_token}'},
+                         params=self._params_parser({'symbol': symbol, 'periodType': periodType, 'period': period,
+                                                     'frequencyType': frequencyType, 'frequency': frequency,
+                                                     'startDate': self._time_convert(startDate, 'epoch_ms'),
+                                                     'endDate': self._time_convert(endDate, 'epoch_ms'),
+                                                     'needExtendedHoursData': needExtendedHoursData,
+                                                     'needPreviousClose': needPreviousClose}),
+                         timeout=self.timeout)
 
     def movers(self, symbol: str, sort: str = None, frequency: any = None) -> requests.Response:
         """
@@ -448,10 +486,10 @@ class Client:
         :return: movers
         :rtype: request.Response
         """
-        return requests.get(f'{self._base_api_url}/marketdata/v1/movers/{symbol}',
-                            headers={"accept": "application/json", 'Authorization': f'Bearer {self.tokens.access_token}'},
-                            params=self._params_parser({'sort': sort, 'frequency': frequency}),
-                            timeout=self.timeout)
+        return self._get(f'{self._base_api_url}/marketdata/v1/movers/{symbol}',
+                         headers={"accept": "application/json", 'Authorization': f'Bearer {self.tokens.access_token}'},
+                         params=self._params_parser({'sort': sort, 'frequency': frequency}),
+                         timeout=self.timeout)
 
     def market_hours(self, symbols: list[str], date: datetime.datetime | str = None) -> requests.Response:
         """
@@ -463,12 +501,12 @@ class Client:
         :return: market hours
         :rtype: request.Response
         """
-        return requests.get(f'{self._base_api_url}/marketdata/v1/markets',
-                            headers={'Authorization': f'Bearer {self.tokens.access_token}'},
-                            params=self._params_parser(
-                                {'markets': symbols, #self._format_list(symbols),
-                                 'date': self._time_convert(date, 'YYYY-MM-DD')}),
-                            timeout=self.timeout)
+        return self._get(f'{self._base_api_url}/marketdata/v1/markets',
+                         headers={'Authorization': f'Bearer {self.tokens.access_token}'},
+                         params=self._params_parser(
+                             {'markets': symbols, #self._format_list(symbols),
+                              'date': self._time_convert(date, 'YYYY-MM-DD')}),
+                         timeout=self.timeout)
 
     def market_hour(self, market_id: str, date: datetime.datetime | str = None) -> requests.Response:
         """
@@ -480,10 +518,10 @@ class Client:
         :return: market hours
         :rtype: request.Response
         """
-        return requests.get(f'{self._base_api_url}/marketdata/v1/markets/{market_id}',
-                            headers={'Authorization': f'Bearer {self.tokens.access_token}'},
-                            params=self._params_parser({'date': self._time_convert(date, 'YYYY-MM-DD')}),
-                            timeout=self.timeout)
+        return self._get(f'{self._base_api_url}/marketdata/v1/markets/{market_id}',
+                         headers={'Authorization': f'Bearer {self.tokens.access_token}'},
+                         params=self._params_parser({'date': self._time_convert(date, 'YYYY-MM-DD')}),
+                         timeout=self.timeout)
 
     def instruments(self, symbol: str, projection: str) -> requests.Response:
         """
@@ -495,10 +533,10 @@ class Client:
         :return: instruments
         :rtype: request.Response
         """
-        return requests.get(f'{self._base_api_url}/marketdata/v1/instruments',
-                            headers={'Authorization': f'Bearer {self.tokens.access_token}'},
-                            params={'symbol': symbol, 'projection': projection},
-                            timeout=self.timeout)
+        return self._get(f'{self._base_api_url}/marketdata/v1/instruments',
+                         headers={'Authorization': f'Bearer {self.tokens.access_token}'},
+                         params={'symbol': symbol, 'projection': projection},
+                         timeout=self.timeout)
 
     def instrument_cusip(self, cusip_id: str | int) -> requests.Response:
         """
@@ -508,6 +546,6 @@ class Client:
         :return: instrument
         :rtype: request.Response
         """
-        return requests.get(f'{self._base_api_url}/marketdata/v1/instruments/{cusip_id}',
-                            headers={'Authorization': f'Bearer {self.tokens.access_token}'},
-                            timeout=self.timeout)
+        return self._get(f'{self._base_api_url}/marketdata/v1/instruments/{cusip_id}',
+                         headers={'Authorization': f'Bearer {self.tokens.access_token}'},
+                         timeout=self.timeout)
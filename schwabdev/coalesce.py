@@ -0,0 +1,79 @@
+"""
+This file contains a request coalescer so identical concurrent GET requests share one round trip
+Github: https://github.com/tylerebowers/Schwab-API-Python
+"""
+
+import logging
+import threading
+import concurrent.futures
+
+
+class RequestCoalescer:
+
+    def __init__(self):
+        """
+        Initialize a single flight coalescer, the first caller of a key makes the request and callers that ask for the same key
+        while it is in flight wait for it and get the same response (nothing is cached once the request finishes).
+        Only use it for idempotent requests (GET).
+        """
+        self._in_flight = {}                                    # key -> future of the request in flight
+        self._lock = threading.Lock()                           # guards the requests in flight
+        self._logger = logging.getLogger("Schwabdev.Coalescer")
+
+        # counters
+        self.requests = 0                                       # requests made
+        self.coalesced = 0                                      # calls that shared a request in flight (round trips saved)
+
+    @staticmethod
+    def key(url: str, params: dict = None) -> tuple:
+        """
+        Get the key of a request, params are normalized so their order and types do not matter
+        :param url: url of the request
+        :type url: str
+        :param params: query params (None values already removed)
+        :type params: dict | None
+        :return: key
+        :rtype: tuple
+        """
+        return url, tuple(sorted((name, str(value)) for name, value in (params or {}).items()))
+
+    def call(self, key, func, *args, **kwargs):
+        """
+        Make a request or wait for the identical one in flight
+        :param key: key of the request (see RequestCoalescer.key)
+        :type key: tuple
+        :param func: function that makes the request, called with args and kwargs
+        :type func: function
+        :return: response of the shared request (an exception is raised in every caller)
+        :rtype: requests.Response
+        """
+        with self._lock:
+            future = self._in_flight.get(key, None)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = concurrent.futures.Future()
+                self.requests += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+        try:
+            response = func(*args, **kwargs)
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._in_flight[key]
+        future.set_result(response)
+        return response
+
+    def stats(self) -> dict:
+        """
+        Get the counters
+        :return: counters (requests, coalesced, in_flight)
+        :rtype: dict
+        """
+        with self._lock:
+            return {"requests": self.requests, "coalesced": self.coalesced, "in_flight": len(self._in_flight)}
@@ -0,0 +1,200 @@
+"""
+This file contains a conflating receiver that hands a slow consumer only the latest state of each key
+Github: https://github.com/tylerebowers/Schwab-API-Python
+"""
+
+import json
+import logging
+import threading
+import collections
+
+
+class StreamConflator:
+
+    merged = ("LEVELONE_EQUITIES", "LEVELONE_OPTIONS", "LEVELONE_FUTURES", "LEVELONE_FUTURES_OPTIONS", "LEVELONE_FOREX")  # stream changes, merged
+    replaced = ("NYSE_BOOK", "NASDAQ_BOOK", "OPTIONS_BOOK", "SCREENER_EQUITY", "SCREENER_OPTION")  # stream whole data, replaced
+
+    def __init__(self, handler, services: list = None, batch: bool = True, other_receiver=None):
+        """
+        Initialize a conflating receiver for one consumer, pass it as the receiver: streamer.start(conflator)
+        The consumer runs on its own thread. While it is busy, updates of the same (service, key) are combined
+        (changes are merged field by field, whole data is replaced) and it gets exactly one update per key when it is ready.
+        Sequenced services (CHART_EQUITY, CHART_FUTURES, ACCT_ACTIVITY) and non-data messages are never combined and keep their order.
+        :param handler: consumer, handler(message) with messages in the same format as the stream
+        :type handler: function
+        :param services: services to conflate, None = all level one, book, and screener services
+        :type services: list | None
+        :param batch: True = all pending updates are handed over in one message (one entry per service), False = one message per key
+        :type batch: bool
+        :param other_receiver: function also called with every message on the stream thread (e.g. another consumer), other_receiver(message)
+        :type other_receiver: function | None
+        """
+        self.handler = handler                                  # consumer
+        self.services = set(services or self.merged + self.replaced)  # services that are conflated
+        self.batch = batch                                      # whether pending updates are handed over together
+        self.other_receiver = other_receiver                    # receiver for every message
+        self._order = collections.deque()                       # pending (service, key) or unique keys for messages passed through, oldest first
+        self._pending = {}                                      # pending key -> [service entry without content, content] or message
+        self._lock = threading.Lock()                           # guards the pending updates
+        self._ready = threading.Condition(self._lock)           # signalled when an update is pending
+        self._thread = None                                     # consumer thread
+        self.active = False                                     # whether the consumer thread is running
+        self._logger = logging.getLogger("Schwabdev.Conflator")
+
+        # counters
+        self.received = 0                                       # updates (content entries or messages) received
+        self.delivered = 0                                      # updates handed to the consumer
+        self.conflated = collections.Counter()                  # service -> updates combined into a pending one
+
+    def __call__(self, message, **kwargs):
+        """
+        Receiver interface so the conflator can be passed directly to streamer.start(...)
+        :param message: message from the stream
+        :type message: str | dict
+        """
+        self.put(message)
+
+    def start(self):
+        """
+        Start the consumer thread (called automatically on the first message)
+        """
+        if self.active:
+            return
+        self.active = True
+        self._thread = threading.Thread(target=self._consume, name="Conflator", daemon=True)
+        self._thread.start()
+
+    def put(self, message: str | dict):
+        """
+        Add a message, combining its updates with the pending updates of the same keys (never blocks)
+        :param message: message from the stream
+        :type message: str | dict
+        """
+        if not self.active:
+            self.start()
+        if self.other_receiver is not None:
+            self.other_receiver(message)
+        if isinstance(message, str):
+            decoded = json.loads(message) if message.startswith('{"data"') else {}
+        else:
+            decoded = message
+        data = decoded.get("data", None)
+        with self._lock:
+            if data is None:
+                self._pass(message)
+            else:
+                passed = []
+                for service in data:
+                    name = service.get("service", None)
+                    if name not in self.services:
+                        passed.append(service)
+                        continue
+                    header = {k: v for k, v in service.items() if k != "content"}
+                    for content in service.get("content", []):
+                        self._merge(name, header, content)
+                if passed:
+                    self._pass(message if len(passed) == len(data) else {"data": passed})
+            self._ready.notify()
+
+    def _pass(self, message: str | dict):
+        """
+        Queue a message that is not conflated (lock must be held)
+        :param message: message
+        :type message: str | dict
+        """
+        key = object()  # unique, so it is never combined
+        self._order.append(key)
+        self._pending[key] = message
+        self.received += 1
+
+    def _merge(self, service: str, header: dict, content: dict):
+        """
+        Combine an update with the pending update of its key (lock must be held)
+        :param service: service name
+        :type service: str
+        :param header: service entry without the content (service, timestamp, command)
+        :type header: dict
+        :param content: content entry
+        :type content: dict
+        """
+        key = (service, content.get("key", None))
+        self.received += 1
+        pending = self._pending.get(key, None)
+        if pending is None:
+            self._order.append(key)
+            self._pending[key] = [header, dict(content)]
+            return
+        pending[0] = header
+        if service in self.merged:
+            pending[1].update(content)
+        else:
+            pending[1] = dict(content)
+        self.conflated[service] += 1
+
+    def _take(self) -> list:
+        """
+        Wait for and take all pending updates
+        :return: list of pending [header, content] or messages, oldest first (empty once stopped and nothing is pending)
+        :rtype: list
+        """
+        with self._lock:
+            self._ready.wait_for(lambda: self._order or not self.active)
+            updates = [self._pending.pop(key) for key in self._order]
+            self._order.clear()
+            return updates
+
+    def _consume(self):
+        """
+        Hand pending updates to the consumer until stopped and nothing is pending (runs on its own thread)
+        """
+        while True:
+            updates = self._take()
+            if not updates:
+                return  # stopped
+            messages, services = [], {}  # messages: (message, updates in it), services: service -> entry of the batch being built
+            for update in updates:
+                if isinstance(update, list):
+                    header, content = update
+                    if not self.batch:
+                        messages.append(({"data": [{**header, "content": [content]}]}, 1))
+                        continue
+                    entry = services.get(header["service"], None)
+                    if entry is None:
+                        entry = services[header["service"]] = {**header, "content": []}
+                    entry.update(header)
+                    entry["content"].append(content)
+                else:
+                    if services:  # keep the order of updates around messages that are passed through
+                        messages.append(({"data": list(services.values())}, sum(len(e["content"]) for e in services.values())))
+                        services = {}
+                    messages.append((update, 1))
+            if services:
+                messages.append(({"data": list(services.values())}, sum(len(e["content"]) for e in services.values())))
+            for message, count in messages:
+                try:
+                    self.handler(message if isinstance(message, str) else json.dumps(message))
+                except Exception as e:
+                    self._logger.error(f"Consumer error: {e}")
+                self.delivered += count
+
+    def stats(self) -> dict:
+        """
+        Get the counters
+        :return: counters (received, delivered, conflated, pending, by_service)
+        :rtype: dict
+        """
+        with self._lock:
+            return {"received": self.received, "delivered": self.delivered, "conflated": sum(self.conflated.values()),
+                    "pending": len(self._order), "by_service": dict(self.conflated)}
+
+    def stop(self, timeout: float = None):
+        """
+        Stop the consumer thread, pending updates are handed to the consumer first
+        :param timeout: maximum time to wait for the consumer to finish the pending updates
+        :type timeout: float | None
+        """
+        with self._lock:
+            self.active = False
+            self._ready.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
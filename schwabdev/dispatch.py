@@ -0,0 +1,162 @@
+"""
+This file contains a dispatcher to process stream messages on a pool of workers
+Github: https://github.com/tylerebowers/Schwab-API-Python
+"""
+
+import json
+import time
+import zlib
+import queue
+import logging
+import threading
+import multiprocessing
+
+
+def _worker(handler, work_queue, stats):
+    """
+    Worker loop (module level so it can be used by processes)
+    :param handler: function to call for each content entry, handler(service, content, timestamp)
+    :type handler: function
+    :param work_queue: queue of (enqueue time, [(service, timestamp, content), ...]) or None to stop
+    :type work_queue: queue.SimpleQueue | multiprocessing.Queue
+    :param stats: [processed, last lag, max lag] shared with the dispatcher
+    :type stats: list | multiprocessing.Array
+    """
+    logger = logging.getLogger("Schwabdev.Dispatcher")
+    while True:
+        item = work_queue.get()
+        if item is None:
+            break
+        enqueued, entries = item
+        lag = time.time() - enqueued
+        stats[1] = lag
+        if lag > stats[2]:
+            stats[2] = lag
+        for service, timestamp, content in entries:
+            try:
+                handler(service, content, timestamp)
+            except Exception as e:
+                logger.error(f"Handler error for {service} {content.get('key', None)}: {e}")
+        stats[0] += len(entries)
+
+
+class StreamDispatcher:
+
+    def __init__(self, handler, workers: int = 4, mode: str = "thread", other_handler=None):
+        """
+        Initialize a dispatcher that splits stream messages by key onto a pool of workers, pass it as the receiver: streamer.start(dispatcher)
+        Each key is always handled by the same worker, so updates for a symbol are processed in order.
+        :param handler: function called for each content entry, handler(service, content, timestamp), must be picklable for "process" mode
+        :type handler: function
+        :param workers: number of workers
+        :type workers: int
+        :param mode: type of workers ("thread"|"process"), use "process" for CPU heavy handlers
+        :type mode: str
+        :param other_handler: function called (on the stream thread) with non-data messages such as responses and heartbeats
+        :type other_handler: function | None
+        """
+        if workers <= 0:
+            raise Exception("[Schwabdev] workers must be greater than 0.")
+        if mode not in ("thread", "process"):
+            raise Exception("[Schwabdev] Invalid dispatcher mode; options are 'thread' or 'process'")
+
+        self.handler = handler                                  # handler for content entries
+        self.other_handler = other_handler                      # handler for non-data messages
+        self.workers = workers                                  # number of workers
+        self.mode = mode                                        # "thread" or "process"
+        self._queues = []                                       # work queue per worker
+        self._stats = []                                        # [processed, last lag, max lag] per worker
+        self._dispatched = [0] * workers                        # entries dispatched per worker
+        self._pool = []                                         # threads or processes
+        self._logger = logging.getLogger("Schwabdev.Dispatcher")
+        self.active = False                                     # whether the workers are running
+
+    def __call__(self, message, **kwargs):
+        """
+        Receiver interface so the dispatcher can be passed directly to streamer.start(...)
+        :param message: message from the stream
+        :type message: str | dict
+        """
+        self.dispatch(message)
+
+    def start(self):
+        """
+        Start the workers (called automatically on the first dispatch)
+        """
+        if self.active:
+            return
+        for _ in range(self.workers):
+            if self.mode == "process":
+                work_queue = multiprocessing.Queue()
+                stats = multiprocessing.Array('d', 3, lock=False)
+                worker = multiprocessing.Process(target=_worker, args=(self.handler, work_queue, stats), daemon=True)
+            else:
+                work_queue = queue.SimpleQueue()
+                stats = [0, 0.0, 0.0]
+                worker = threading.Thread(target=_worker, args=(self.handler, work_queue, stats), daemon=True)
+            self._queues.append(work_queue)
+            self._stats.append(stats)
+            self._pool.append(worker)
+            worker.start()
+        self.active = True
+
+    def worker_for(self, key: str) -> int:
+        """
+        Get the worker index that handles a key (stable across runs)
+        :param key: key (symbol)
+        :type key: str
+        :return: worker index
+        :rtype: int
+        """
+        return zlib.crc32(str(key).encode()) % self.workers
+
+    def dispatch(self, message: str | dict):
+        """
+        Split a message by key and queue the content entries onto their workers
+        :param message: message from the stream
+        :type message: str | dict
+        """
+        if not self.active:
+            self.start()
+        if isinstance(message, str):
+            message = json.loads(message)
+        data = message.get("data", None)
+        if data is None:
+            if self.other_handler is not None:
+                self.other_handler(message)
+            return
+        batches = {}  # worker index -> entries, so each worker gets one queue item per message
+        for service in data:
+            service_type = service.get("service", None)
+            timestamp = service.get("timestamp", None)
+            for content in service.get("content", []):
+                batches.setdefault(self.worker_for(content.get("key", "")), []).append((service_type, timestamp, content))
+        now = time.time()
+        for index, entries in batches.items():
+            self._dispatched[index] += len(entries)
+            self._queues[index].put((now, entries))
+
+    def stats(self) -> list[dict]:
+        """
+        Get per worker counters, lag is the time between a message being dispatched and a worker starting on it
+        :return: list of worker stats (worker, queued, processed, lag, max_lag)
+        :rtype: list[dict]
+        """
+        return [{"worker": i, "queued": self._dispatched[i] - int(stats[0]), "processed": int(stats[0]),
+                 "lag": stats[1], "max_lag": stats[2]} for i, stats in enumerate(self._stats)]
+
+    def stop(self, timeout: float = None):
+        """
+        Stop the workers after they finish the queued entries
+        :param timeout: maximum time to wait for each worker
+        :type timeout: float | None
+        """
+        if not self.active:
+            return
+        for work_queue in self._queues:
+            work_queue.put(None)
+        for worker in self._pool:
+            worker.join(timeout)
+        self._queues, self._stats, self._pool = [], [], []
+        self._dispatched = [0] * self.workers
+        self.active = False
@@ -0,0 +1,592 @@
+"""
+This file contains a publisher that shares one stream with other local processes, and the remote stream those processes use
+Github: https://github.com/tylerebowers/Schwab-API-Python
+"""
+
+import os
+import json
+import stat
+import socket
+import getpass
+import logging
+import tempfile
+import threading
+import concurrent.futures
+import multiprocessing.connection
+from .stream import Stream
+from .buffer import StreamBuffer
+
+
+def runtime_directory() -> str:
+    """
+    Get (create) the per user directory for the publisher's socket and key, only the user can access it (0700)
+    :return: directory path
+    :rtype: str
+    """
+    user = str(os.getuid()) if hasattr(os, "getuid") else getpass.getuser()
+    path = os.path.join(tempfile.gettempdir(), f"schwabdev-{user}")
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if os.name != "nt":
+        info = os.lstat(path)
+        if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+            raise Exception(f"[Schwabdev] \"{path}\" is not a private directory of this user (mode 0700), remove it and try again.")
+    return path
+
+
+def default_address() -> str:
+    """
+    Default address of the publisher, a Unix socket in the per user directory (a per user named pipe on Windows)
+    :return: address
+    :rtype: str
+    """
+    if os.name == "nt":
+        return rf"\\.\pipe\schwabdev-stream-{getpass.getuser()}"
+    return os.path.join(runtime_directory(), "stream.sock")
+
+
+def default_authkey_path() -> str:
+    """
+    Path of the key file written by a publisher that was started without an authkey (readable only by the user)
+    :return: path
+    :rtype: str
+    """
+    return os.path.join(runtime_directory(), "stream.key")
+
+
+class _Subscriber:
+
+    def __init__(self, number: int, connection, maxsize: int):
+        """
+        State of one connected subscriber process
+        :param number: subscriber number
+        :type number: int
+        :param connection: connection to the subscriber
+        :type connection: multiprocessing.connection.Connection
+        :param maxsize: maximum number of messages queued for the subscriber
+        :type maxsize: int
+        """
+        self.owner = f"remote-{number}"                         # owner name used with the subscription manager
+        self.connection = connection                            # connection to the subscriber
+        self.buffer = StreamBuffer(maxsize, "drop_oldest")      # outgoing messages (a slow subscriber loses its oldest messages)
+        self.send_lock = threading.Lock()                       # guards writes to the connection
+        self.subscribed = {}                                    # service -> key -> set of fields requested by the subscriber
+        self.topics = {}                                        # service -> set of keys (None = all keys) added with topics
+        self.filter = {}                                        # service -> frozenset of keys (None = all keys) delivered
+
+    def update_filter(self):
+        """
+        Rebuild the delivered topics from the subscriptions and the extra topics
+        """
+        services = set(self.subscribed) | set(self.topics)
+        self.filter = {service: None if self.topics.get(service, ()) is None
+                       else frozenset(self.subscribed.get(service, {})) | frozenset(self.topics.get(service, ()))
+                       for service in services}
+
+    def write(self, payload: bytes):
+        """
+        Write one frame to the subscriber
+        :param payload: utf-8 encoded JSON
+        :type payload: bytes
+        """
+        with self.send_lock:
+            self.connection.send_bytes(payload)
+
+
+class StreamPublisher:
+
+    def __init__(self, stream: Stream, address: str | tuple = None, authkey: bytes = None, maxsize: int = 10000,
+                 timeout: float = 10.0, other_receiver=None):
+        """
+        Initialize a publisher that shares one stream with local subscriber processes (see RemoteStream), pass it as the receiver: streamer.start(publisher)
+        Only this process logs in, subscribers ask for subscriptions through the publisher (reference counted with stream.manager)
+        and only receive the services and keys they asked for.
+        :param stream: stream to share
+        :type stream: Stream
+        :param address: Unix socket path (named pipe on Windows) or (host, port), None = default_address()
+        :type address: str | tuple | None
+        :param authkey: key subscribers must present to connect, None = a random key written to default_authkey_path() (only with the default address)
+        :type authkey: bytes | None
+        :param maxsize: maximum number of messages queued per subscriber (the oldest are dropped when full)
+        :type maxsize: int
+        :param timeout: seconds to wait for the server's responses to a subscriber's requests
+        :type timeout: float
+        :param other_receiver: function also called with every message in this process, other_receiver(message)
+        :type other_receiver: function | None
+        """
+        if authkey is None and address is not None:
+            raise Exception("[Schwabdev] An authkey is required when the publisher does not use the default address.")
+        self._stream = stream                                   # shared stream
+        self.address = address or default_address()            # address subscribers connect to
+        self._authkey = authkey                                 # key subscribers must present (None = random, made at start)
+        self.maxsize = maxsize                                  # maximum queued messages per subscriber
+        self.timeout = timeout                                  # seconds to wait for server responses
+        self.other_receiver = other_receiver                    # receiver in this process
+        self._listener = None                                   # listener for subscriber connections
+        self._subscribers = ()                                  # connected subscribers (replaced, never changed in place)
+        self._count = 0                                         # number of subscribers that have connected
+        self._lock = threading.Lock()                           # guards the subscribers
+        self.active = False                                     # whether the publisher is accepting subscribers
+        self._logger = logging.getLogger("Schwabdev.Publisher")
+
+    def __call__(self, message, **kwargs):
+        """
+        Receiver interface so the publisher can be passed directly to streamer.start(...)
+        :param message: message from the stream
+        :type message: str
+        """
+        self.publish(message)
+
+    @property
+    def subscribers(self) -> int:
+        """
+        Number of connected subscribers
+        :return: number of connected subscribers
+        :rtype: int
+        """
+        return len(self._subscribers)
+
+    def start(self):
+        """
+        Start accepting subscribers on a background thread
+        :return: this publisher
+        :rtype: StreamPublisher
+        """
+        if isinstance(self.address, str) and os.name != "nt" and os.path.lexists(self.address):
+            self._remove_stale_socket()
+        if self._authkey is None:
+            self._authkey = os.urandom(32)
+            path = default_authkey_path()
+            fd = os.open(f"{path}.tmp", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "wb") as f:
+                f.write(self._authkey)
+            os.replace(f"{path}.tmp", path)
+        self._listener = multiprocessing.connection.Listener(self.address, authkey=self._authkey)
+        self.address = self._listener.address
+        self.active = True
+        threading.Thread(target=self._accept, name="PublisherAccept", daemon=True).start()
+        self._logger.info(f"Publishing stream on {self.address}")
+        return self
+
+    def _remove_stale_socket(self):
+        """
+        Remove a socket left over by a publisher that did not stop (e.g. crashed), only if it is a socket of this user that nothing listens on
+        """
+        info = os.lstat(self.address)
+        if not stat.S_ISSOCK(info.st_mode) or info.st_uid != os.getuid():
+            raise Exception(f"[Schwabdev] \"{self.address}\" exists and is not a socket of this user, not removing it.")
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.address)
+        except ConnectionRefusedError:
+            os.unlink(self.address)  # nothing is listening
+            return
+        finally:
+            probe.close()
+        raise Exception(f"[Schwabdev] Another publisher is already listening on \"{self.address}\".")
+
+    def _accept(self):
+        """
+        Accept subscribers until stopped (runs on its own thread)
+        """
+        while self.active:
+            try:
+                connection = self._listener.accept()
+            except multiprocessing.AuthenticationError as e:
+                self._logger.warning(f"Subscriber rejected: {e}")
+                continue
+            except OSError:
+                break  # listener closed
+            with self._lock:
+                self._count += 1
+                subscriber = _Subscriber(self._count, connection, self.maxsize)
+                self._subscribers += (subscriber,)
+            self._logger.info(f"Subscriber {subscriber.owner} connected.")
+            threading.Thread(target=self._read, args=(subscriber,), name=f"Publisher-{subscriber.owner}", daemon=True).start()
+            threading.Thread(target=self._write, args=(subscriber,), name=f"Publisher-{subscriber.owner}-send", daemon=True).start()
+
+    def publish(self, message: str | dict):
+        """
+        Deliver a message to the subscribers interested in it, data is filtered by service and key, heartbeats go to everyone
+        :param message: message from the stream
+        :type message: str | dict
+        """
+        if self.other_receiver is not None:
+            self.other_receiver(message)
+        if not self._subscribers:
+            return
+        text = message if isinstance(message, str) else json.dumps(message)
+        if text.startswith('{"notify"'):
+            payload = text.encode()
+            for subscriber in self._subscribers:
+                subscriber.buffer.put(payload)
+            return
+        if not text.startswith('{"data"'):
+            return  # responses are to the publisher's own requests
+        data = json.loads(text).get("data", [])
+        payload = None
+        for subscriber in self._subscribers:
+            wanted, whole = [], True
+            topics = subscriber.filter
+            for service in data:
+                keys = topics.get(service.get("service"), ())
+                if keys is None:
+                    wanted.append(service)
+                    continue
+                content = [entry for entry in service.get("content", []) if entry.get("key") in keys]
+                if len(content) != len(service.get("content", [])):
+                    whole = False
+                if content:
+                    wanted.append(service if len(content) == len(service.get("content", [])) else {**service, "content": content})
+            if not wanted:
+                continue
+            if whole:
+                payload = payload or text.encode()  # nothing filtered out, forward the message as received
+                subscriber.buffer.put(payload)
+            else:
+                subscriber.buffer.put(json.dumps({"data": wanted}).encode())
+
+    def _write(self, subscriber: _Subscriber):
+        """
+        Send queued messages to a subscriber (runs on its own thread per subscriber)
+        :param subscriber: subscriber
+        :type subscriber: _Subscriber
+        """
+        try:
+            for payload in subscriber.buffer:
+                subscriber.write(payload)
+        except (OSError, EOFError, ValueError):
+            subscriber.buffer.close()
+
+    def _read(self, subscriber: _Subscriber):
+        """
+        Handle a subscriber's requests until it disconnects (runs on its own thread per subscriber)
+        :param subscriber: subscriber
+        :type subscriber: _Subscriber
+        """
+        try:
+            while True:
+                request = json.loads(subscriber.connection.recv_bytes())
+                if request.get("op") == "close":
+                    break
+                try:
+                    reply = {"reply": request.get("id"), "result": self._handle(subscriber, request)}
+                except Exception as e:
+                    reply = {"reply": request.get("id"), "error": str(e)}
+                subscriber.write(json.dumps(reply).encode())
+        except (OSError, EOFError, ValueError):
+            pass
+        self._remove(subscriber)
+
+    def _handle(self, subscriber: _Subscriber, request: dict):
+        """
+        Handle one request from a subscriber
+        :param subscriber: subscriber
+        :type subscriber: _Subscriber
+        :param request: {"id", "op": "send", "requests": [...]} or {"id", "op": "topics", "service", "keys", "remove"}
+        :type request: dict
+        :return: result sent back to the subscriber
+        :rtype: list | None
+        """
+        op = request.get("op")
+        if op == "send":
+            return [self._subscribe(subscriber, stream_request) for stream_request in request.get("requests", [])]
+        if op == "topics":
+            service, keys = request.get("service", "").upper(), request.get("keys")
+            with self._lock:
+                if request.get("remove"):
+                    if keys is None or subscriber.topics.get(service, set()) is None:
+                        subscriber.topics.pop(service, None)
+                    else:
+                        subscriber.topics[service] = subscriber.topics.get(service, set()) - set(keys)
+                elif keys is None:
+                    subscriber.topics[service] = None
+                elif subscriber.topics.get(service, set()) is not None:
+                    subscriber.topics[service] = subscriber.topics.get(service, set()) | set(keys)
+                subscriber.update_filter()
+            return None
+        raise Exception(f"[Schwabdev] Unknown publisher operation: {op}")
+
+    def _subscribe(self, subscriber: _Subscriber, request: dict) -> list:
+        """
+        Apply a subscriber's stream request to the shared subscriptions (ADD, SUBS, UNSUBS and VIEW, admin requests are ignored)
+        New interest is added before old interest is removed, so shared keys are never briefly unsubscribed.
+        :param subscriber: subscriber
+        :type subscriber: _Subscriber
+        :param request: stream request (e.g. from level_one_equities)
+        :type request: dict
+        :return: the server's responses to the requests that had to be sent (empty if nothing changed on the stream)
+        :rtype: list
+        """
+        service, command = request.get("service", "").upper(), request.get("command", "").upper()
+        parameters = request.get("parameters", {})
+        keys = Stream._string_to_list(parameters.get("keys", ""))
+        fields = set(Stream._string_to_list(parameters.get("fields", "")))
+        if service == "ADMIN" or command not in ("ADD", "SUBS", "UNSUBS", "VIEW"):
+            return []
+        manager = self._stream.manager
+        owned = subscriber.subscribed.setdefault(service, {})
+        futures = []
+        if command == "VIEW":
+            keys = list(owned)
+        if command in ("ADD", "SUBS", "VIEW") and keys and fields:
+            futures += manager.subscribe(subscriber.owner, service, keys, sorted(fields))
+            for key in keys:
+                owned[key] = owned.get(key, set()) | fields
+        if command == "UNSUBS":
+            futures += manager.unsubscribe(subscriber.owner, service, keys)
+            for key in keys:
+                owned.pop(key, None)
+        elif command in ("SUBS", "VIEW"):
+            removed = [key for key in owned if key not in keys]
+            if removed:
+                futures += manager.unsubscribe(subscriber.owner, service, removed)
+            for key in removed:
+                del owned[key]
+            for key in keys:
+                extra = owned.get(key, set()) - fields
+                if extra:
+                    futures += manager.unsubscribe(subscriber.owner, service, [key], sorted(extra))
+                    owned[key] = fields
+        if not owned:
+            del subscriber.subscribed[service]
+        with self._lock:
+            subscriber.update_filter()
+        responses = []
+        for future in futures:
+            try:
+                responses.append(future.result(self.timeout))
+            except concurrent.futures.TimeoutError:
+                responses.append(None)
+        return responses
+
+    def _remove(self, subscriber: _Subscriber):
+        """
+        Disconnect a subscriber and release its subscriptions
+        :param subscriber: subscriber
+        :type subscriber: _Subscriber
+        """
+        with self._lock:
+            if subscriber not in self._subscribers:
+                return
+            self._subscribers = tuple(s for s in self._subscribers if s is not subscriber)
+        subscriber.buffer.close()
+        subscriber.connection.close()
+        try:
+            self._stream.manager.release(subscriber.owner)
+        except Exception as e:
+            self._logger.error(f"Could not release subscriptions of {subscriber.owner}: {e}")
+        self._logger.info(f"Subscriber {subscriber.owner} disconnected.")
+
+    def stop(self):
+        """
+        Stop accepting subscribers and disconnect all of them (their subscriptions are released)
+        """
+        self.active = False
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+        for subscriber in self._subscribers:
+            self._remove(subscriber)
+
+
+class RemoteStream:
+
+    def __init__(self, address: str | tuple = None, authkey: bytes = None):
+        """
+        Initialize a stream that receives messages from a StreamPublisher in another process instead of connecting to Schwab
+        Requests are made with the same helpers as Stream (e.g. streamer.send(streamer.level_one_equities("AMD", "0,1,2")))
+        and are applied by the publisher, no client or login is needed.
+        :param address: address of the publisher, None = default_address()
+        :type address: str | tuple | None
+        :param authkey: key of the publisher, None = read the key written by a publisher of this user (default address only)
+        :type authkey: bytes | None
+        """
+        self.address = address or default_address()            # address of the publisher
+        self._authkey = authkey                                 # key of the publisher
+        self._connection = None                                 # connection to the publisher
+        self._send_lock = threading.Lock()                      # guards writes to the connection
+        self._request_id = 0                                    # a counter for the request id
+        self._replies = {}                                      # reply id -> futures for the requests
+        self.active = False                                     # whether messages are being received
+        self._thread = None                                     # the thread that receives messages
+        self._logger = logging.getLogger("Schwabdev.RemoteStream")
+
+    def _connect(self):
+        """
+        Connect to the publisher (if not connected)
+        """
+        if self._connection is None:
+            authkey = self._authkey
+            if authkey is None:
+                try:
+                    with open(default_authkey_path(), "rb") as f:
+                        authkey = f.read()
+                except FileNotFoundError:
+                    raise Exception("[Schwabdev] No publisher key found, start a StreamPublisher without an authkey first or pass its authkey.")
+            self._connection = multiprocessing.connection.Client(self.address, authkey=authkey)
+            self._logger.info(f"Connected to publisher on {self.address}")
+
+    def _call(self, request: dict) -> concurrent.futures.Future:
+        """
+        Send a request to the publisher
+        :param request: request (an "id" is added)
+        :type request: dict
+        :return: future that completes with the publisher's reply
+        :rtype: concurrent.futures.Future
+        """
+        self._connect()
+        future = concurrent.futures.Future()
+        with self._send_lock:
+            self._request_id += 1
+            request["id"] = self._request_id
+            self._replies[self._request_id] = future
+            self._connection.send_bytes(json.dumps(request).encode())
+        return future
+
+    def _receive(self, receiver, kwargs: dict):
+        """
+        Receive messages until the connection closes (runs on its own thread)
+        :param receiver: function to call with each message
+        :type receiver: function
+        :param kwargs: kwargs to pass to receiver
+        :type kwargs: dict
+        """
+        try:
+            while True:
+                message = self._connection.recv_bytes().decode()
+                if message.startswith('{"reply"'):
+                    reply = json.loads(message)
+                    future = self._replies.pop(reply.get("reply"), None)
+                    if future is None:
+                        continue
+                    if "error" in reply:
+                        future.set_exception(Exception(reply["error"]))
+                    else:
+                        future.set_result(reply.get("result"))
+                    continue
+                try:
+                    receiver(message, **kwargs)
+                except Exception as e:
+                    self._logger.error(f"Receiver error: {e}")
+        except (OSError, EOFError):
+            if self.active:
+                self._logger.warning("Publisher closed the connection.")
+        self.active = False
+        for future in self._replies.values():
+            future.done() or future.set_result(None)
+        self._replies.clear()
+
+    def start(self, receiver=print, daemon: bool = True, **kwargs):
+        """
+        Connect to the publisher and receive messages on a background thread
+        :param receiver: function to call with each message
+        :type receiver: function
+        :param daemon: whether to run the thread in the background (as a daemon)
+        :type daemon: bool
+        :param kwargs: kwargs to pass to receiver
+        :type kwargs: dict
+        """
+        if self.active:
+            self._logger.warning("Remote stream already active.")
+            return
+        self._connect()
+        self.active = True
+        self._thread = threading.Thread(target=self._receive, args=(receiver, kwargs), daemon=daemon)
+        self._thread.start()
+
+    def send(self, requests: list | dict) -> list:
+        """
+        Send requests to the publisher, which adds (or removes) this process's interest in the shared subscriptions
+        :param requests: list of requests or a single request
+        :type requests: list | dict
+        :return: futures (one per request) that complete with the server's responses to the requests the publisher had to send
+        :rtype: list[concurrent.futures.Future]
+        """
+        requests = requests if isinstance(requests, list) else [requests]
+        requests = [request for request in requests if request]
+        reply = self._call({"op": "send", "requests": requests})
+        futures = [concurrent.futures.Future() for _ in requests]
+
+        def done(future):
+            error = future.exception()
+            for i, request_future in enumerate(futures):
+                if error is not None:
+                    request_future.set_exception(error)
+                else:
+                    request_future.set_result((future.result() or [None] * len(futures))[i])
+        reply.add_done_callback(done)
+        return futures
+
+    def subscribe_topics(self, service: str, keys: str | list = None) -> concurrent.futures.Future:
+        """
+        Receive a service's messages (for the given keys) without subscribing, e.g. to share keys another process subscribed to
+        :param service: service (e.g. "LEVELONE_EQUITIES")
+        :type service: str
+        :param keys: list of keys, None = all keys
+        :type keys: str | list | None
+        :return: future that completes once the publisher applied the topics
+        :rtype: concurrent.futures.Future
+        """
+        return self._call({"op": "topics", "service": service, "keys": None if keys is None else Stream._string_to_list(keys)})
+
+    def unsubscribe_topics(self, service: str, keys: str | list = None) -> concurrent.futures.Future:
+        """
+        Stop receiving topics added with subscribe_topics (subscriptions are not changed)
+        :param service: service (e.g. "LEVELONE_EQUITIES")
+        :type service: str
+        :param keys: list of keys, None = all keys
+        :type keys: str | list | None
+        :return: future that completes once the publisher applied the topics
+        :rtype: concurrent.futures.Future
+        """
+        return self._call({"op": "topics", "service": service, "keys": None if keys is None else Stream._string_to_list(keys), "remove": True})
+
+    def stop(self):
+        """
+        Disconnect from the publisher, which releases this process's subscriptions
+        """
+        self.active = False
+        if self._connection is None:
+            return
+        try:
+            with self._send_lock:
+                self._connection.send_bytes(json.dumps({"op": "close"}).encode())
+        except OSError:
+            pass
+        if self._thread is not None:
+            self._thread.join(5)
+        self._connection.close()
+        self._connection = None
+
+    def basic_request(self, service: str, command: str, parameters: dict = None) -> dict:
+        """
+        Create a basic request (same format as Stream.basic_request, the publisher fills in the login details)
+        :param service: service to use
+        :type service: str
+        :param command: command to use ("SUBS"|"ADD"|"UNSUBS"|"VIEW")
+        :type command: str
+        :param parameters: parameters to use
+        :type parameters: dict
+        :return: stream request
+        :rtype: dict
+        """
+        if parameters is not None:
+            parameters = {key: value for key, value in parameters.items() if value is not None}
+        request = {"service": service.upper(), "command": command.upper()}
+        if parameters: request["parameters"] = parameters
+        return request
+
+    # request helpers are shared with Stream
+    level_one_equities = Stream.level_one_equities
+    level_one_options = Stream.level_one_options
+    level_one_futures = Stream.level_one_futures
+    level_one_futures_options = Stream.level_one_futures_options
+    level_one_forex = Stream.level_one_forex
+    nyse_book = Stream.nyse_book
+    nasdaq_book = Stream.nasdaq_book
+    options_book = Stream.options_book
+    chart_equity = Stream.chart_equity
+    chart_futures = Stream.chart_futures
+    screener_equity = Stream.screener_equity
+    screener_options = Stream.screener_options
+    account_activity = Stream.account_activity
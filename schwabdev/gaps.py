@@ -0,0 +1,212 @@
+"""
+This file contains a gap filler that checks chart stream sequences and backfills missing bars from price history
+Github: https://github.com/tylerebowers/Schwab-API-Python
+"""
+
+import json
+import logging
+import threading
+import concurrent.futures
+
+
+class ChartGapFiller:
+
+    services = ("CHART_EQUITY", "CHART_FUTURES")
+    minute = 60000                                              # ms per chart bar
+
+    def __init__(self, client, on_bar, other_receiver=None, workers: int = 2, max_gap: int = 390):
+        """
+        Initialize a gap filler for CHART_EQUITY and CHART_FUTURES, pass it as the receiver: streamer.start(filler)
+        Bars are delivered to on_bar in time order for each symbol, duplicates are dropped and missing bars are fetched with client.price_history(...).
+        Gaps are found by the bar sequence numbers (a quiet minute without trades has no bar and is not a gap), or by time if there are none.
+        While a symbol's gap is being filled (on a worker thread) its live bars are held, other symbols are not delayed.
+        :param client: client used to get price history
+        :type client: Client
+        :param on_bar: function called with each bar, on_bar(bar: dict)
+        :type on_bar: function
+        :param other_receiver: function called with messages that contain no chart data, other_receiver(message)
+        :type other_receiver: function | None
+        :param workers: number of threads used for backfill requests
+        :type workers: int
+        :param max_gap: largest gap (in minutes) that is backfilled
+        :type max_gap: int
+        """
+        self._client = client                                   # client for price history
+        self.on_bar = on_bar                                    # receiver of bars
+        self.other_receiver = other_receiver                    # receiver for other messages
+        self.max_gap = max_gap                                  # largest gap backfilled (minutes)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ChartBackfill")
+        self._lock = threading.Lock()                           # guards the per symbol state
+        self._last = {}                                         # (service, key) -> (time, sequence) of the last bar delivered or accepted
+        self._held = {}                                         # (service, key) -> live bars held during a backfill
+        self._logger = logging.getLogger("Schwabdev.ChartGapFiller")
+        self.gaps = 0                                           # gaps found
+        self.duplicates = 0                                     # duplicate bars dropped
+        self.backfilled = 0                                     # bars filled from price history
+        self.failed = 0                                         # backfills that failed
+
+    def __call__(self, message, **kwargs):
+        """
+        Receiver interface so the gap filler can be passed directly to streamer.start(...)
+        :param message: message from the stream
+        :type message: str | dict
+        """
+        self.process(message)
+
+    @staticmethod
+    def _bar(service: str, content: dict) -> dict:
+        """
+        Convert a chart content entry to a bar
+        :param service: service name
+        :type service: str
+        :param content: content entry
+        :type content: dict
+        :return: bar (key, service, time (ms), open, high, low, close, volume, sequence)
+        :rtype: dict
+        """
+        if service == "CHART_EQUITY":
+            return {"key": content.get("key"), "service": service, "time": content.get("7"), "open": content.get("1"),
+                    "high": content.get("2"), "low": content.get("3"), "close": content.get("4"),
+                    "volume": content.get("5"), "sequence": content.get("6"), "backfilled": False}
+        return {"key": content.get("key"), "service": service, "time": content.get("1"), "open": content.get("2"),
+                "high": content.get("3"), "low": content.get("4"), "close": content.get("5"),
+                "volume": content.get("6"), "sequence": content.get("seq"), "backfilled": False}
+
+    def process(self, message: str | dict):
+        """
+        Check and deliver the chart bars in a message
+        :param message: message from the stream
+        :type message: str | dict
+        """
+        if isinstance(message, str):
+            message = json.loads(message)
+        data = message.get("data", None)
+        forward = data is None
+        for service in data or []:
+            name = service.get("service", None)
+            if name not in self.services:
+                forward = True
+                continue
+            for content in service.get("content", []):
+                self.add(self._bar(name, content))
+        if forward and self.other_receiver is not None:
+            self.other_receiver(message)
+
+    def add(self, bar: dict):
+        """
+        Check a live bar against the last bar of its symbol, then deliver, hold, or drop it
+        :param bar: bar
+        :type bar: dict
+        """
+        ident = (bar["service"], bar["key"])
+        gap = None
+        with self._lock:
+            last = self._last.get(ident, None)
+            held = self._held.get(ident, None)
+            if last is not None:
+                last_time, last_sequence = last
+                if bar["time"] is not None and last_time is not None and bar["time"] <= last_time:
+                    self.duplicates += 1
+                    return
+            if held is not None:  # a backfill is running, deliver after it
+                held.append(bar)
+                self._last[ident] = (bar["time"], bar["sequence"])
+                return
+            if last is not None:
+                if bar["sequence"] is not None and last_sequence is not None:
+                    missing = bar["sequence"] > last_sequence + 1  # a quiet minute has no bar but keeps the sequence (no backfill needed)
+                else:
+                    missing = bar["time"] is not None and last_time is not None and bar["time"] > last_time + self.minute
+                if missing and (bar["time"] is None or last_time is None):
+                    self._logger.warning(f"Gap found for {bar['key']} ({bar['service']}) but a bar has no time, it can not be backfilled.")
+                elif missing and bar["time"] - last_time <= (self.max_gap + 1) * self.minute:
+                    gap = (last_time, bar["time"])
+                    self._held[ident] = [bar]
+                    self.gaps += 1
+                elif missing:
+                    self._logger.warning(f"Gap of {(bar['time'] - last_time) // self.minute} minutes for {bar['key']} is too large to backfill.")
+            self._last[ident] = (bar["time"], bar["sequence"])
+        if gap is not None:
+            self._logger.info(f"Gap found for {bar['key']} ({bar['service']}), backfilling {(gap[1] - gap[0]) // self.minute - 1} minutes.")
+            self._executor.submit(self._backfill, ident, *gap)
+        else:
+            self._deliver([bar])
+
+    def _fetch(self, symbol: str, start: int, end: int) -> list:
+        """
+        Get one minute bars from price history between two times (exclusive)
+        :param symbol: symbol
+        :type symbol: str
+        :param start: time of the last bar before the gap (ms)
+        :type start: int
+        :param end: time of the first bar after the gap (ms)
+        :type end: int
+        :return: list of candles
+        :rtype: list
+        """
+        response = self._client.price_history(symbol, frequencyType="minute", frequency=1, startDate=start, endDate=end,
+                                              needExtendedHoursData=True)
+        if not response.ok:
+            raise Exception(f"[Schwabdev] Price history request failed ({response.status_code}): {response.text}")
+        return [candle for candle in response.json().get("candles", []) if start < candle.get("datetime", 0) < end]
+
+    def _backfill(self, ident: tuple, start: int, end: int):
+        """
+        Fill a gap then deliver the held live bars (runs on a worker thread)
+        :param ident: (service, key)
+        :type ident: tuple
+        :param start: time of the last bar before the gap (ms)
+        :type start: int
+        :param end: time of the first bar after the gap (ms)
+        :type end: int
+        """
+        service, key = ident
+        bars = []
+        try:
+            bars = [{"key": key, "service": service, "time": c.get("datetime"), "open": c.get("open"), "high": c.get("high"),
+                     "low": c.get("low"), "close": c.get("close"), "volume": c.get("volume"), "sequence": None, "backfilled": True}
+                    for c in self._fetch(key, start, end)]
+            self.backfilled += len(bars)
+        except Exception as e:
+            self.failed += 1
+            self._logger.error(f"Backfill failed for {key} ({service}): {e}")
+        while True:
+            with self._lock:
+                held = self._held.get(ident, [])
+                if not bars and not held:
+                    self._held.pop(ident, None)  # live bars are delivered directly again
+                    return
+                self._held[ident] = []
+            bars = sorted(bars + held, key=lambda b: b["time"] or 0)
+            self._deliver(bars)
+            bars = []
+
+    def _deliver(self, bars: list):
+        """
+        Deliver bars to on_bar
+        :param bars: bars in time order
+        :type bars: list
+        """
+        for bar in bars:
+            try:
+                self.on_bar(bar)
+            except Exception as e:
+                self._logger.error(f"on_bar error for {bar['key']}: {e}")
+
+    def stats(self) -> dict:
+        """
+        Get the counters
+        :return: counters (gaps, duplicates, backfilled, failed, pending)
+        :rtype: dict
+        """
+        with self._lock:
+            pending = len(self._held)
+        return {"gaps": self.gaps, "duplicates": self.duplicates, "backfilled": self.backfilled, "failed": self.failed, "pending": pending}
+
+    def stop(self, wait: bool = True):
+        """
+        Stop the backfill workers
+        :param wait: whether to wait for running backfills
+        :type wait: bool
+        """
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,299 @@
+"""
+This file contains a market calendar built from the market hours api, and a scheduler that runs the stream around market sessions
+Github: https://github.com/tylerebowers/Schwab-API-Python
+"""
+
+import logging
+import datetime
+import threading
+import zoneinfo
+
+
+class MarketCalendar:
+
+    def __init__(self, client, markets: list | tuple = ("equity", "option", "future"), timezone: str = "America/New_York"):
+        """
+        Initialize a calendar of market sessions, each day is loaded once with client.market_hours(...) (one call for all markets) and cached
+        Holidays have no session and early closes use the real close time.
+        :param client: client used to get market hours
+        :type client: Client
+        :param markets: markets to load ("equity", "option", "bond", "future", "forex")
+        :type markets: list | tuple
+        :param timezone: timezone of dates passed in (and of returned times)
+        :type timezone: str
+        """
+        self._client = client                                   # client for market hours
+        self.markets = tuple(markets)                           # markets loaded
+        self.timezone = zoneinfo.ZoneInfo(timezone)             # timezone of dates and times
+        self._days = {}                                         # date -> market -> {"regular": (start, end), "extended": (start, end)}
+        self._lock = threading.Lock()                           # guards the cache
+        self._logger = logging.getLogger("Schwabdev.MarketCalendar")
+
+    @staticmethod
+    def _parse(hours: dict) -> dict:
+        """
+        Combine the sessions of every product of a market into one regular and one extended session
+        :param hours: market hours of one market (product -> hours)
+        :type hours: dict
+        :return: {"regular": (start, end), "extended": (start, end)} or {} if closed
+        :rtype: dict
+        """
+        sessions = {"regular": [], "extended": []}
+        for product in hours.values():
+            if not product.get("isOpen", False):
+                continue
+            for name, intervals in (product.get("sessionHours", None) or {}).items():
+                for interval in intervals:
+                    times = (datetime.datetime.fromisoformat(interval["start"]), datetime.datetime.fromisoformat(interval["end"]))
+                    sessions["extended"].append(times)
+                    if name == "regularMarket":
+                        sessions["regular"].append(times)
+        return {name: (min(start for start, end in times), max(end for start, end in times))
+                for name, times in sessions.items() if times}
+
+    def load(self, date: datetime.date) -> dict:
+        """
+        Load the sessions of a day (cached after the first call)
+        :param date: date
+        :type date: datetime.date
+        :return: market -> {"regular": (start, end), "extended": (start, end)}, closed markets are left out
+        :rtype: dict
+        """
+        with self._lock:
+            if date in self._days:
+                return self._days[date]
+            response = self._client.market_hours(",".join(self.markets), date.strftime("%Y-%m-%d"))
+            if not response.ok:
+                raise Exception(f"[Schwabdev] Market hours request failed ({response.status_code}): {response.text}")
+            hours = response.json()
+            day = {market: self._parse(hours.get(market, {})) for market in self.markets}
+            self._days[date] = day = {market: sessions for market, sessions in day.items() if sessions}
+            return day
+
+    def session(self, market: str, date: datetime.date = None, extended: bool = False) -> tuple | None:
+        """
+        Get the session of a market on a day
+        :param market: market ("equity", "option", "future", ...)
+        :type market: str
+        :param date: date, None = today
+        :type date: datetime.date | None
+        :param extended: whether to include pre and post market hours
+        :type extended: bool
+        :return: (start, end) datetimes or None if the market is closed
+        :rtype: tuple | None
+        """
+        date = date or datetime.datetime.now(self.timezone).date()
+        sessions = self.load(date).get(market, {})
+        return sessions.get("extended" if extended else "regular", sessions.get("regular", None))
+
+    def is_open(self, market: str, when: datetime.datetime = None, extended: bool = False) -> bool:
+        """
+        Whether a market is in session
+        :param market: market
+        :type market: str
+        :param when: time, None = now
+        :type when: datetime.datetime | None
+        :param extended: whether pre and post market hours count
+        :type extended: bool
+        :return: whether the market is in session
+        :rtype: bool
+        """
+        when = when or datetime.datetime.now(self.timezone)
+        session = self.session(market, when.astimezone(self.timezone).date(), extended)
+        return session is not None and session[0] <= when < session[1]
+
+    def next_session(self, market: str, after: datetime.datetime = None, extended: bool = False, days: int = 10) -> tuple | None:
+        """
+        Get the current or next session of a market
+        :param market: market
+        :type market: str
+        :param after: time, None = now
+        :type after: datetime.datetime | None
+        :param extended: whether to include pre and post market hours
+        :type extended: bool
+        :param days: number of days to look ahead
+        :type days: int
+        :return: (start, end) of the first session that ends after the time, or None if there is none within days
+        :rtype: tuple | None
+        """
+        after = after or datetime.datetime.now(self.timezone)
+        date = after.astimezone(self.timezone).date()
+        for offset in range(days):
+            session = self.session(market, date + datetime.timedelta(days=offset), extended)
+            if session is not None and session[1] > after:
+                return session
+        return None
+
+
+class StreamScheduler:
+
+    def __init__(self, stream, calendar: MarketCalendar, receiver=print, connect_lead: float = 60.0, warmup: float = 300.0,
+                 on_warmup=None, daemon: bool = True, **kwargs):
+        """
+        Initialize a scheduler that connects the stream for market sessions, timers run on the client's scheduler
+        Each market has its own subscriptions, they are added connect_lead seconds before the market opens and released when it closes;
+        the stream is started with the first market and stopped (subscriptions kept) once no market is in session.
+        :param stream: stream to run
+        :type stream: Stream
+        :param calendar: market calendar
+        :type calendar: MarketCalendar
+        :param receiver: function to call when data is received
+        :type receiver: function
+        :param connect_lead: seconds before a market opens to connect and subscribe
+        :type connect_lead: float
+        :param warmup: seconds before a market opens to call on_warmup
+        :type warmup: float
+        :param on_warmup: function called before each market opens, on_warmup(market, session)
+        :type on_warmup: function | None
+        :param daemon: whether to run the stream thread as a daemon
+        :type daemon: bool
+        :param kwargs: kwargs for stream.start (e.g. standby=True)
+        :type kwargs: dict
+        """
+        self._stream = stream                                   # stream to run
+        self.calendar = calendar                                # market calendar
+        self.receiver = receiver                                # receiver for the stream
+        self.connect_lead = connect_lead                        # seconds before open to connect
+        self.warmup = warmup                                    # seconds before open to warm up
+        self.on_warmup = on_warmup                              # warmup hook
+        self.daemon = daemon                                    # whether the stream thread is a daemon
+        self._kwargs = kwargs                                   # kwargs for stream.start
+        self._markets = {}                                      # market -> {"requests": [...], "extended": bool}
+        self._fired = set()                                     # (market, session start, event) already run
+        self._open = {}                                         # market -> session it is connected for
+        self._scheduler = stream._client.scheduler              # runs the timers
+        self._job = None                                        # the armed timer
+        self._lock = threading.Lock()                           # one check of the timers at a time
+        self.active = False                                     # whether the scheduler is running
+        self.retry = 60.0                                       # seconds to wait after a market hours error
+        self._logger = logging.getLogger("Schwabdev.StreamScheduler")
+
+    def add_market(self, market: str, requests: list | dict = None, extended: bool = False):
+        """
+        Add a market to run the stream for
+        :param market: market ("equity", "option", "future", ...), must be one of calendar.markets
+        :type market: str
+        :param requests: subscriptions for the market, e.g. [streamer.level_one_equities("AMD,INTC", "0,1,2,3")] (ADD/SUBS requests)
+        :type requests: list | dict | None
+        :param extended: whether to stream during pre and post market hours
+        :type extended: bool
+        """
+        if market not in self.calendar.markets:
+            raise Exception(f"[Schwabdev] Market {market} is not loaded by the calendar; options are {self.calendar.markets}")
+        requests = requests if isinstance(requests, list) else [requests] if requests else []
+        self._markets[market] = {"requests": [request for request in requests if request], "extended": extended}
+        if self.active:
+            self._arm(0)
+
+    def _events(self, now: datetime.datetime) -> list:
+        """
+        Get the timers of the current (or next) session of every market
+        :param now: current time
+        :type now: datetime.datetime
+        :return: sorted list of (time, market, event, session), event is "connect", "warmup", or "disconnect"
+        :rtype: list
+        """
+        events = []
+        for market, settings in self._markets.items():
+            session = self._open.get(market, None) or self.calendar.next_session(market, now, settings["extended"])
+            if session is None:
+                continue
+            start, end = session
+            events.append((start - datetime.timedelta(seconds=self.connect_lead), market, "connect", session))
+            if self.on_warmup is not None and now < start:
+                events.append((start - datetime.timedelta(seconds=self.warmup), market, "warmup", session))
+            events.append((end, market, "disconnect", session))
+        return sorted(events, key=lambda event: event[0])
+
+    def _fire(self, market: str, event: str, session: tuple):
+        """
+        Run one timer
+        :param market: market
+        :type market: str
+        :param event: "connect", "warmup", or "disconnect"
+        :type event: str
+        :param session: (start, end) of the session
+        :type session: tuple
+        """
+        owner = f"schedule-{market}"
+        if event == "warmup":
+            self.on_warmup(market, session)
+        elif event == "connect":
+            self._logger.info(f"Connecting for the {market} session ({session[0]} to {session[1]}).")
+            for request in self._markets[market]["requests"]:
+                parameters = request.get("parameters", {})
+                self._stream.manager.subscribe(owner, request["service"], parameters.get("keys", ""), parameters.get("fields", ""))
+            self._open[market] = session
+            if not self._stream.active:
+                self._stream.start(self.receiver, daemon=self.daemon, **self._kwargs)
+        elif event == "disconnect" and market in self._open:
+            self._logger.info(f"The {market} session ended.")
+            del self._open[market]
+            self._stream.manager.release(owner)
+            if not self._open and self._stream.active:
+                self._logger.info("Stopping Stream.")
+                self._stream.stop(clear_subscriptions=False)
+
+    def _arm(self, delay: float):
+        """
+        Replace the armed timer
+        :param delay: seconds until the timers are checked
+        :type delay: float
+        """
+        if self._job is not None:
+            self._job.cancel()
+        self._job = self._scheduler.call_later(delay, self._check, blocking=True, name="stream schedule")
+
+    def _check(self):
+        """
+        Run the timers that are due and arm the next one (runs on a scheduler worker)
+        """
+        with self._lock:
+            while self.active:
+                now = datetime.datetime.now(self.calendar.timezone)
+                try:
+                    events = self._events(now)
+                except Exception as e:
+                    self._logger.error(f"Could not load market hours: {e}")
+                    self._arm(self.retry)
+                    return
+                pending = [(when, market, event, session) for when, market, event, session in events
+                           if (market, session[0], event) not in self._fired]
+                if not pending:
+                    self._arm(3600)  # no session within the look ahead, check again later
+                    return
+                when, market, event, session = pending[0]
+                if when > now:
+                    self._arm((when - now).total_seconds())
+                    return
+                self._fired.add((market, session[0], event))
+                try:
+                    self._fire(market, event, session)
+                except Exception as e:
+                    self._logger.error(f"Scheduled {event} for {market} failed: {e}")
+
+    def start(self):
+        """
+        Start the scheduler, a market already in session is connected immediately
+        :return: this scheduler
+        :rtype: StreamScheduler
+        """
+        if self.active:
+            self._logger.warning("Scheduler already active.")
+            return self
+        self.active = True
+        self._arm(0)
+        return self
+
+    def stop(self, stop_stream: bool = True):
+        """
+        Stop the scheduler
+        :param stop_stream: whether to also stop the stream (subscriptions are kept)
+        :type stop_stream: bool
+        """
+        self.active = False
+        if self._job is not None:
+            self._job.cancel()
+            self._job = None
+        if stop_stream and self._stream.active:
+            self._stream.stop(clear_subscriptions=False)
@@ -0,0 +1,219 @@
+"""
+This file contains latency metrics for stream messages (network latency, queueing delay, and handler time)
+Github: https://github.com/tylerebowers/Schwab-API-Python
+"""
+
+import re
+import json
+import math
+import collections
+
+_timestamps = re.compile(r'"service": ?"([A-Z_]+)", ?"timestamp": ?(\d+)')  # server timestamp of each service in a data message (in the usual key order)
+
+
+class Histogram:
+
+    steps = 4                                                   # buckets per doubling (about 19% wide)
+    size = 4 * 40                                               # buckets (up to about 2^40 us)
+
+    def __init__(self):
+        """
+        Histogram of durations with logarithmic buckets, adding a value is O(1)
+        """
+        self.counts = [0] * self.size                           # count per bucket
+        self.count = 0                                          # number of values
+        self.total = 0.0                                        # sum of values (us)
+        self.max = 0.0                                          # largest value (us)
+
+    def add(self, value: float):
+        """
+        Add a value
+        :param value: duration in microseconds (negative values count as 0)
+        :type value: float
+        """
+        value = max(value, 0)
+        if value < 1:
+            bucket = 0
+        else:
+            mantissa, exponent = math.frexp(value)  # value = mantissa * 2 ** exponent, 0.5 <= mantissa < 1
+            bucket = min(exponent * self.steps + int((mantissa - 0.5) * 2 * self.steps), self.size - 1)
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def _bound(self, bucket: int) -> float:
+        """
+        Upper bound of a bucket (us)
+        :param bucket: bucket
+        :type bucket: int
+        :return: upper bound
+        :rtype: float
+        """
+        exponent, step = divmod(bucket, self.steps)
+        return (0.5 + (step + 1) / (2 * self.steps)) * 2 ** exponent
+
+    def percentile(self, p: float) -> float | None:
+        """
+        Get a percentile (upper bound of its bucket, at most the largest value)
+        :param p: percentile (0-100)
+        :type p: float
+        :return: value in microseconds or None if empty
+        :rtype: float | None
+        """
+        if not self.count:
+            return None
+        target = p / 100 * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= target:
+                return min(self._bound(bucket), self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        """
+        Get the count, mean, percentiles, and max in milliseconds
+        :return: {"count", "mean", "p50", "p90", "p99", "p999", "max"}
+        :rtype: dict
+        """
+        if not self.count:
+            return {"count": 0}
+        return {"count": self.count, "mean": self.total / self.count / 1000, "p50": self.percentile(50) / 1000,
+                "p90": self.percentile(90) / 1000, "p99": self.percentile(99) / 1000, "p999": self.percentile(99.9) / 1000,
+                "max": self.max / 1000}
+
+    def reset(self):
+        """
+        Clear the histogram
+        """
+        self.counts = [0] * self.size
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+
+class StreamMetrics:
+
+    def __init__(self, baseline_window: float = 300.0):
+        """
+        Initialize stream metrics, per service histograms of:
+        latency (server timestamp to receive, includes the offset between the server and local clocks),
+        excess latency (latency above the baseline, the lowest latency recently seen: clock offset plus the fastest network path),
+        queue (frame arrival to handler start), and handler (handler run time).
+        The clock offset cannot be told apart from the network latency, so excess latency is the delay added on top of the best case, not the true latency.
+        :param baseline_window: seconds of latencies used for the baseline (rolling minimum)
+        :type baseline_window: float
+        """
+        self.enabled = True                                     # whether messages are measured
+        self.baseline_window = baseline_window                  # seconds in the baseline window
+        self._services = {}                                     # service -> {histogram name: Histogram}
+        self._minimums = collections.deque()                    # (second, minimum raw latency in ms) for the baseline window
+        self.baseline = None                                    # lowest recent latency, clock offset + fastest network path (ms)
+        self.missed = 0                                         # data messages without a readable server timestamp
+
+    def _histograms(self, service: str) -> dict:
+        """
+        Get (or create) the histograms of a service
+        :param service: service name
+        :type service: str
+        :return: {histogram name: Histogram}
+        :rtype: dict
+        """
+        histograms = self._services.get(service, None)
+        if histograms is None:
+            histograms = self._services[service] = {"latency": Histogram(), "latency_excess": Histogram(),
+                                                    "queue": Histogram(), "handler": Histogram()}
+        return histograms
+
+    def _update_baseline(self, received_ms: int, latency: int):
+        """
+        Add a raw latency to the rolling minimum (a monotonic deque of per second minimums)
+        :param received_ms: receive time (ms since epoch)
+        :type received_ms: int
+        :param latency: raw latency (ms)
+        :type latency: int
+        """
+        second = received_ms // 1000
+        minimums = self._minimums
+        if minimums and minimums[-1][0] == second:
+            if latency >= minimums[-1][1]:
+                return
+            minimums.pop()
+        while minimums and minimums[-1][1] >= latency:
+            minimums.pop()
+        minimums.append((second, latency))
+        while minimums[0][0] <= second - self.baseline_window:
+            minimums.popleft()
+        self.baseline = minimums[0][1]
+
+    def observe(self, message: str, received_ns: int, queue_ns: int = None, handler_ns: int = None):
+        """
+        Measure one message (cheap: one regex over the message and a few histogram updates, the message is only decoded if the regex misses a service)
+        :param message: message from the stream
+        :type message: str
+        :param received_ns: receive time (ns since epoch, time.time_ns())
+        :type received_ns: int
+        :param queue_ns: time from the frame's arrival to handler start (ns)
+        :type queue_ns: int | None
+        :param handler_ns: handler run time (ns)
+        :type handler_ns: int | None
+        """
+        if not self.enabled:
+            return
+        received_ms = received_ns // 1000000
+        services = ()
+        if message.startswith('{"data"'):
+            services = _timestamps.findall(message)
+            if len(services) != message.count('"service"'):  # keys in another order
+                services = self._timestamps(message)
+        for service, timestamp in services:
+            latency = received_ms - int(timestamp)
+            self._update_baseline(received_ms, latency)
+            histograms = self._histograms(service)
+            histograms["latency"].add(latency * 1000)
+            histograms["latency_excess"].add((latency - self.baseline) * 1000)
+        if queue_ns is None and handler_ns is None:
+            return
+        histograms = self._histograms(services[0][0] if services else "OTHER")  # the first service of a message gets the handler time
+        if queue_ns is not None:
+            histograms["queue"].add(queue_ns / 1000)
+        if handler_ns is not None:
+            histograms["handler"].add(handler_ns / 1000)
+
+    def _timestamps(self, message: str) -> list:
+        """
+        Get the server timestamp of each service by decoding the message, messages without one are counted in missed
+        :param message: data message
+        :type message: str
+        :return: list of (service, timestamp)
+        :rtype: list
+        """
+        try:
+            data = json.loads(message).get("data", [])
+            services = [(entry["service"], entry["timestamp"]) for entry in data if "service" in entry and "timestamp" in entry]
+        except Exception:
+            data, services = None, []
+        if not data or len(services) != len(data):
+            self.missed += 1
+        return services
+
+    def snapshot(self) -> dict:
+        """
+        Get a snapshot of the metrics (times in milliseconds)
+        :return: {"baseline": ms, "missed": count, "services": {service: {"latency": {...}, "latency_excess": {...}, "queue": {...}, "handler": {...}}}}
+        :rtype: dict
+        """
+        return {"baseline": self.baseline, "missed": self.missed,
+                "services": {service: {name: histogram.summary() for name, histogram in histograms.items()}
+                             for service, histograms in list(self._services.items())}}
+
+    def reset(self):
+        """
+        Clear all histograms and the baseline
+        """
+        self._services.clear()
+        self._minimums.clear()
+        self.baseline = None
+        self.missed = 0
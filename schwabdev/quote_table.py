@@ -0,0 +1,260 @@
+"""
+This file contains a shared memory table of the latest level one quotes, written by the stream process and read by any local process
+Github: https://github.com/tylerebowers/Schwab-API-Python
+"""
+
+import json
+import math
+import time
+import struct
+import logging
+from multiprocessing import shared_memory
+
+HEADER = struct.Struct("<4sHHII48x")                            # magic, version, row size, capacity, rows used (64 bytes)
+SEQUENCE = struct.Struct("<Q")                                  # row version (odd while the row is being written)
+SYMBOL = struct.Struct("<32s")                                  # row symbol (written once, before the row is counted)
+VALUES = struct.Struct("<7d3q")                                 # bid, ask, last, bid size, ask size, last size, volume, quote time, trade time, updated
+ROW_SIZE = 128                                                  # bytes per row (sequence + symbol + values, padded to 2 cache lines)
+MAGIC = b"SDQT"
+VERSION = 1
+
+
+def _open(name: str) -> shared_memory.SharedMemory:
+    """
+    Attach to an existing shared memory block without letting this process's resource tracker remove it at exit
+    :param name: name of the block
+    :type name: str
+    :return: shared memory block
+    :rtype: shared_memory.SharedMemory
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # python 3.13+
+    except TypeError:
+        memory = shared_memory.SharedMemory(name=name)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(memory._name, "shared_memory")
+        except Exception:
+            pass
+        return memory
+
+
+class QuoteTable:
+
+    columns = ("bid", "ask", "last", "bid_size", "ask_size", "last_size", "volume", "quote_time", "trade_time", "updated")
+    fields = {"LEVELONE_EQUITIES": ("1", "2", "3", "4", "5", "9", "8", "34", "35"),  # service -> fields of the columns (up to trade time)
+              "LEVELONE_OPTIONS": ("2", "3", "4", "16", "17", "18", "8", "38", "39"),
+              "LEVELONE_FUTURES": ("1", "2", "3", "4", "5", "9", "8", "10", "11"),
+              "LEVELONE_FUTURES_OPTIONS": ("1", "2", "3", "4", "5", "9", "8", "10", "11"),
+              "LEVELONE_FOREX": ("1", "2", "3", "4", "5", "7", "6", "8", "9")}
+
+    def __init__(self, name: str = "schwabdev-quotes", create: bool = False, capacity: int = 4096, other_receiver=None):
+        """
+        Initialize a table of the latest level one quote of each symbol in shared memory, rows have a fixed layout and are versioned with a seqlock
+        The stream process creates the table and passes it as the receiver: streamer.start(table), other processes attach to it by name and read
+        consistent rows directly from shared memory (nothing is sent to them).
+        :param name: name of the shared memory block
+        :type name: str
+        :param create: True for the writer (the stream process), False to attach to an existing table
+        :type create: bool
+        :param capacity: maximum number of symbols (only used when creating)
+        :type capacity: int
+        :param other_receiver: function called with every message after it is applied (writer only), other_receiver(message)
+        :type other_receiver: function | None
+        """
+        self.name = name                                        # name of the shared memory block
+        self.writer = create                                    # whether this process writes the table
+        self.other_receiver = other_receiver                    # receiver for all messages
+        self._logger = logging.getLogger("Schwabdev.QuoteTable")
+        if create:
+            size = HEADER.size + capacity * ROW_SIZE
+            try:
+                self._memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+            except FileExistsError:
+                self._logger.warning(f"Replacing existing shared memory block {name} (left over from a previous writer?)")
+                stale = _open(name)
+                stale.close()
+                stale.unlink()
+                self._memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+            HEADER.pack_into(self._memory.buf, 0, MAGIC, VERSION, ROW_SIZE, capacity, 0)
+        else:
+            self._memory = _open(name)
+            magic, version, row_size, capacity, used = HEADER.unpack_from(self._memory.buf, 0)
+            if magic != MAGIC or version != VERSION or row_size != ROW_SIZE:
+                self._memory.close()
+                raise Exception(f"[Schwabdev] Shared memory block {name} is not a quote table (or has a different version).")
+        self._buffer = self._memory.buf                         # shared memory
+        self.capacity = capacity                                # maximum number of symbols
+        self._rows = {}                                         # symbol -> row number
+        self._values = []                                       # row number -> latest values (writer only, deltas are merged here)
+        self._sequences = []                                    # row number -> row version (writer only)
+        self._full = False                                      # whether a symbol was dropped because the table is full
+
+    def __call__(self, message, **kwargs):
+        """
+        Receiver interface so the table can be passed directly to streamer.start(...)
+        :param message: message from the stream
+        :type message: str | dict
+        """
+        self.process(message)
+
+    def __len__(self):
+        return HEADER.unpack_from(self._buffer, 0)[4]
+
+    def process(self, message: str | dict):
+        """
+        Apply the level one data in a message to the table (writer only)
+        :param message: message from the stream
+        :type message: str | dict
+        """
+        if isinstance(message, str):
+            decoded = json.loads(message) if message.startswith('{"data"') else {}
+        else:
+            decoded = message
+        for service in decoded.get("data", []):
+            fields = self.fields.get(service.get("service", None), None)
+            if fields is None:
+                continue
+            for content in service.get("content", []):
+                key = content.get("key", None)
+                if key is not None:
+                    self.update(key, {column: content[field] for column, field in zip(self.columns, fields) if field in content})
+        if self.other_receiver is not None:
+            self.other_receiver(message)
+
+    def update(self, symbol: str, values: dict):
+        """
+        Merge changed values into a symbol's row (writer only), the row version is odd while the row is being written
+        :param symbol: symbol
+        :type symbol: str
+        :param values: column -> value for the changed columns (see QuoteTable.columns)
+        :type values: dict
+        """
+        row = self._rows.get(symbol, None)
+        if row is None:
+            row = self._add(symbol)
+            if row is None:
+                return
+        current = self._values[row]
+        for i, column in enumerate(self.columns[:9]):
+            value = values.get(column, None)
+            if value is not None:
+                current[i] = int(value) if i >= 7 else float(value)
+        current[9] = time.time_ns()
+        offset = HEADER.size + row * ROW_SIZE
+        sequence = self._sequences[row] + 2
+        self._sequences[row] = sequence
+        SEQUENCE.pack_into(self._buffer, offset, sequence - 1)
+        VALUES.pack_into(self._buffer, offset + 40, *current)
+        SEQUENCE.pack_into(self._buffer, offset, sequence)
+
+    def _add(self, symbol: str) -> int | None:
+        """
+        Add a row for a new symbol (writer only), the row is counted after it is written so readers never see a partial row
+        :param symbol: symbol
+        :type symbol: str
+        :return: row number or None if the table is full
+        :rtype: int | None
+        """
+        if not self.writer:
+            raise Exception("[Schwabdev] Only the process that created the quote table can write to it.")
+        row = len(self._values)
+        if row >= self.capacity:
+            if not self._full:
+                self._logger.warning(f"Quote table is full ({self.capacity} symbols), new symbols are dropped.")
+                self._full = True
+            return None
+        encoded = symbol.encode()
+        if len(encoded) > SYMBOL.size:
+            self._logger.warning(f"Symbol {symbol} is too long for the quote table.")
+            return None
+        offset = HEADER.size + row * ROW_SIZE
+        SEQUENCE.pack_into(self._buffer, offset, 0)
+        SYMBOL.pack_into(self._buffer, offset + 8, encoded)
+        self._values.append([math.nan] * 7 + [0, 0, 0])
+        self._sequences.append(0)
+        VALUES.pack_into(self._buffer, offset + 40, *self._values[row])
+        self._rows[symbol] = row
+        HEADER.pack_into(self._buffer, 0, MAGIC, VERSION, ROW_SIZE, self.capacity, row + 1)
+        return row
+
+    def _row(self, symbol: str) -> int | None:
+        """
+        Get the row of a symbol, new rows added by the writer are indexed on a miss
+        :param symbol: symbol
+        :type symbol: str
+        :return: row number or None if the symbol is not in the table
+        :rtype: int | None
+        """
+        row = self._rows.get(symbol, None)
+        if row is None and not self.writer:
+            for row in range(len(self._rows), len(self)):
+                offset = HEADER.size + row * ROW_SIZE + 8
+                self._rows[SYMBOL.unpack_from(self._buffer, offset)[0].rstrip(b"\x00").decode()] = row
+            row = self._rows.get(symbol, None)
+        return row
+
+    def values(self, symbol: str) -> tuple | None:
+        """
+        Read a consistent copy of a symbol's row (retried while the writer is changing it)
+        :param symbol: symbol
+        :type symbol: str
+        :return: values in the order of QuoteTable.columns (NaN or 0 if never received) or None if the symbol is not in the table
+        :rtype: tuple | None
+        """
+        row = self._row(symbol)
+        if row is None:
+            return None
+        offset = HEADER.size + row * ROW_SIZE
+        buffer = self._buffer
+        for attempt in range(100000):
+            before = SEQUENCE.unpack_from(buffer, offset)[0]
+            if not before & 1:
+                values = VALUES.unpack_from(buffer, offset + 40)
+                if SEQUENCE.unpack_from(buffer, offset)[0] == before:
+                    return values
+            if attempt & 63 == 63:
+                time.sleep(0)  # let the writer finish
+        raise Exception(f"[Schwabdev] Quote row of {symbol} is stuck in a write (did the writer crash?).")
+
+    def get(self, symbol: str) -> dict | None:
+        """
+        Read a symbol's row as a dict
+        :param symbol: symbol
+        :type symbol: str
+        :return: column -> value or None if the symbol is not in the table
+        :rtype: dict | None
+        """
+        values = self.values(symbol)
+        return None if values is None else dict(zip(self.columns, values))
+
+    def quote(self, symbol: str) -> tuple | None:
+        """
+        Read a symbol's bid, ask, and last (from the same version of the row)
+        :param symbol: symbol
+        :type symbol: str
+        :return: (bid, ask, last) or None if the symbol is not in the table
+        :rtype: tuple | None
+        """
+        values = self.values(symbol)
+        return None if values is None else values[:3]
+
+    def symbols(self) -> list:
+        """
+        Get the symbols in the table
+        :return: list of symbols in row order
+        :rtype: list
+        """
+        self._row("")
+        return sorted(self._rows, key=self._rows.get)
+
+    def close(self, unlink: bool = None):
+        """
+        Detach from the table, the writer also removes the shared memory block
+        :param unlink: whether to remove the shared memory block, None = only if this process is the writer
+        :type unlink: bool | None
+        """
+        self._buffer = None
+        self._memory.close()
+        if self.writer if unlink is None else unlink:
+            self._memory.unlink()
@@ -0,0 +1,602 @@
+"""
+This file contains a recorder that archives stream messages in compact binary segment files
+Github: https://github.com/tylerebowers/Schwab-API-Python
+"""
+
+import os
+import json
+import mmap
+import time
+import zlib
+import struct
+import logging
+import datetime
+import zoneinfo
+import threading
+import collections
+from .book import _numpy
+
+"""
+Segment files (one per day and service: directory/YYYY-MM-DD/SERVICE.seg) are a sequence of self-contained blocks, one per
+written batch. A block that was not completely written (e.g. crash) or fails its crc32 check is skipped when reading.
+Block: header | payload (may be zlib compressed), the payload is a table of section sizes followed by the sections, columns are stored
+one per section so each is packed on its own:
+  frames: one per message part (a message with several services is split into one part per service file),
+          sequence numbers and times are delta coded varints, the other columns are varints
+  rows:   one per content field value, sorted by key (stable) so each key's rows are contiguous, the key itself is not stored per row
+          (it comes from the index), frame numbers are delta coded within each key and field numbers are varints,
+          float values are 8 bytes and all other values (ints, bools, string ids) are zigzag varints
+  index:  one per key, the row range and time range of the key in the block
+  strings: offsets and text of the block's strings (keys, string values, field names, raw text)
+Messages are rebuilt from the rows and re-encoded in the recorded JSON style, if that does not give the exact original text
+then the original text is kept in the frame (raw) as well.
+"""
+
+MAGIC = b"SWBK"
+VERSION = 2
+HEADER = struct.Struct("<4sHHIIIIIqqQI8x")                      # magic, version, flags, frames, rows, index, strings, strings bytes, t min, t max, payload bytes, crc32
+COMPRESSED = 1                                                  # header flag: payload is zlib compressed
+ORDERED = 2                                                     # header flag: frame times never decrease (time ranges are found by binary search)
+
+# value kinds
+FLOAT, INT, BOOL, STR, NULL, JSON = range(6)
+NAMED = 1                                                       # row flag: field is a name (field is its string id)
+
+# payload sections, in order
+(FLOATS, SEQ, RECV_NS, TS, COMMAND, RAW, PART, PARTS, ENTRIES, STYLE,
+ ROW_FRAME, ROW_ENTRY, ROW_FIELD, ROW_KIND, NUMBERS, INDEX, OFFSETS, BLOB) = range(18)
+SECTIONS = 18
+SECTION_TABLE = struct.Struct(f"<{SECTIONS}I4x")                 # byte size of each section (padded so floats are aligned)
+
+# frame styles (how the message was encoded)
+STYLE_COMPACT = 1                                               # separators (",", ":") instead of (", ", ": ")
+STYLE_UNICODE = 2                                               # ensure_ascii=False
+MESSAGES = "MESSAGES"                                           # segment for non-data messages (responses, heartbeats)
+
+_dtypes = None
+_logger = logging.getLogger("Schwabdev.Recorder")
+
+
+def scan(buffer, verify: bool = True) -> list:
+    """
+    Find the complete blocks of a segment, blocks that fail the crc32 check are skipped
+    :param buffer: segment contents
+    :type buffer: bytes | mmap.mmap
+    :param verify: whether to check the crc32 of each block
+    :type verify: bool
+    :return: list of (payload offset, header values) of complete blocks, in file order (any version)
+    :rtype: list
+    """
+    blocks = []
+    offset = 0
+    while offset + HEADER.size <= len(buffer):
+        header = HEADER.unpack_from(buffer, offset)
+        end = offset + HEADER.size + header[10]
+        if header[0] != MAGIC or not header[1] or end > len(buffer):
+            break  # incomplete (or damaged) block, everything after it is ignored
+        if verify and zlib.crc32(memoryview(buffer)[offset + HEADER.size:end]) != header[11]:
+            _logger.warning(f"Skipping a corrupt block at byte {offset} (crc32 mismatch).")
+        else:
+            blocks.append((offset + HEADER.size, header))
+        offset = end
+    return blocks
+
+
+def dtypes() -> tuple:
+    """
+    Get the numpy dtypes of the decoded block tables
+    :return: (frame dtype, row dtype, index dtype)
+    :rtype: tuple
+    """
+    global _dtypes
+    if _dtypes is None:
+        np = _numpy()
+        _dtypes = (np.dtype([("seq", "<i8"), ("recv_ns", "<i8"), ("ts", "<i8"), ("command", "<i4"), ("raw", "<i4"),
+                             ("part", "<u2"), ("parts", "<u2"), ("entries", "<u2"), ("style", "u1")]),
+                   np.dtype([("frame", "<u4"), ("key", "<i4"), ("entry", "<u4"), ("field", "<u4"), ("kind", "u1"),
+                             ("flags", "u1"), ("value", "<f8")]),
+                   np.dtype([("key", "<i4"), ("start", "<u4"), ("stop", "<u4"), ("t0", "<i8"), ("t1", "<i8")]))
+    return _dtypes
+
+
+def varints(values) -> bytes:
+    """
+    Encode unsigned integers as varints (7 bits per byte, the high bit marks that more bytes follow)
+    :param values: unsigned integers
+    :type values: numpy.ndarray
+    :return: encoded bytes
+    :rtype: bytes
+    """
+    np = _numpy()
+    values = np.asarray(values).astype(np.uint64)
+    if not len(values):
+        return b""
+    lengths = np.ones(len(values), dtype=np.int64)
+    rest = values >> np.uint64(7)
+    while rest.any():
+        lengths += rest > 0
+        rest >>= np.uint64(7)
+    starts = np.cumsum(lengths) - lengths
+    out = np.zeros(int(lengths.sum()), dtype=np.uint8)
+    for i in range(int(lengths.max())):
+        selected = np.flatnonzero(lengths > i)
+        byte = (values[selected] >> np.uint64(7 * i)) & np.uint64(0x7F)
+        out[starts[selected] + i] = byte.astype(np.uint8) | ((lengths[selected] > i + 1).astype(np.uint8) << 7)
+    return out.tobytes()
+
+
+def unvarints(data, count: int):
+    """
+    Decode varints
+    :param data: encoded bytes
+    :type data: bytes | memoryview
+    :param count: number of values
+    :type count: int
+    :return: unsigned integers
+    :rtype: numpy.ndarray
+    """
+    np = _numpy()
+    encoded = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(encoded < 0x80)
+    if len(ends) != count:
+        raise Exception(f"[Schwabdev] Corrupt varint column ({len(ends)} values, expected {count}).")
+    values = np.zeros(count, dtype=np.uint64)
+    if count:
+        starts = np.concatenate(([0], ends[:-1] + 1))
+        lengths = ends - starts + 1
+        for i in range(int(lengths.max())):
+            selected = np.flatnonzero(lengths > i)
+            values[selected] |= (encoded[starts[selected] + i] & 0x7F).astype(np.uint64) << np.uint64(7 * i)
+    return values
+
+
+def zigzag(values):
+    """
+    Map signed integers to unsigned ones so small magnitudes stay small (0, -1, 1, -2, ... -> 0, 1, 2, 3, ...)
+    """
+    np = _numpy()
+    values = np.asarray(values, dtype=np.int64)
+    return ((values << np.int64(1)) ^ (values >> np.int64(63))).view(np.uint64)
+
+
+def unzigzag(values):
+    """
+    Undo zigzag
+    """
+    np = _numpy()
+    values = np.asarray(values, dtype=np.uint64)
+    return (values >> np.uint64(1)).view(np.int64) ^ -(values & np.uint64(1)).view(np.int64)
+
+
+def deltas(values) -> bytes:
+    """
+    Encode signed integers (e.g. times) as zigzag varints of the differences between neighbours
+    """
+    np = _numpy()
+    return varints(zigzag(np.diff(np.asarray(values, dtype=np.int64), prepend=np.int64(0))))
+
+
+def undeltas(data, count: int):
+    """
+    Decode values encoded with deltas
+    """
+    np = _numpy()
+    return np.cumsum(unzigzag(unvarints(data, count)), dtype=np.int64)
+
+
+def _style(parsed, raw: str) -> int | None:
+    """
+    Find the JSON style that re-encodes a message to its original text
+    :param parsed: decoded message
+    :type parsed: dict
+    :param raw: original text
+    :type raw: str
+    :return: style flags or None if no style matches
+    :rtype: int | None
+    """
+    for style in (STYLE_COMPACT, 0, STYLE_COMPACT | STYLE_UNICODE, STYLE_UNICODE):
+        if encode(parsed, style) == raw:
+            return style
+    return None
+
+
+def encode(message, style: int) -> str:
+    """
+    Encode a message in a recorded style
+    :param message: decoded message
+    :type message: dict
+    :param style: style flags
+    :type style: int
+    :return: message text
+    :rtype: str
+    """
+    return json.dumps(message, separators=(",", ":") if style & STYLE_COMPACT else (", ", ": "), ensure_ascii=not style & STYLE_UNICODE)
+
+
+class _Block:
+
+    def __init__(self):
+        """
+        Tables of one block while it is being built
+        """
+        self.frames = []                                        # frame tuples
+        self.rows = []                                          # row tuples (frame, key, entry, field code, kind, value)
+        self.strings = {}                                       # string -> id
+
+    def string(self, value: str) -> int:
+        """
+        Get the id of a string in the block's string table
+        :param value: string
+        :type value: str
+        :return: string id
+        :rtype: int
+        """
+        sid = self.strings.get(value, None)
+        if sid is None:
+            sid = self.strings[value] = len(self.strings)
+        return sid
+
+    def add(self, seq: int, recv_ns: int, ts: int, command, raw, part: int, parts: int, content, style: int) -> bool:
+        """
+        Add a message part, content entries are stored as rows (one per field)
+        An entry's "key" is stored once in the key index instead of as a row when it is the entry's first field.
+        :param raw: original message text to keep with the part, None = rebuilt from the rows
+        :type raw: str | None
+        :param content: content entries of the part
+        :type content: list
+        :return: whether the part was added (False if the content can not be stored as rows and there is no raw text)
+        :rtype: bool
+        """
+        frame = len(self.frames)
+        rows = []
+        entries = 0
+        encoded = isinstance(content, list) and len(content) < 65536
+        if encoded:
+            for entry, item in enumerate(content):
+                if not isinstance(item, dict):
+                    encoded = False
+                    break
+                key = item.get("key", None)
+                indexed = isinstance(key, str) and next(iter(item)) == "key"
+                key = self.string(key) if indexed else -1
+                for name, value in item.items():
+                    if indexed and name == "key" and len(item) > 1:
+                        continue  # rebuilt from the index (an entry with only a key keeps a row so the entry exists)
+                    if name.isascii() and name.isdigit() and str(int(name)) == name and int(name) < 2 ** 31:
+                        code = int(name) << 1
+                    else:
+                        code = self.string(name) << 1 | NAMED
+                    if value is None:
+                        kind, number = NULL, 0
+                    elif value is True or value is False:
+                        kind, number = BOOL, int(value)
+                    elif isinstance(value, int) and -2 ** 53 < value < 2 ** 53:
+                        kind, number = INT, value
+                    elif isinstance(value, float):
+                        kind, number = FLOAT, value
+                    elif isinstance(value, str):
+                        kind, number = STR, self.string(value)
+                    else:
+                        kind, number = JSON, self.string(json.dumps(value, separators=(",", ":")))
+                    rows.append((frame, key, entry, code, kind, number))
+                entries = entry + 1
+        if not encoded:
+            rows, entries = [], 0
+            if raw is None:
+                return False
+        self.rows.extend(rows)
+        self.frames.append((seq, recv_ns, ts, self.string(command) if isinstance(command, str) else -1,
+                            -1 if raw is None else self.string(raw), part, parts, entries, style))
+        return True
+
+    def pack(self, compress: bool) -> bytes:
+        """
+        Build the bytes of the block
+        :param compress: whether to compress the payload
+        :type compress: bool
+        :return: block bytes
+        :rtype: bytes
+        """
+        np = _numpy()
+        index_dtype = dtypes()[2]
+        seq, recv_ns, ts, command, raw, part, parts, entries, style = (np.array(column, dtype=np.int64) for column in zip(*self.frames))
+        if self.rows:
+            row_frame, row_key, row_entry, row_field, row_kind = (np.array(column, dtype=np.int64) for column in list(zip(*self.rows))[:5])
+            numbers = [row[5] for row in self.rows]
+        else:
+            row_frame = row_key = row_entry = row_field = row_kind = np.zeros(0, dtype=np.int64)
+            numbers = []
+        order = np.argsort(row_key, kind="stable")
+        row_frame, row_key, row_entry, row_field, row_kind = row_frame[order], row_key[order], row_entry[order], row_field[order], row_kind[order]
+        numbers = [numbers[i] for i in order]
+        floats = row_kind == FLOAT
+
+        # index of each key's rows
+        keys, starts = np.unique(row_key, return_index=True)
+        stops = np.append(starts[1:], len(row_key)).astype(np.int64)
+        index = np.zeros(len(keys), dtype=index_dtype)
+        index["key"], index["start"], index["stop"] = keys, starts, stops
+        if len(keys):
+            times = ts[row_frame]
+            index["t0"] = np.minimum.reduceat(times, starts)
+            index["t1"] = np.maximum.reduceat(times, starts)
+
+        # frame numbers are delta coded within each key's rows (they are in frame order)
+        frame_deltas = np.diff(row_frame, prepend=np.int64(0))
+        frame_deltas[starts] = row_frame[starts]
+
+        encoded = [s.encode() for s in self.strings]
+        offsets = np.zeros(len(encoded) + 1, dtype="<u4")
+        np.cumsum([len(s) for s in encoded], out=offsets[1:])
+        blob = b"".join(encoded)
+        sections = [np.array([n for n, f in zip(numbers, floats) if f], dtype="<f8").tobytes(),
+                    deltas(seq), deltas(recv_ns), deltas(ts), varints(command + 1), varints(raw + 1),
+                    varints(part), varints(parts), varints(entries), varints(style),
+                    varints(frame_deltas), varints(row_entry), varints(row_field), row_kind.astype("u1").tobytes(),
+                    varints(zigzag([n for n, f in zip(numbers, floats) if not f])), index.tobytes(), offsets.tobytes(), blob]
+        payload = SECTION_TABLE.pack(*(len(section) for section in sections)) + b"".join(sections)
+        payload += b"\0" * (-len(payload) % 8)  # keep the next block aligned
+        if compress:
+            payload = zlib.compress(payload)
+            payload += b"\0" * (-len(payload) % 8)
+        t_min = int(ts.min()) if len(ts) else 0
+        t_max = int(ts.max()) if len(ts) else 0
+        flags = (COMPRESSED if compress else 0) | (ORDERED if bool(np.all(ts[1:] >= ts[:-1])) else 0)
+        header = HEADER.pack(MAGIC, VERSION, flags, len(self.frames), len(row_key), len(index), len(encoded),
+                             len(blob), t_min, t_max, len(payload), zlib.crc32(payload))
+        return header + payload
+
+
+def unpack(payload, n_frames: int, n_rows: int, n_index: int, n_strings: int) -> tuple:
+    """
+    Decode the tables of a block payload
+    :param payload: uncompressed payload
+    :type payload: bytes | memoryview
+    :return: (frames, rows, index, string offsets, string blob), frames and rows are numpy structured arrays (see dtypes)
+    :rtype: tuple
+    """
+    np = _numpy()
+    frame_dtype, row_dtype, index_dtype = dtypes()
+    sizes = SECTION_TABLE.unpack_from(payload, 0)
+    sections = []
+    offset = SECTION_TABLE.size
+    for size in sizes:
+        sections.append(payload[offset:offset + size])
+        offset += size
+
+    frames = np.zeros(n_frames, dtype=frame_dtype)
+    frames["seq"], frames["recv_ns"], frames["ts"] = (undeltas(sections[column], n_frames) for column in (SEQ, RECV_NS, TS))
+    for name, column in (("part", PART), ("parts", PARTS), ("entries", ENTRIES), ("style", STYLE)):
+        frames[name] = unvarints(sections[column], n_frames)
+    for name, column in (("command", COMMAND), ("raw", RAW)):  # string ids, -1 = None
+        frames[name] = unvarints(sections[column], n_frames).astype(np.int64) - 1
+
+    index = np.frombuffer(sections[INDEX], dtype=index_dtype, count=n_index)
+    rows = np.zeros(n_rows, dtype=row_dtype)
+    if n_rows:
+        lengths = (index["stop"].astype(np.int64) - index["start"])
+        rows["key"] = np.repeat(index["key"], lengths)
+        frame_deltas = unvarints(sections[ROW_FRAME], n_rows).astype(np.int64)  # delta coded within each key
+        sums = np.cumsum(frame_deltas)
+        starts = index["start"].astype(np.int64)
+        rows["frame"] = sums - np.repeat(sums[starts] - frame_deltas[starts], lengths)
+        rows["entry"] = unvarints(sections[ROW_ENTRY], n_rows)
+        fields = unvarints(sections[ROW_FIELD], n_rows)
+        rows["field"], rows["flags"] = fields >> np.uint64(1), fields & np.uint64(NAMED)
+        rows["kind"] = np.frombuffer(sections[ROW_KIND], dtype="u1", count=n_rows)
+        floats = rows["kind"] == FLOAT
+        rows["value"][floats] = np.frombuffer(sections[FLOATS], dtype="<f8", count=int(floats.sum()))
+        rows["value"][~floats] = unzigzag(unvarints(sections[NUMBERS], n_rows - int(floats.sum())))
+    offsets = np.frombuffer(sections[OFFSETS], dtype="<u4", count=n_strings + 1)
+    return frames, rows, index, offsets, sections[BLOB]
+
+
+class TickRecorder:
+
+    def __init__(self, directory: str, batch_size: int = 5000, flush_interval: float = 1.0, compress: bool = False,
+                 fsync: bool = False, timezone: str = "America/New_York"):
+        """
+        Initialize a recorder that archives every stream message into per day, per service segment files
+        Messages are queued by the receiver and encoded and written in batches on a background thread.
+        :param directory: directory to write segments into
+        :type directory: str
+        :param batch_size: number of messages that triggers a write (otherwise they are written every flush_interval)
+        :type batch_size: int
+        :param flush_interval: seconds between writes
+        :type flush_interval: float
+        :param compress: whether to zlib compress blocks (smaller files, but reading them needs a copy)
+        :type compress: bool
+        :param fsync: whether to fsync after each write
+        :type fsync: bool
+        :param timezone: timezone that decides the day of a message
+        :type timezone: str
+        """
+        _numpy()  # fail early if numpy is missing
+        self.directory = directory                              # segment directory
+        self.batch_size = batch_size                            # messages per write
+        self.flush_interval = flush_interval                    # seconds between writes
+        self.compress = compress                                # compress blocks
+        self.fsync = fsync                                      # fsync after writes
+        self._timezone = zoneinfo.ZoneInfo(timezone)            # timezone for days
+        self._pending = collections.deque()                     # queued (seq, recv_ns, message)
+        self._seq = time.time_ns()                              # message sequence number (unique across runs)
+        self._wake = threading.Event()                          # wakes the writer
+        self._write_lock = threading.Lock()                     # one writer at a time
+        self._files = {}                                        # (day, service) -> open file
+        self._thread = None                                     # writer thread
+        self.active = False                                     # whether the writer is running
+        self._logger = logging.getLogger("Schwabdev.Recorder")
+
+        # counters
+        self.messages = 0                                       # messages written
+        self.frames = 0                                         # frames written
+        self.rows = 0                                           # rows written
+        self.raw = 0                                            # frames that also keep the original text
+        self.bytes = 0                                          # bytes written
+        self.batches = 0                                        # batches written
+
+    def __call__(self, message, **kwargs):
+        """
+        Receiver interface so the recorder can be passed directly to streamer.start(...)
+        :param message: message from the stream
+        :type message: str
+        """
+        self.record(message)
+
+    def record(self, message: str, recv_ns: int = None):
+        """
+        Queue a message to be written (cheap, the message is encoded on the writer thread)
+        :param message: message from the stream
+        :type message: str
+        :param recv_ns: receive time in ns since epoch (default: now)
+        :type recv_ns: int | None
+        """
+        self._seq += 1
+        self._pending.append((self._seq, recv_ns or time.time_ns(), message))
+        if len(self._pending) >= self.batch_size:
+            self._wake.set()
+
+    def start(self):
+        """
+        Start the writer thread
+        :return: this recorder
+        :rtype: TickRecorder
+        """
+        if not self.active:
+            self.active = True
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while self.active:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                self._logger.error(f"Could not write batch: {e}")
+
+    def _file(self, day: str, service: str):
+        """
+        Get the segment file of a day and service (opened for appending)
+        :param day: day (YYYY-MM-DD)
+        :type day: str
+        :param service: service name
+        :type service: str
+        :return: open file
+        :rtype: io.BufferedWriter
+        """
+        f = self._files.get((day, service), None)
+        if f is None:
+            for old in [k for k in self._files if k[0] != day]:  # a new day, close the old segments
+                self._files.pop(old).close()
+            os.makedirs(os.path.join(self.directory, day), exist_ok=True)
+            path = os.path.join(self.directory, day, f"{service}.seg")
+            f = self._files[(day, service)] = open(path, "ab")
+            if f.tell():  # appending to an existing segment, cut off a block left incomplete by a crash
+                with open(path, "rb") as existing, mmap.mmap(existing.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                    blocks = scan(buffer)
+                end = blocks[-1][0] + blocks[-1][1][10] if blocks else 0
+                if end != f.tell():
+                    self._logger.warning(f"Removing {f.tell() - end} bytes of an incomplete or corrupt block from \"{path}\".")
+                    f.truncate(end)
+                    f.seek(end)
+        return f
+
+    def flush(self) -> int:
+        """
+        Encode and write the queued messages now
+        :return: number of messages written
+        :rtype: int
+        """
+        with self._write_lock:
+            count = len(self._pending)
+            if not count:
+                return 0
+            items = [self._pending.popleft() for _ in range(count)]
+            blocks = {}  # (day, service) -> _Block
+            for seq, recv_ns, raw in items:
+                day = datetime.datetime.fromtimestamp(recv_ns / 1e9, self._timezone).strftime("%Y-%m-%d")
+                self._add(blocks, day, seq, recv_ns, raw)
+            for (day, service), block in blocks.items():
+                data = block.pack(self.compress)
+                f = self._file(day, service)
+                f.write(data)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+                self.frames += len(block.frames)
+                self.rows += len(block.rows)
+                self.bytes += len(data)
+            self.messages += count
+            self.batches += 1
+            return count
+
+    def _add(self, blocks: dict, day: str, seq: int, recv_ns: int, raw: str):
+        """
+        Split a message into parts (one per service) and add them to the blocks of their segments
+        :param blocks: (day, service) -> block being built
+        :type blocks: dict
+        :param day: day of the message
+        :type day: str
+        :param seq: message sequence number
+        :type seq: int
+        :param recv_ns: receive time (ns since epoch)
+        :type recv_ns: int
+        :param raw: message text
+        :type raw: str
+        """
+        def block(service):
+            b = blocks.get((day, service), None)
+            if b is None:
+                b = blocks[(day, service)] = _Block()
+            return b
+
+        recv_ms = recv_ns // 1000000
+        try:
+            parsed = json.loads(raw)
+        except ValueError:
+            parsed = None
+        data = parsed.get("data", None) if isinstance(parsed, dict) else None
+        if not isinstance(data, list) or not data or not all(isinstance(p, dict) and isinstance(p.get("service", None), str) for p in data):
+            block(MESSAGES).add(seq, recv_ns, recv_ms, None, raw, 0, 1, None, 0)
+            self.raw += 1
+            return
+        style = _style(parsed, raw) if list(parsed) == ["data"] and all(list(p) == ["service", "timestamp", "command", "content"] for p in data) else None
+        if style is None:
+            self.raw += 1
+        for part, service in enumerate(data):
+            timestamp = service.get("timestamp", None)
+            ts = timestamp if isinstance(timestamp, int) and not isinstance(timestamp, bool) else recv_ms
+            keep = raw if style is None and part == 0 else None  # the original text is kept once per message
+            args = (seq, recv_ns, ts, service.get("command", None))
+            if not block(service["service"]).add(*args, keep, part, len(data), service.get("content", None), style or 0):
+                # content that can not be stored as rows, keep the original text with this part
+                block(service["service"]).add(*args, raw, part, len(data), None, 0)
+                self.raw += style is not None
+                style = None
+
+    def stats(self) -> dict:
+        """
+        Get the recorder counters
+        :return: counters (pending, messages, frames, rows, raw, bytes, batches)
+        :rtype: dict
+        """
+        return {"pending": len(self._pending), "messages": self.messages, "frames": self.frames, "rows": self.rows,
+                "raw": self.raw, "bytes": self.bytes, "batches": self.batches}
+
+    def stop(self):
+        """
+        Stop the writer thread, write the queued messages and close the segment files
+        """
+        self.active = False
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        with self._write_lock:
+            for f in self._files.values():
+                f.close()
+            self._files.clear()
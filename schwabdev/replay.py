@@ -0,0 +1,151 @@
+"""
+This file contains a replayer that plays recorded stream messages through a receiver
+Github: https://github.com/tylerebowers/Schwab-API-Python
+"""
+
+import time
+import logging
+import datetime
+import threading
+from .archive import TickArchive
+
+
+class ReplayClock:
+
+    def __init__(self):
+        """
+        Simulated clock of a replay, set to the receive time of the message being replayed
+        """
+        self.ns = None                                          # simulated time (ns since epoch)
+
+    def time(self) -> float | None:
+        """
+        Get the simulated time (like time.time())
+        :return: seconds since epoch or None before the first message
+        :rtype: float | None
+        """
+        return None if self.ns is None else self.ns / 1e9
+
+    def now(self, tz: datetime.tzinfo = None) -> datetime.datetime | None:
+        """
+        Get the simulated time (like datetime.datetime.now(tz))
+        :param tz: timezone
+        :type tz: datetime.tzinfo | None
+        :return: datetime or None before the first message
+        :rtype: datetime.datetime | None
+        """
+        return None if self.ns is None else datetime.datetime.fromtimestamp(self.ns / 1e9, tz)
+
+
+class StreamReplayer:
+
+    def __init__(self, archive: TickArchive | str, days: list = None, services: list = None, start=None, end=None, speed: float = None):
+        """
+        Initialize a replayer that plays recorded messages through a receiver, the same way streamer.start(receiver) would
+        Messages are replayed exactly as they were received (same text and order).
+        :param archive: archive or the directory of a recording
+        :type archive: TickArchive | str
+        :param days: days to replay (YYYY-MM-DD), None = all recorded days
+        :type days: list | None
+        :param services: services to replay, None = all (including responses and heartbeats)
+        :type services: list | None
+        :param start: start time (receive time), see TickArchive.query
+        :type start: datetime.datetime | float | int | None
+        :param end: end time (receive time, inclusive), see TickArchive.query
+        :type end: datetime.datetime | float | int | None
+        :param speed: 1 = real time, N = N times faster, None = as fast as possible
+        :type speed: float | None
+        """
+        self.archive = TickArchive(archive) if isinstance(archive, str) else archive  # recording
+        self.days = days                                        # days to replay
+        self.services = services                                # services to replay
+        self.start_time = start                                 # start time
+        self.end_time = end                                     # end time
+        self.speed = speed                                      # speed multiplier
+        self.clock = ReplayClock()                              # simulated clock
+        self.active = False                                     # whether a replay is running
+        self.messages = 0                                       # messages replayed
+        self.max_lag = 0.0                                      # largest delay behind schedule (seconds)
+        self._thread = None                                     # replay thread
+        self._stop = threading.Event()                          # stops the replay
+        self._logger = logging.getLogger("Schwabdev.Replayer")
+
+    def _messages(self):
+        """
+        Get the messages to replay
+        :return: iterator of (receive time in ns, message text)
+        :rtype: iterator
+        """
+        archive = self.archive
+        for day in self.days or archive._days(archive._ms(self.start_time), archive._ms(self.end_time)):
+            yield from archive.messages(day, self.services, self.start_time, self.end_time)
+
+    def run(self, receiver=print, **kwargs) -> int:
+        """
+        Replay on this thread (returns when the replay ends or is stopped)
+        :param receiver: function to call with each message
+        :type receiver: function
+        :param kwargs: kwargs to pass to receiver
+        :type kwargs: dict
+        :return: number of messages replayed
+        :rtype: int
+        """
+        self.active = True
+        self._stop.clear()
+        self.messages = 0
+        self.max_lag = 0.0
+        first, started = None, None
+        try:
+            for recv_ns, message in self._messages():
+                if self._stop.is_set():
+                    break
+                if self.speed:
+                    if first is None:
+                        first, started = recv_ns, time.perf_counter()
+                    wait = started + (recv_ns - first) / 1e9 / self.speed - time.perf_counter()
+                    if wait > 0:
+                        if self._stop.wait(wait):
+                            break
+                    else:
+                        self.max_lag = max(self.max_lag, -wait)
+                self.clock.ns = recv_ns
+                receiver(message, **kwargs)
+                self.messages += 1
+        finally:
+            self.active = False
+        self._logger.info(f"Replayed {self.messages} messages.")
+        return self.messages
+
+    def start(self, receiver=print, daemon: bool = True, **kwargs):
+        """
+        Replay on a background thread (like streamer.start(receiver))
+        :param receiver: function to call with each message
+        :type receiver: function
+        :param daemon: whether to run the thread in the background (as a daemon)
+        :type daemon: bool
+        :param kwargs: kwargs to pass to receiver
+        :type kwargs: dict
+        """
+        if self.active:
+            self._logger.warning("Replay already active.")
+            return
+        self.active = True
+        self._thread = threading.Thread(target=self.run, args=(receiver,), kwargs=kwargs, daemon=daemon)
+        self._thread.start()
+
+    def join(self, timeout: float = None):
+        """
+        Wait for a replay started with start() to end
+        :param timeout: maximum time to wait for
+        :type timeout: float | None
+        """
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stop(self):
+        """
+        Stop the replay
+        """
+        self._stop.set()
+        self.join()
+        self.active = False
@@ -0,0 +1,160 @@
+"""
+This file contains a router that splits stream messages by service and delivers urgent services on a priority lane
+Github: https://github.com/tylerebowers/Schwab-API-Python
+"""
+
+import json
+import time
+import queue
+import logging
+import threading
+
+
+class StreamRouter:
+
+    def __init__(self, default=None, priority: list | tuple = ("ACCT_ACTIVITY", "ADMIN")):
+        """
+        Initialize a router that splits each message by service and hands each part to the handlers of its service, pass it as the receiver: streamer.start(router)
+        Parts of priority services are delivered on their own thread (the priority lane), so they never wait behind bulk market data.
+        Everything else is delivered in order on the bulk lane thread.
+        :param default: function called with parts that have no handler (including heartbeats), default(message)
+        :type default: function | None
+        :param priority: services delivered on the priority lane ("ADMIN" covers login, logout, and other admin responses)
+        :type priority: list | tuple
+        """
+        self.default = default                                  # handler for parts with no route
+        self.priority = set(priority)                           # services on the priority lane
+        self._markers = tuple(f'"{service}"' for service in priority)  # quick check of the raw text for priority services
+        self._routes = {}                                       # service -> list of handlers
+        self._lanes = {"priority": queue.SimpleQueue(), "bulk": queue.SimpleQueue()}  # lane -> queue of (enqueue time, message text or parts)
+        self._threads = []                                      # lane threads
+        self.active = False                                     # whether the lanes are running
+        self._logger = logging.getLogger("Schwabdev.Router")
+
+        # counters
+        self._stats = {lane: {"delivered": 0, "lag": 0.0, "max_lag": 0.0} for lane in self._lanes}  # lane -> counters
+
+    def __call__(self, message, **kwargs):
+        """
+        Receiver interface so the router can be passed directly to streamer.start(...)
+        :param message: message from the stream
+        :type message: str | dict
+        """
+        self.put(message)
+
+    def route(self, service: str, handler):
+        """
+        Add a handler for a service, it is called with each part of that service in the same format as the stream
+        (e.g. {"data": [{"service": "LEVELONE_EQUITIES", "timestamp": ..., "content": [...]}]}, or {"response": [...]} for responses)
+        :param service: service (e.g. "LEVELONE_EQUITIES", "ACCT_ACTIVITY", "ADMIN")
+        :type service: str
+        :param handler: function called with each part, handler(message: dict), e.g. a BookEngine or BarAggregator
+        :type handler: function
+        """
+        service = service.upper()
+        self._routes[service] = self._routes.get(service, []) + [handler]  # replaced, so lanes never see a list being changed
+
+    def unroute(self, service: str, handler=None):
+        """
+        Remove a handler (or all handlers) of a service
+        :param service: service
+        :type service: str
+        :param handler: handler to remove, None = all handlers of the service
+        :type handler: function | None
+        """
+        service = service.upper()
+        handlers = [h for h in self._routes.get(service, []) if handler is not None and h is not handler]
+        if handlers:
+            self._routes[service] = handlers
+        else:
+            self._routes.pop(service, None)
+
+    def start(self):
+        """
+        Start the lane threads (called automatically on the first message)
+        """
+        if self.active:
+            return
+        self.active = True
+        for lane in self._lanes:
+            thread = threading.Thread(target=self._run, args=(lane,), name=f"Router-{lane}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def put(self, message: str | dict):
+        """
+        Queue a message onto the lanes, only messages that may contain priority services are decoded on the calling (stream) thread
+        :param message: message from the stream
+        :type message: str | dict
+        """
+        if not self.active:
+            self.start()
+        now = time.perf_counter()
+        if isinstance(message, str):
+            if not message.startswith('{"response"') and not any(marker in message for marker in self._markers):
+                self._lanes["bulk"].put((now, message))  # decoded on the bulk lane
+                return
+            message = json.loads(message)
+        urgent, bulk = [], []
+        for kind, parts in message.items():
+            for part in parts if isinstance(parts, list) else []:
+                service = part.get("service", None) if isinstance(part, dict) else None
+                (urgent if service in self.priority else bulk).append((service, {kind: [part]}))
+        if urgent:
+            self._lanes["priority"].put((now, urgent))
+        if bulk:
+            self._lanes["bulk"].put((now, bulk))
+
+    def _run(self, lane: str):
+        """
+        Deliver the parts queued on a lane until stopped (runs on its own thread per lane)
+        :param lane: "priority" or "bulk"
+        :type lane: str
+        """
+        work_queue, stats = self._lanes[lane], self._stats[lane]
+        while True:
+            item = work_queue.get()
+            if item is None:
+                break
+            enqueued, parts = item
+            lag = time.perf_counter() - enqueued
+            stats["lag"] = lag
+            if lag > stats["max_lag"]:
+                stats["max_lag"] = lag
+            if isinstance(parts, str):
+                message = json.loads(parts)
+                parts = [(part.get("service", None) if isinstance(part, dict) else None, {kind: [part]})
+                         for kind, value in message.items() for part in (value if isinstance(value, list) else [])]
+            for service, message in parts:
+                handlers = self._routes.get(service, None)
+                if handlers is None:
+                    handlers = () if self.default is None else (self.default,)
+                for handler in handlers:
+                    try:
+                        handler(message)
+                    except Exception as e:
+                        self._logger.error(f"Handler error for {service}: {e}")
+                stats["delivered"] += 1
+
+    def stats(self) -> dict:
+        """
+        Get per lane counters, lag is the time between a message being queued and its lane starting on it
+        :return: lane -> counters (queued, delivered, lag, max_lag)
+        :rtype: dict
+        """
+        return {lane: {"queued": self._lanes[lane].qsize(), **stats} for lane, stats in self._stats.items()}
+
+    def stop(self, timeout: float = None):
+        """
+        Stop the lanes after the queued messages are delivered
+        :param timeout: maximum time to wait for each lane
+        :type timeout: float | None
+        """
+        if not self.active:
+            return
+        for work_queue in self._lanes.values():
+            work_queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self.active = False
@@ -0,0 +1,280 @@
+"""
+This file contains a timer wheel scheduler that runs the client's timed jobs on one thread
+Github: https://github.com/tylerebowers/Schwab-API-Python
+"""
+
+import time
+import heapq
+import logging
+import datetime
+import threading
+import concurrent.futures
+
+
+class Job:
+
+    def __init__(self, scheduler, func, args: tuple, kwargs: dict, deadline: float, interval: float = None, blocking: bool = False, name: str = None):
+        """
+        A timed job (created by Scheduler.call_at, call_later, and every)
+        :param scheduler: scheduler the job belongs to
+        :type scheduler: Scheduler
+        :param func: function to call
+        :type func: function
+        :param args: args for func
+        :type args: tuple
+        :param kwargs: kwargs for func
+        :type kwargs: dict
+        :param deadline: time to run at (time.monotonic())
+        :type deadline: float
+        :param interval: seconds between runs, None = run once
+        :type interval: float | None
+        :param blocking: whether func may block (runs on a worker thread instead of the scheduler thread)
+        :type blocking: bool
+        :param name: name for logs
+        :type name: str | None
+        """
+        self._scheduler = scheduler                             # scheduler the job belongs to
+        self.func = func                                        # function to call
+        self.args = args                                        # args for func
+        self.kwargs = kwargs                                    # kwargs for func
+        self.deadline = deadline                                # next run (time.monotonic())
+        self.interval = interval                                # seconds between runs (None = once)
+        self.blocking = blocking                                # whether func runs on a worker thread
+        self.name = name or getattr(func, "__name__", "job")    # name for logs
+        self.tick = 0                                           # wheel tick of the next run
+        self.runs = 0                                           # number of runs started
+        self.cancelled = False                                  # whether the job was cancelled
+        self._running = False                                   # whether a blocking run is in progress
+
+    def __repr__(self):
+        every = "" if self.interval is None else f", every {self.interval}s"
+        return f"Job({self.name}, in {self.remaining():.3f}s{every}, runs {self.runs})"
+
+    def remaining(self) -> float:
+        """
+        Seconds until the next run
+        :return: seconds (negative if late)
+        :rtype: float
+        """
+        return self.deadline - time.monotonic()
+
+    def cancel(self):
+        """
+        Cancel the job (a run in progress is not interrupted)
+        """
+        self._scheduler.cancel(self)
+
+
+class Scheduler:
+
+    def __init__(self, resolution: float = 0.001, slots: int = 4096, workers: int = 2):
+        """
+        Initialize a timer wheel scheduler, jobs are hashed into slots of `resolution` seconds and one thread sleeps until the next occupied slot
+        (no polling, so an idle scheduler does not wake up). The thread starts with the first job.
+        Jobs run on the scheduler thread and should be quick, jobs that block (e.g. api calls) should be added with blocking=True.
+        :param resolution: seconds per slot (timing precision)
+        :type resolution: float
+        :param slots: number of slots in the wheel
+        :type slots: int
+        :param workers: number of worker threads for blocking jobs
+        :type workers: int
+        """
+        self.resolution = resolution                            # seconds per slot
+        self._wheel = [[] for _ in range(slots)]                # slot -> jobs (a slot holds every tick that hashes to it)
+        self._ticks = []                                        # heap of occupied ticks
+        self._occupied = set()                                  # occupied ticks (to keep the heap unique)
+        self._jobs = set()                                      # scheduled jobs
+        self._lock = threading.Lock()                           # guards the wheel
+        self._changed = threading.Condition(self._lock)         # signalled when an earlier job is added (or on stop)
+        self._workers = workers                                 # number of worker threads
+        self._executor = None                                   # workers for blocking jobs (created when needed)
+        self._thread = None                                     # scheduler thread
+        self.active = False                                     # whether the scheduler thread is running
+        self._logger = logging.getLogger("Schwabdev.Scheduler")
+
+    def _insert(self, job: Job):
+        """
+        Put a job into its slot (lock must be held)
+        :param job: job
+        :type job: Job
+        """
+        job.tick = -int(-job.deadline // self.resolution)  # round up, never run early
+        self._wheel[job.tick % len(self._wheel)].append(job)
+        self._jobs.add(job)
+        if job.tick not in self._occupied:
+            self._occupied.add(job.tick)
+            if not self._ticks or job.tick < self._ticks[0]:
+                self._changed.notify()  # the thread is sleeping for a later tick
+            heapq.heappush(self._ticks, job.tick)
+
+    def _add(self, func, args: tuple, kwargs: dict, deadline: float, interval: float = None, blocking: bool = False, name: str = None) -> Job:
+        """
+        Add a job and start the thread if needed
+        :return: job
+        :rtype: Job
+        """
+        job = Job(self, func, args, kwargs, deadline, interval, blocking, name)
+        with self._lock:
+            self._insert(job)
+            if not self.active:
+                self.active = True
+                self._thread = threading.Thread(target=self._run, name="Scheduler", daemon=True)
+                self._thread.start()
+        return job
+
+    def call_later(self, delay: float, func, *args, blocking: bool = False, name: str = None, **kwargs) -> Job:
+        """
+        Run a function once after a delay
+        :param delay: seconds to wait
+        :type delay: float
+        :param func: function to call with args and kwargs
+        :type func: function
+        :param blocking: whether func may block (runs on a worker thread)
+        :type blocking: bool
+        :param name: name for logs
+        :type name: str | None
+        :return: job (can be cancelled)
+        :rtype: Job
+        """
+        return self._add(func, args, kwargs, time.monotonic() + max(delay, 0), None, blocking, name)
+
+    def call_at(self, when: datetime.datetime | float, func, *args, blocking: bool = False, name: str = None, **kwargs) -> Job:
+        """
+        Run a function once at a time
+        :param when: time to run at (timezone aware datetime or seconds since epoch)
+        :type when: datetime.datetime | float
+        :param func: function to call with args and kwargs
+        :type func: function
+        :param blocking: whether func may block (runs on a worker thread)
+        :type blocking: bool
+        :param name: name for logs
+        :type name: str | None
+        :return: job (can be cancelled)
+        :rtype: Job
+        """
+        if isinstance(when, datetime.datetime):
+            when = when.timestamp()
+        return self.call_later(when - time.time(), func, *args, blocking=blocking, name=name, **kwargs)
+
+    def every(self, interval: float, func, *args, first: float = None, blocking: bool = False, name: str = None, **kwargs) -> Job:
+        """
+        Run a function repeatedly at a fixed rate (runs do not drift, missed runs are skipped)
+        :param interval: seconds between runs
+        :type interval: float
+        :param func: function to call with args and kwargs
+        :type func: function
+        :param first: seconds until the first run, None = interval
+        :type first: float | None
+        :param blocking: whether func may block (runs on a worker thread, a run is skipped while the previous one is still going)
+        :type blocking: bool
+        :param name: name for logs
+        :type name: str | None
+        :return: job (can be cancelled)
+        :rtype: Job
+        """
+        if interval <= 0:
+            raise Exception("[Schwabdev] interval must be greater than 0.")
+        return self._add(func, args, kwargs, time.monotonic() + (interval if first is None else max(first, 0)), interval, blocking, name)
+
+    def cancel(self, job: Job):
+        """
+        Cancel a job, it is removed from its slot when the slot comes up
+        :param job: job
+        :type job: Job
+        """
+        with self._lock:
+            job.cancelled = True
+            self._jobs.discard(job)
+
+    def jobs(self) -> list:
+        """
+        Get the scheduled jobs
+        :return: jobs sorted by next run
+        :rtype: list[Job]
+        """
+        with self._lock:
+            return sorted(self._jobs, key=lambda job: job.deadline)
+
+    def _run(self):
+        """
+        Sleep until the next occupied slot and run its due jobs (runs on its own thread)
+        """
+        while True:
+            with self._lock:
+                while self.active:
+                    if not self._ticks:
+                        self._changed.wait()
+                        continue
+                    delay = self._ticks[0] * self.resolution - time.monotonic()
+                    if delay <= 0:
+                        break
+                    self._changed.wait(delay)
+                if not self.active:
+                    return
+                tick = heapq.heappop(self._ticks)
+                self._occupied.discard(tick)
+                slot = self._wheel[tick % len(self._wheel)]
+                due = [job for job in slot if job.tick <= tick]
+                slot[:] = [job for job in slot if job.tick > tick]
+                due = [job for job in due if not job.cancelled]
+                now = time.monotonic()
+                for job in due:
+                    if job.interval is None:
+                        self._jobs.discard(job)
+                        continue
+                    # the next run after now on the job's grid (missed runs are skipped)
+                    job.deadline = now + job.interval - (now - job.deadline) % job.interval
+                    self._insert(job)
+            for job in due:
+                self._start(job)
+
+    def _start(self, job: Job):
+        """
+        Run a job on this thread or a worker thread
+        :param job: job
+        :type job: Job
+        """
+        if job.blocking:
+            if job._running:
+                self._logger.warning(f"Skipping {job.name}, the previous run has not finished.")
+                return
+            job._running = True
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="SchedulerWorker")
+            self._executor.submit(self._call, job)
+        else:
+            self._call(job)
+
+    def _call(self, job: Job):
+        """
+        Call a job's function
+        :param job: job
+        :type job: Job
+        """
+        job.runs += 1
+        try:
+            job.func(*job.args, **job.kwargs)
+        except Exception as e:
+            self._logger.error(f"Scheduled job {job.name} failed: {e}")
+        finally:
+            job._running = False
+
+    def stop(self, wait: bool = True):
+        """
+        Stop the scheduler thread (jobs that have not run are dropped)
+        :param wait: whether to wait for running blocking jobs
+        :type wait: bool
+        """
+        with self._lock:
+            self.active = False
+            self._changed.notify_all()
+            self._jobs.clear()
+            self._ticks.clear()
+            self._occupied.clear()
+            for slot in self._wheel:
+                slot.clear()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
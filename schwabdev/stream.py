@@ -4,34 +4,74 @@ Coded by Tyler Bowers
 Github: https://github.com/tylerebowers/Schwab-API-Python
 """
 
+import os
 import json
+import time
 import atexit
 import asyncio
 import logging
 import datetime
 import zoneinfo
 import threading
+import contextlib
+import collections
 import websockets
-from time import sleep
+import concurrent.futures
+from .subscriptions import SubscriptionManager, SubscriptionRegistry
+from .watchdog import StreamWatchdog
+from .metrics import StreamMetrics
 import websockets.exceptions
 
 class Stream:
 
-    def __init__(self, client):
+    def __init__(self, client, subscriptions_file: str = None):
         """
         Initialize the stream object to stream data from Schwab Streamer
         :param client: Client object
         :type client: Client
+        :param subscriptions_file: path to a file to persist subscriptions in (restored at startup), None = not persisted
+        :type subscriptions_file: str | None
         """
-        self._websocket = None                                  # the websocket
+        self._websocket = None                                  # the websocket (most recently connected)
+        self._websockets = []                                   # all connected websockets (two in standby mode)
+        self.standby = False                                    # whether a second (standby) connection is kept
+        self._forced = set()                                    # websockets closed by the watchdog
+        self._pending = {}                                      # connection name -> Counter of message keys it delivered that the other connection has not
+        self._pending_order = {}                                # connection name -> order of the delivered message keys
+        self._silent = set()                                    # request ids (str) of logins/resubscribes whose responses are not delivered
+        self.dedupe_window = 4096                               # number of recent messages per connection checked for duplicates
         self._streamer_info = None                              # streamer info from api call
         self._request_id = 0                                    # a counter for the request id
         self.active = False                                     # whether the stream is active
         self._thread = None                                     # the thread that runs the stream
+        self._loop = None                                       # the event loop that owns the websocket
+        self._outbox = collections.deque()                      # queued outgoing requests [request, future, coalesce info]
+        self._outbox_lock = threading.Lock()                    # guards the outbox and subscription records
+        self._flush_scheduled = False                           # whether a flush of the outbox is scheduled
+        self._send_lock = None                                  # asyncio lock so frames are written in order
+        self._responses = {}                                    # request id -> future for the server's response
+        self.send_window = 0.005                                # seconds to gather requests into one frame
         self._client = client                                   # so we can get streamer info
-        self.subscriptions = {}                                 # a dictionary of subscriptions
+        self.subscriptions = SubscriptionRegistry()             # record of subscriptions (fields stored as bitmasks)
         self._logger = logging.getLogger('Schwabdev.Stream')    # init the logger
-        self.backoff_time = 2.0                                 # default backoff time (time to wait before retrying)
+        self.backoff_time = 2.0                                 # first backoff time (time to wait before retrying), doubles per retry of a connection until data arrives
+        self.max_keys = 500                                     # maximum number of keys subscribed per service (Schwab limit)
+        self.manager = SubscriptionManager(self)                # shared, reference counted subscriptions
+        self.watchdog = StreamWatchdog(self)                    # detects stalled connections
+        self.recorder = None                                    # records received messages (see record())
+        self.metrics = StreamMetrics()                          # latency histograms per service
+        self._arrival = (0, 0)                                  # (time.time_ns(), time.perf_counter_ns()) when the last frame was received
+        self._subscriptions_file = subscriptions_file           # path to persist subscriptions in
+        self._saved_version = None                              # subscriptions version last written to the file
+        self._save_lock = threading.Lock()                      # so only one thread writes the subscriptions file at a time
+        self._disconnect_time = None                            # time.monotonic() of the last unexpected disconnect
+        self.reconnect_time = None                              # seconds from the last disconnect to the first data after it
+        self._auto_job = None                                   # scheduled check of start_auto
+        self._auto_keepalive = None                             # event a non-daemon thread waits on so start_auto(daemon=False) keeps the process alive
+
+        # restore persisted subscriptions
+        if subscriptions_file is not None:
+            self._load_subscriptions()
 
         # register atexit to stop the stream (if active)
         def stop_atexit():
@@ -40,93 +80,442 @@ class Stream:
         atexit.register(stop_atexit)
 
 
-    async def _start_streamer(self, receiver_func=print, **kwargs):
+    def _get_streamer_info(self) -> bool:
+        """
+        Get streamer info from the api (cached after the first call)
+        :return: whether streamer info is available
+        :rtype: bool
+        """
+        if self._streamer_info is None:
+            response = self._client.preferences()
+            if response.ok:
+                self._streamer_info = response.json().get('streamerInfo', None)[0]
+            else:
+                self._logger.error("Could not get streamerInfo")
+        return self._streamer_info is not None
+
+    def _load_subscriptions(self):
+        """
+        Load subscriptions from the subscriptions file (if it exists)
+        """
+        try:
+            with open(self._subscriptions_file, 'r') as f:
+                self.subscriptions.load(json.load(f))
+            self._saved_version = self.subscriptions.version
+            self._logger.info(f"Restored subscriptions from \"{self._subscriptions_file}\": {dict((s, self.subscriptions.count(s)) for s in self.subscriptions.services())}")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            self._logger.error(e)
+            self._logger.error("Could not read subscriptions file")
+
+    def _save_subscriptions(self):
+        """
+        Write the subscriptions to the subscriptions file if they changed since the last write
+        """
+        if not self._subscriptions_changed():
+            return
+        try:
+            with self._save_lock:
+                with self._outbox_lock:
+                    version, snapshot = self.subscriptions.version, self.subscriptions.snapshot()
+                with open(f"{self._subscriptions_file}.tmp", 'w') as f:
+                    json.dump(snapshot, f)
+                os.replace(f"{self._subscriptions_file}.tmp", self._subscriptions_file)
+                self._saved_version = version
+        except Exception as e:
+            self._logger.error(e)
+            self._logger.error("Could not write subscriptions file")
+
+    def _subscriptions_changed(self) -> bool:
+        """
+        Whether the subscriptions changed since they were last written to the subscriptions file
+        :return: whether there is something to write
+        :rtype: bool
+        """
+        return self._subscriptions_file is not None and self._saved_version != self.subscriptions.version
+
+    async def _save_subscriptions_async(self):
+        """
+        Write the subscriptions file in an executor thread so the event loop is not blocked by file io
+        """
+        if self._subscriptions_changed():
+            await asyncio.get_running_loop().run_in_executor(None, self._save_subscriptions)
+
+    def _login_request(self) -> dict:
+        """
+        Create the login request
+        :return: login request
+        :rtype: dict
+        """
+        return self.basic_request(service="ADMIN",
+                                  command="LOGIN",
+                                  parameters={"Authorization": self._client.tokens.access_token,
+                                              "SchwabClientChannel": self._streamer_info.get("schwabClientChannel"),
+                                              "SchwabClientFunctionId": self._streamer_info.get("schwabClientFunctionId")})
+
+    def _resubscribe_requests(self) -> list:
+        """
+        Create requests to resubscribe to all recorded subscriptions, keys with the same fields are grouped into one request
+        :return: list of requests
+        :rtype: list
+        """
+        return [self.basic_request(service=service, command="ADD", parameters={"keys": self._list_to_string(keys), "fields": fields})
+                for service in self.subscriptions.services() for fields, keys in self.subscriptions.groups(service).items()]
+
+    def _on_connect(self, websocket):
+        """
+        Register a new connection, if it is the only one then the outgoing queue is reset (queued requests are already covered by the recorded subscriptions)
+        :param websocket: the new connection
+        :type websocket: websockets.ClientConnection
+        """
+        self._websocket = websocket
+        self._websockets.append(websocket)
+        if len(self._websockets) > 1:
+            return
+        with self._outbox_lock:
+            for request, future, info in self._outbox:
+                self._responses.pop(str(request.get("requestid", None)), None)
+                if not future.done(): future.set_result(None)
+            self._outbox.clear()
+            self._flush_scheduled = False
+
+    def _on_disconnect(self, websocket, clean: bool = False):
+        """
+        Unregister a connection, once no connection is left the futures of requests that never got a response are cancelled
+        :param websocket: the lost connection
+        :type websocket: websockets.ClientConnection | None
+        :param clean: whether the connection was closed on purpose (logout/stop), reconnect_time is only measured after unexpected disconnects
+        :type clean: bool
+        """
+        if websocket not in self._websockets:
+            return  # never connected or already unregistered
+        self._websockets.remove(websocket)
+        if self._websockets:
+            self._websocket = self._websockets[0]  # switch over to the connection that is still up
+            return
+        self.active = False
+        self._disconnect_time = None if clean else time.monotonic()
+        for future in self._responses.values():
+            future.cancel()
+        self._responses.clear()
+
+    def _dedupe_key(self, message: str):
+        """
+        Get the key used to match a message with its copy on the other connection: (service, timestamp, content) of each data entry,
+        (service, command, request id) of each response, or the message itself
+        :param message: message
+        :type message: str
+        :return: key, None if the message answers a login/resubscribe of a connection that joined another one (never delivered)
+        :rtype: tuple | str | None
+        """
+        if message.startswith('{"data"'):
+            return tuple((data.get("service", None), data.get("timestamp", None), json.dumps(data.get("content", None), separators=(",", ":")))
+                         for data in json.loads(message).get("data", []))
+        elif message.startswith('{"response"'):
+            responses = json.loads(message).get("response", [])
+            ids = [str(response.get("requestid", None)) for response in responses]
+            if ids and all(request_id in self._silent for request_id in ids):
+                self._silent.difference_update(ids)
+                return None
+            return tuple((response.get("service", None), response.get("command", None), request_id) for response, request_id in zip(responses, ids))
+        return message
+
+    def _is_duplicate(self, message: str, name: str) -> bool:
+        """
+        Whether a message was already delivered by the other connection (standby mode), messages are paired per connection so
+        genuine repeats (the same message twice on both connections) are each delivered once
+        :param message: message
+        :type message: str
+        :param name: name of the connection that received the message ("primary"|"standby")
+        :type name: str
+        :return: whether the message is a duplicate
+        :rtype: bool
+        """
+        key = self._dedupe_key(message)
+        if key is None:
+            return True
+        other = self._pending.setdefault("standby" if name == "primary" else "primary", collections.Counter())
+        if other[key]:  # the other connection delivered it first
+            other[key] -= 1
+            if not other[key]:
+                del other[key]
+            return True
+        pending = self._pending.setdefault(name, collections.Counter())
+        order = self._pending_order.setdefault(name, collections.deque())
+        pending[key] += 1
+        order.append(key)
+        if len(order) > self.dedupe_window:
+            old = order.popleft()
+            if pending[old] > 1:
+                pending[old] -= 1
+            else:
+                pending.pop(old, None)
+        return False
+
+    async def _watch(self, websocket, label: str = ""):
+        """
+        Periodically check a connection with the watchdog, a stalled connection is dropped so that it reconnects
+        :param websocket: connection to watch
+        :type websocket: websockets.ClientConnection
+        :param label: name of the connection for logging
+        :type label: str
+        """
+        self.watchdog.begin(websocket)
+        try:
+            while True:
+                await asyncio.sleep(self.watchdog.check_interval)
+                stalled = self.watchdog.check(websocket)
+                if stalled is not None:
+                    service, quiet, limit = stalled
+                    self._logger.warning(f"No {service or 'messages'} received for {quiet:.1f} seconds (limit {limit:.1f}){label}, reconnecting...")
+                    self._forced.add(websocket)
+                    websocket.transport.abort()
+                    return
+        finally:
+            self.watchdog.end(websocket)
+
+    async def _receive(self, websocket=None) -> str:
+        """
+        Receive a message from a websocket, responses are matched to their request futures by request id
+        :param websocket: connection to receive from, default: the most recently connected
+        :type websocket: websockets.ClientConnection | None
+        :return: message
+        :rtype: str
+        """
+        websocket = websocket or self._websocket
+        message = await websocket.recv()
+        self._arrival = (time.time_ns(), time.perf_counter_ns())  # stamped before any work on the message
+        self.watchdog.observe(message, websocket)
+        if self._disconnect_time is not None and message.startswith('{"data"'):
+            self.reconnect_time = time.monotonic() - self._disconnect_time
+            self._disconnect_time = None
+            self._logger.info(f"First data {self.reconnect_time:.3f} seconds after disconnect.")
+        elif message.startswith('{"response"'):
+            for response in json.loads(message).get("response", []):
+                if response.get("command", None) == "LOGIN" and response.get("content", {}).get("code", 0) != 0:
+                    self._logger.error(f"Stream login failed: {response.get('content', {}).get('msg', None)}")
+                    self._streamer_info = None  # get fresh streamer info on the next connection
+                future = self._responses.pop(str(response.get("requestid", None)), None)
+                if future is not None and not future.done():
+                    future.set_result(response)
+        return message
+
+    async def _start_streamer(self, receiver_func=print, standby: bool = False, **kwargs):
         """
         Start the streamer
         :param receiver_func: function to call when data is received
         :type receiver_func: function
+        :param standby: keep a second connection logged in and subscribed, messages are taken from whichever connection delivers them first
+        :type standby: bool
         """
         # get streamer info
-        response = self._client.preferences()
-        if response.ok:
-            self._streamer_info = response.json().get('streamerInfo', None)[0]
-        else:
-            self._logger.error("Could not get streamerInfo")
+        if not self._get_streamer_info():
             return
 
         # start the stream
+        self._loop = asyncio.get_running_loop()
+        self._send_lock = asyncio.Lock()
+        self.standby = standby
+        self._pending.clear()
+        self._pending_order.clear()
+        self._silent.clear()
+        if standby:
+            await asyncio.gather(self._run_connection(receiver_func, "primary", kwargs),
+                                 self._run_connection(receiver_func, "standby", kwargs))
+        else:
+            await self._run_connection(receiver_func, None, kwargs)
+        await self._save_subscriptions_async()
+        self._loop = None
+
+    async def _run_connection(self, receiver_func, name: str | None, kwargs: dict):
+        """
+        Keep a connection to the streaming server, reconnecting when it is lost
+        :param receiver_func: function to call when data is received
+        :type receiver_func: function
+        :param name: name of the connection in standby mode ("primary"|"standby"), None if there is only one connection
+        :type name: str | None
+        :param kwargs: kwargs to pass to receiver_func
+        :type kwargs: dict
+        """
+        label = f" ({name})" if name else ""
+        backoff = self.backoff_time  # per connection, reset once data arrives
         start_time = datetime.datetime.now(datetime.timezone.utc)
         while True:
+            websocket = None
+            got_data = False
             try:
                 start_time = datetime.datetime.now(datetime.timezone.utc)
-                self._logger.info("Connecting to streaming server...")
-                async with websockets.connect(self._streamer_info.get('streamerSocketUrl'), ping_interval=20) as self._websocket:
-                    self._logger.info("Connected to streaming server.")
-                    # send login payload
-                    login_payload = self.basic_request(service="ADMIN",
-                                                       command="LOGIN",
-                                                       parameters={"Authorization": self._client.tokens.access_token,
-                                                                   "SchwabClientChannel": self._streamer_info.get("schwabClientChannel"),
-                                                                   "SchwabClientFunctionId": self._streamer_info.get("schwabClientFunctionId")})
-                    await self._websocket.send(json.dumps(login_payload))
-                    receiver_func(await self._websocket.recv(), **kwargs)
-                    self.active = True
-
-                    # send subscriptions (that are queued or previously sent)
-                    for service, subs in self.subscriptions.items():
-                        grouped = {} # group subscriptions by fields for more efficient requests
-                        for key, fields in subs.items():
-                            grouped.setdefault(self._list_to_string(fields), []).append(key)
-                        reqs = [] # list of requests to send for this service
-                        for fields, keys in grouped.items():
-                            reqs.append(self.basic_request(service=service, command="ADD", parameters={"keys": self._list_to_string(keys), "fields": fields}))
-                        if reqs:
-                            self._logger.debug(f"Sending subscriptions: {reqs}")
-                            await self._websocket.send(json.dumps({"requests": reqs}))
-                            receiver_func(await self._websocket.recv(), **kwargs)
+                if not self._get_streamer_info(): # cached, only fetched again if the last login failed
+                    break
+                self._logger.info(f"Connecting to streaming server{label}...")
+                async with websockets.connect(self._streamer_info.get('streamerSocketUrl'), ping_interval=20) as websocket:
+                    self._logger.info(f"Connected to streaming server{label}.")
+                    await self._login(websocket)
+                    watch = asyncio.create_task(self._watch(websocket, label))
 
                     # main listener loop
-                    while True:
-                        receiver_func(await self._websocket.recv(), **kwargs)
+                    try:
+                        while True:
+                            message = await self._receive(websocket)
+                            received, arrived = self._arrival
+                            if not got_data and message.startswith('{"data"'):
+                                got_data, backoff = True, self.backoff_time
+                            if name is None or not self._is_duplicate(message, name):
+                                if self.recorder is not None:
+                                    self.recorder.record(message, received)
+                                started = time.perf_counter_ns()
+                                receiver_func(message, **kwargs)
+                                if self.metrics.enabled:
+                                    self.metrics.observe(message, received, started - arrived, time.perf_counter_ns() - started)
+                    finally:
+                        watch.cancel()
 
             except websockets.exceptions.ConnectionClosedOK as e: # "received 1000 (OK); then sent 1000 (OK)"
-                self.active = False
-                self._logger.info("Stream connection closed.")
+                self._logger.info(f"Stream connection closed{label}.")
+                self._on_disconnect(websocket, clean=True)
                 break
             except websockets.exceptions.ConnectionClosedError as e: # lost internet connection
-                self.active = False
                 self._logger.error(e)
-                if (datetime.datetime.now(datetime.timezone.utc).timestamp() - start_time.timestamp()) <= 90:
-                    self._logger.warning(f"Stream has crashed within 90 seconds, likely no subscriptions, invalid login, or lost connection (not restarting).")
+                forced = websocket in self._forced  # dropped by the watchdog
+                self._forced.discard(websocket)
+                self._on_disconnect(websocket)
+                self._forget_pending(name)
+                # in standby mode a connection that delivered data while the other one is still up was dropped, not refused
+                refused = name is None or not got_data or not self._websockets
+                if refused and (datetime.datetime.now(datetime.timezone.utc).timestamp() - start_time.timestamp()) <= 90:
+                    self._logger.warning(f"Stream {'stalled' if forced else 'has crashed'} within 90 seconds{label}, likely no subscriptions, invalid login, or lost connection (not restarting).")
                     break
-                self._logger.error(f"Stream connection Error. Reconnecting in {self.backoff_time} seconds...")
-                self._wait_for_backoff()
+                if self._websockets:
+                    self._logger.warning(f"Stream connection lost{label}, switched over to the other connection.")
+                self._logger.error(f"Stream connection Error{label}. Reconnecting in {backoff} seconds...")
+                backoff = await self._wait_for_backoff(backoff)
             except Exception as e:  # stream has quit unexpectedly, try to reconnect
-                self.active = False
                 self._logger.error(e)
-                self._logger.warning(f"Stream connection lost to server, reconnecting...")
-                self._wait_for_backoff()
+                self._logger.warning(f"Stream connection lost to server{label}, reconnecting...")
+                self._on_disconnect(websocket)
+                self._forget_pending(name)
+                backoff = await self._wait_for_backoff(backoff)
+            finally:
+                self._on_disconnect(websocket)
 
+    def _forget_pending(self, name: str | None):
+        """
+        Forget the messages the other connection delivered but a lost connection did not (it will never deliver them)
+        :param name: name of the lost connection ("primary"|"standby"), None if there is only one connection
+        :type name: str | None
+        """
+        if name is not None:
+            other = "standby" if name == "primary" else "primary"
+            self._pending.pop(other, None)
+            self._pending_order.pop(other, None)
+
+    async def _login(self, websocket):
+        """
+        Send the login and all subscriptions (that are queued or previously sent) as pipelined frames, responses are received by the listener
+        :param websocket: connection to log in on
+        :type websocket: websockets.ClientConnection
+        """
+        self._on_connect(websocket)
+        login = self._login_request()
+        reqs = self._resubscribe_requests()
+        if len(self._websockets) > 1:  # the receiver already got these responses from the other connection
+            self._silent.update(str(request.get("requestid", None)) for request in [login] + reqs)
+        await websocket.send(json.dumps(login))
+        if reqs:
+            self._logger.debug(f"Sending {len(reqs)} subscription requests.")
+            await websocket.send(json.dumps({"requests": reqs}))
+        self.active = True
+
+    @contextlib.asynccontextmanager
+    async def connect(self):
+        """
+        Connect the stream on the running event loop (no thread), use as: async with streamer.connect() as s: async for message in s: ...
+        Requests can be sent on the same loop with await s.send_async(...), recorded subscriptions are sent after login.
+        :return: this stream, iterate over it to receive messages
+        :rtype: Stream
+        """
+        if self.active:
+            raise Exception("[Schwabdev] Stream already active.")
+        if not await asyncio.to_thread(self._get_streamer_info):
+            raise Exception("[Schwabdev] Could not get streamerInfo.")
+        self._logger.info("Connecting to streaming server...")
+        async with websockets.connect(self._streamer_info.get('streamerSocketUrl'), ping_interval=20) as websocket:
+            self._logger.info("Connected to streaming server.")
+            self._loop = asyncio.get_running_loop()
+            self._send_lock = asyncio.Lock()
+            self.standby = False
+            clean = False
+            try:
+                await self._login(websocket)
+                yield self
+                if self.active:
+                    await self._websocket.send(json.dumps({"requests": [self.basic_request(service="ADMIN", command="LOGOUT")]}))
+                clean = True
+            except websockets.exceptions.ConnectionClosedOK:
+                self._logger.info("Stream connection closed.")
+                clean = True
+            finally:
+                self._on_disconnect(websocket, clean=clean)
+                await self._save_subscriptions_async()
+                self._loop = None
+
+    def __aiter__(self):
+        return self
 
-    def _wait_for_backoff(self):
+    async def __anext__(self):
         """
-        Wait for the backoff time
+        Receive the next message (only for streams connected with connect())
+        :return: message from the stream
+        :rtype: str
+        """
+        if not self.active:
+            raise StopAsyncIteration
+        try:
+            message = await self._receive()
+            received = self._arrival[0]
+            if self.recorder is not None:
+                self.recorder.record(message, received)
+            if self.metrics.enabled:
+                self.metrics.observe(message, received)
+            return message
+        except websockets.exceptions.ConnectionClosedOK:
+            self._logger.info("Stream connection closed.")
+            self._on_disconnect(self._websocket, clean=True)
+            self.active = False
+            raise StopAsyncIteration
+        except websockets.exceptions.ConnectionClosedError as e:  # lost internet connection, connect() does not reconnect
+            self._logger.error(e)
+            self._logger.error("Stream connection Error, use connect() again to reconnect.")
+            self._on_disconnect(self._websocket)
+            self.active = False
+            raise StopAsyncIteration
+
+    async def _wait_for_backoff(self, backoff: float) -> float:
         """
-        sleep(self.backoff_time)
+        Wait for a backoff time (without blocking the event loop)
+        :param backoff: seconds to wait
+        :type backoff: float
+        :return: the next backoff time
+        :rtype: float
+        """
+        await asyncio.sleep(backoff)
         # exponential backoff and cap at 128s
-        self.backoff_time = min(self.backoff_time * 2, 128)
+        return min(backoff * 2, 128)
 
-    def start(self, receiver=print, daemon: bool = True, **kwargs):
+    def start(self, receiver=print, daemon: bool = True, standby: bool = False, **kwargs):
         """
         Start the stream
         :param receiver: function to call when data is received
         :type receiver: function
         :param daemon: whether to run the thread in the background (as a daemon)
         :type daemon: bool
+        :param standby: keep a second connection logged in and subscribed so there is no gap when one connection drops
+        :type standby: bool
         """
         if not self.active:
             def _start_async():
-                asyncio.run(self._start_streamer(receiver, **kwargs))
+                asyncio.run(self._start_streamer(receiver, standby, **kwargs))
 
             self._thread = threading.Thread(target=_start_async, daemon=daemon)
             self._thread.start()
@@ -139,6 +528,7 @@ class Stream:
                    now_timezone: zoneinfo.ZoneInfo = zoneinfo.ZoneInfo("America/New_York"), daemon: bool = True, **kwargs):
         """
         Start the stream automatically at market open and close, will NOT erase subscriptions
+        Runs on the client's scheduler at the start and stop times, see market_calendar.StreamScheduler to follow the real market sessions (holidays and early closes)
         :param receiver: function to call when data is received
         :type receiver: function
         :param start_time: time to start the stream, must be later than datetime.time.min, default 9:30 (for EST)
@@ -149,24 +539,44 @@ class Stream:
         :type on_days: list[int] | set(int)
         :param now_timezone: timezone to use for now, default: ZoneInfo("America/New_York")
         :type now_timezone: zoneinfo.ZoneInfo
-        :param daemon: whether to run the thread as a daemon
+        :param daemon: whether to run the stream thread as a daemon, daemon=False also keeps the process alive between sessions
         :type daemon: bool
         """
+        def next_change(now: datetime.datetime) -> datetime.datetime | None:
+            # the next start time or (just after the) stop time on one of the days
+            for offset in range(8):
+                day = now.date() + datetime.timedelta(days=offset)
+                if day.weekday() not in on_days:
+                    continue
+                for change in (datetime.datetime.combine(day, start_time, now_timezone),
+                               datetime.datetime.combine(day, stop_time, now_timezone) + datetime.timedelta(milliseconds=1)):
+                    if change > now:
+                        return change
+            return None
+
         def checker():
+            now = datetime.datetime.now(now_timezone)
+            in_hours = (start_time <= now.time() <= stop_time) and (now.weekday() in on_days)
+            if in_hours and not self.active:
+                if len(self.subscriptions) == 0:
+                    self._logger.warning("No subscriptions, starting stream anyways.")
+                self.start(receiver=receiver, daemon=daemon, **kwargs)
+            elif not in_hours and self.active:
+                self._logger.info("Stopping Stream.")
+                self.stop(clear_subscriptions=False)
+            change = next_change(now)
+            if change is not None:
+                self._auto_job = self._client.scheduler.call_at(change, checker, blocking=True, name="start_auto")
 
-            while True:
-                now = datetime.datetime.now(now_timezone)
-                in_hours = (start_time <= now.time() <= stop_time) and (now.weekday() in on_days)
-                if in_hours and not self.active:
-                    if len(self.subscriptions) == 0:
-                        self._logger.warning("No subscriptions, starting stream anyways.")
-                    self.start(receiver=receiver, daemon=daemon, **kwargs)
-                elif not in_hours and self.active:
-                    self._logger.info("Stopping Stream.")
-                    self.stop(clear_subscriptions=False)
-                sleep(30)
-
-        threading.Thread(target=checker, daemon=daemon).start()
+        if self._auto_job is not None:
+            self._auto_job.cancel()
+        if self._auto_keepalive is not None:
+            self._auto_keepalive.set()  # release the thread of the previous start_auto
+            self._auto_keepalive = None
+        if not daemon:  # the scheduler thread is a daemon, so keep the process alive like the old checker thread did
+            self._auto_keepalive = threading.Event()
+            threading.Thread(target=self._auto_keepalive.wait, name="start_auto", daemon=False).start()
+        self._auto_job = self._client.scheduler.call_later(0, checker, blocking=True, name="start_auto")
 
         if not start_time <= datetime.datetime.now(now_timezone).time() <= stop_time:
             self._logger.info("Stream was started outside of active hours and will launch when in hours.")
@@ -177,80 +587,233 @@ class Stream:
         :param request: request
         :type request: dict
         """
-        def str_to_list(st):
-            if type(st) is str: return st.split(",")
-            elif type(st) is list: return st
         service = request.get("service", None)
         command = request.get("command", None)
         parameters = request.get("parameters", None)
         if parameters is not None and service is not None:
-            keys = str_to_list(parameters.get("keys", []))
-            fields = str_to_list(parameters.get("fields", []))
-            # add service to subscriptions if not already there
-            if service not in self.subscriptions:
-                self.subscriptions[service] = {}
+            keys = self._string_to_list(parameters.get("keys", []))
+            fields = self._string_to_list(parameters.get("fields", []))
             if command == "ADD":
-                for key in keys:
-                    if key not in self.subscriptions[service]:
-                        self.subscriptions[service][key] = fields
-                    else:
-                        self.subscriptions[service][key] = list(set(fields) | set(self.subscriptions[service][key]))
+                self.subscriptions.add(service, keys, fields)
             elif command == "SUBS":
-                self.subscriptions[service] = {}
-                for key in keys:
-                    self.subscriptions[service][key] = fields
+                self.subscriptions.replace(service, keys, fields)
             elif command == "UNSUBS":
-                for key in keys:
-                    if key in self.subscriptions[service]:
-                        self.subscriptions[service].pop(key)
+                self.subscriptions.remove(service, keys)
             elif command == "VIEW":  # not sure if this is even working on Schwab's end :/
-                for key in self.subscriptions[service].keys():
-                    self.subscriptions[service][key] = fields
+                self.subscriptions.view(service, fields)
+            if command in ("ADD", "SUBS") and self.subscriptions.count(service) > self.max_keys:
+                self._logger.warning(f"{service} has {self.subscriptions.count(service)} keys subscribed, over the limit of {self.max_keys}; use streamer.manager to stay under it.")
 
 
 
-    def send(self, requests: list | dict):
+    def _coalesce_info(self, request: dict):
         """
-        Send a request to the stream
-        :param requests: list of requests or a single request
-        :type requests: list | dict
+        Get what is needed to cancel opposing requests, must be called before the request is recorded
+        :param request: request
+        :type request: dict
+        :return: for "ADD"/"UNSUBS" the currently subscribed fields of each key (None if the key is not subscribed)
+        :rtype: dict | None
         """
-        # send the request using the async function
-        asyncio.run(self.send_async(requests))
+        parameters = request.get("parameters", None) or {}
+        service = request.get("service", None)
+        if request.get("command", None) in ("ADD", "UNSUBS"):
+            return {key: set(self.subscriptions.fields(service, key)) if self.subscriptions.has(service, key) else None
+                    for key in self._string_to_list(parameters.get("keys", []))}
+        return None
 
+    def _coalesce(self, entries: list) -> list:
+        """
+        Cancel opposing "ADD"/"UNSUBS" requests of keys (in the same service), only what changes each key's subscription is sent
+        :param entries: queued [request, future, coalesce info] in the order they were sent
+        :type entries: list
+        :return: requests to send, in order
+        :rtype: list
+        """
+        # copies, the caller's requests are not changed (they are often reused)
+        entries = [[{**request, "parameters": dict(request["parameters"])} if request.get("parameters", None) else request, future, info]
+                   for request, future, info in entries]
+        operations = {}  # (service, barrier, key) -> [(index, command, fields, fields before)] in order
+        barrier = {}  # service -> number of "SUBS"/"VIEW", requests cannot cancel across these
+        for i, (request, future, info) in enumerate(entries):
+            service = request.get("service", None)
+            command = request.get("command", None)
+            if command in ("SUBS", "VIEW"):
+                barrier[service] = barrier.get(service, 0) + 1
+            if command not in ("ADD", "UNSUBS") or not request.get("parameters", None):
+                continue
+            fields = set(self._string_to_list(request["parameters"].get("fields", [])))
+            for key in self._string_to_list(request["parameters"].get("keys", [])):
+                operations.setdefault((service, barrier.get(service, 0), key), []).append((i, command, fields, info.get(key, None)))
 
-    async def send_async(self, requests: list | dict):
+        remove = {}  # index -> keys to remove from the request
+        for (service, _, key), key_operations in operations.items():
+            commands = [command for i, command, fields, before in key_operations]
+            if "ADD" not in commands or "UNSUBS" not in commands:
+                continue  # nothing opposes
+            state = before = key_operations[0][3]  # subscription before the first request (None = not subscribed)
+            for i, command, fields, _ in key_operations:
+                state = None if command == "UNSUBS" else (state or set()) | fields
+            last = len(commands) - 1 - commands[::-1].index("UNSUBS")
+            if state == before:
+                keep = []  # the requests leave the subscription unchanged
+            else:  # the last "UNSUBS" and what follows it, the "UNSUBS" is not needed if the key was not subscribed before
+                keep = key_operations[last + (before is None):]
+            for operation in key_operations:
+                if operation not in keep:
+                    remove.setdefault(operation[0], set()).add(key)
+        for i, keys in remove.items():
+            parameters = entries[i][0]["parameters"]
+            parameters["keys"] = self._list_to_string([key for key in self._string_to_list(parameters.get("keys", [])) if key not in keys])
+
+        to_send = []
+        for request, future, info in entries:
+            parameters = request.get("parameters", None)
+            if request.get("command", None) in ("ADD", "UNSUBS") and parameters is not None and parameters.get("keys", None) == "":
+                self._responses.pop(str(request.get("requestid", None)), None)
+                future.set_result(None)  # cancelled out, nothing to send
+            else:
+                to_send.append(request)
+        return to_send
+
+    def _enqueue(self, requests: list | dict) -> list:
         """
-        Send an async (must be awaited) request to the stream (functionally equivalent to send)
+        Record requests and add them to the outgoing queue
         :param requests: list of requests or a single request
         :type requests: list | dict
+        :return: futures for the server's response to each request
+        :rtype: list[concurrent.futures.Future]
         """
-
-        # make sure requests is a list
         if type(requests) is not list:
             requests = [requests]
+        futures = []
+        with self._outbox_lock:
+            for request in requests:
+                info = self._coalesce_info(request)
+                self._record_request(request)
+                future = concurrent.futures.Future()
+                if self._loop is not None and request.get("requestid", None) is not None:
+                    self._responses[str(request.get("requestid"))] = future
+                self._outbox.append([request, future, info])
+                futures.append(future)
+        return futures
 
-        # add requests to list of subscriptions (acts as a queue before stream started)
-        for request in requests:
-            self._record_request(request)
+    def _schedule_flush(self):
+        """
+        Schedule a flush of the outgoing queue after the send window (called on the stream's loop)
+        """
+        loop = asyncio.get_running_loop()
+        loop.call_later(self.send_window, lambda: loop.create_task(self._flush()))
 
-        # send the request if the stream is active, queue otherwise
-        if self.active:
-            to_send = json.dumps({"requests": requests})
-            await self._websocket.send(to_send)
-        else:
+    async def _flush(self):
+        """
+        Send all queued requests as one frame (called on the stream's loop)
+        """
+        async with self._send_lock:
+            with self._outbox_lock:
+                entries = list(self._outbox)
+                self._outbox.clear()
+                self._flush_scheduled = False
+                to_send = self._coalesce(entries)
+            if to_send and not self._websockets:  # not logged in yet, the login sends the recorded subscriptions
+                self._logger.debug(f"Not connected, {len(to_send)} requests are sent with the login.")
+                for request, future, info in entries:
+                    self._responses.pop(str(request.get("requestid", None)), None)
+                    if not future.done():
+                        future.set_result(None)
+            elif to_send:
+                frame = json.dumps({"requests": to_send})
+                for websocket in list(self._websockets):  # every connection needs the requests
+                    try:
+                        await websocket.send(frame)
+                    except Exception as e:
+                        self._logger.error(f"Could not send requests: {e}")
+        await self._save_subscriptions_async()  # file io in an executor, not on the loop (and not while holding the send lock)
+
+    def send(self, requests: list | dict) -> list:
+        """
+        Send a request to the stream, does not block: requests are queued and sent by the stream's event loop, requests sent within send_window are combined into one frame.
+        :param requests: list of requests or a single request
+        :type requests: list | dict
+        :return: futures that complete with the server's response to each request (None if not sent)
+        :rtype: list[concurrent.futures.Future]
+        """
+        futures = self._enqueue(requests)
+        loop = self._loop
+        if loop is None or not loop.is_running():  # not connected, requests are sent when the stream starts
+            with self._outbox_lock:
+                self._outbox.clear()
+            for future in futures:
+                future.set_result(None)
+            self._save_subscriptions()
             self._logger.info("Stream is not active, request queued.")
+            return futures
+        with self._outbox_lock:
+            schedule = not self._flush_scheduled
+            self._flush_scheduled = True
+        if schedule:
+            loop.call_soon_threadsafe(self._schedule_flush)
+        return futures
+
+
+    async def send_async(self, requests: list | dict) -> list:
+        """
+        Send an async (must be awaited) request to the stream, unlike send the requests are written before returning (with any other queued requests)
+        :param requests: list of requests or a single request
+        :type requests: list | dict
+        :return: futures that complete with the server's response to each request (None if not sent)
+        :rtype: list[concurrent.futures.Future]
+        """
+        if self._loop is not asyncio.get_running_loop():
+            return self.send(requests)
+        futures = self._enqueue(requests)
+        await self._flush()
+        return futures
+
 
+    def record(self, directory: str | None, **kwargs):
+        """
+        Record every received message into binary segment files (see TickRecorder), or stop recording
+        :param directory: directory to write segments into, None = stop recording
+        :type directory: str | None
+        :param kwargs: options for TickRecorder (batch_size, flush_interval, compress, fsync, timezone)
+        :type kwargs: dict
+        :return: the recorder or None
+        :rtype: TickRecorder | None
+        """
+        if self.recorder is not None:
+            self.recorder.stop()
+            self.recorder = None
+        if directory is not None:
+            from .recorder import TickRecorder
+            self.recorder = TickRecorder(directory, **kwargs).start()
+        return self.recorder
 
-    def stop(self, clear_subscriptions: bool = True):
+    def stop(self, clear_subscriptions: bool = True, timeout: float = 5.0):
         """
-        Stop the stream
+        Stop the stream, waits until the logout is written (unless called on the stream's event loop)
         :param clear_subscriptions: clear records
         :type clear_subscriptions: bool
+        :param timeout: maximum time to wait for the logout to be written
+        :type timeout: float
         """
         if clear_subscriptions:
-            self.subscriptions = {}
-        self.send(self.basic_request(service="ADMIN", command="LOGOUT"))
+            self.subscriptions.clear()
+            self._save_subscriptions()
+        logout = self.basic_request(service="ADMIN", command="LOGOUT")
+        loop = self._loop
+        if loop is not None and loop.is_running():
+            sent = asyncio.run_coroutine_threadsafe(self.send_async(logout), loop)  # written now, not after the send window
+            try:
+                on_loop = asyncio.get_running_loop() is loop
+            except RuntimeError:
+                on_loop = False
+            if not on_loop:  # the loop cannot write it while this thread waits on it
+                try:
+                    sent.result(timeout)
+                except Exception as e:
+                    self._logger.error(f"Could not send logout: {e}")
+        else:
+            self.send(logout)
         self.active = False
 
     def basic_request(self, service: str, command: str, parameters: dict = None):
@@ -265,13 +828,8 @@ class Stream:
         :return: stream request
         :rtype: dict
         """
-        if self._streamer_info is None:
-            response = self._client.preferences()
-            if response.ok:
-                self._streamer_info = response.json().get('streamerInfo', None)[0]
-            else:
-                self._logger.error("Could not use/get streamerInfo")
-                return {}
+        if not self._get_streamer_info():
+            return {}
 
         # remove None parameters
         if parameters is not None:
@@ -287,6 +845,19 @@ class Stream:
         if parameters is not None and len(parameters) > 0: request["parameters"] = parameters
         return request
 
+    @staticmethod
+    def _string_to_list(st: str | list):
+        """
+        Convert a string to a list (e.g. "1,B,3" -> ["1", "B", "3"]), or passthrough if already a list
+        :param st: string to convert
+        :type st: str | list
+        :return: converted list
+        :rtype: list
+        """
+        if type(st) is str: return st.split(",") if st else []
+        elif type(st) is list: return st
+        return list(st)
+
     @staticmethod
     def _list_to_string(ls: list | str | tuple | set):
         """
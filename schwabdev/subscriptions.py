@@ -0,0 +1,540 @@
+"""
+This file contains a manager to share stream subscriptions between callers
+Github: https://github.com/tylerebowers/Schwab-API-Python
+"""
+
+import sys
+import logging
+import threading
+import collections
+import collections.abc
+
+
+def _field_order(field):
+    """
+    Sort fields numerically when possible
+    """
+    return (0, int(field), "") if str(field).isdigit() else (1, 0, str(field))
+
+
+class SubscriptionView(collections.abc.MutableMapping):
+
+    def __init__(self, registry, service: str):
+        """
+        Live view of the keys of one service in a registry (registry[service]), key -> tuple of fields
+        Setting or deleting a key changes the registry (what is resubscribed), it does not send anything to the stream.
+        :param registry: registry
+        :type registry: SubscriptionRegistry
+        :param service: service
+        :type service: str
+        """
+        self._registry = registry                               # registry viewed
+        self.service = service                                  # service viewed
+
+    def __getitem__(self, key):
+        if not self._registry.has(self.service, key):
+            raise KeyError(key)
+        return tuple(self._registry.fields(self.service, key))
+
+    def __setitem__(self, key, fields):
+        self._registry.set(self.service, key, fields.split(",") if isinstance(fields, str) else list(fields))
+
+    def __delitem__(self, key):
+        if not self._registry.has(self.service, key):
+            raise KeyError(key)
+        self._registry.remove(self.service, [key])
+
+    def __iter__(self):
+        return iter(list(self._registry._masks.get(self.service, ())))
+
+    def __len__(self):
+        return self._registry.count(self.service)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+class SubscriptionRegistry(collections.abc.MutableMapping):
+
+    def __init__(self):
+        """
+        Initialize a compact record of subscriptions, each key (interned) stores its fields as a bitmask per service
+        Indexing by service gives a live view (registry[service][key] -> tuple of fields), so changes through it are kept.
+        """
+        self._masks = {}                                        # service -> key -> bitmask of fields
+        self._bits = {}                                         # service -> field -> bit
+        self._names = {}                                        # service -> [field for each bit]
+        self._strings = {}                                      # service -> bitmask -> fields string (cache)
+        self.version = 0                                        # incremented on every change
+
+    def _mask(self, service: str, fields: list) -> int:
+        """
+        Convert fields to a bitmask, new fields are given the next bit
+        :param service: service
+        :type service: str
+        :param fields: list of fields
+        :type fields: list
+        :return: bitmask
+        :rtype: int
+        """
+        bits = self._bits.setdefault(service, {})
+        mask = 0
+        for field in fields:
+            bit = bits.get(field, None)
+            if bit is None:
+                bit = bits[field] = len(bits)
+                self._names.setdefault(service, []).append(field)
+            mask |= 1 << bit
+        return mask
+
+    def _fields_string(self, service: str, mask: int) -> str:
+        """
+        Convert a bitmask to a fields string (e.g. "0,1,2"), cached per bitmask
+        :param service: service
+        :type service: str
+        :param mask: bitmask
+        :type mask: int
+        :return: fields string
+        :rtype: str
+        """
+        cache = self._strings.setdefault(service, {})
+        string = cache.get(mask, None)
+        if string is None:
+            names = self._names.get(service, [])
+            string = cache[mask] = ",".join(sorted((names[bit] for bit in range(mask.bit_length()) if mask >> bit & 1), key=_field_order))
+        return string
+
+    def add(self, service: str, keys: list, fields: list):
+        """
+        Add keys, fields are merged with the fields of keys that are already subscribed ("ADD")
+        :param service: service
+        :type service: str
+        :param keys: list of keys
+        :type keys: list
+        :param fields: list of fields
+        :type fields: list
+        """
+        self.version += 1
+        mask = self._mask(service, fields)
+        masks = self._masks.setdefault(service, {})
+        for key in keys:
+            key = sys.intern(key)
+            masks[key] = masks.get(key, 0) | mask
+
+    def set(self, service: str, key: str, fields: list):
+        """
+        Set the fields of one key (replacing its fields)
+        :param service: service
+        :type service: str
+        :param key: key
+        :type key: str
+        :param fields: list of fields
+        :type fields: list
+        """
+        self.version += 1
+        self._masks.setdefault(service, {})[sys.intern(key)] = self._mask(service, fields)
+
+    def replace(self, service: str, keys: list, fields: list):
+        """
+        Replace all keys of a service ("SUBS")
+        :param service: service
+        :type service: str
+        :param keys: list of keys
+        :type keys: list
+        :param fields: list of fields
+        :type fields: list
+        """
+        self.version += 1
+        mask = self._mask(service, fields)
+        self._masks[service] = {sys.intern(key): mask for key in keys}
+
+    def remove(self, service: str, keys: list):
+        """
+        Remove keys ("UNSUBS")
+        :param service: service
+        :type service: str
+        :param keys: list of keys
+        :type keys: list
+        """
+        self.version += 1
+        masks = self._masks.setdefault(service, {})
+        for key in keys:
+            masks.pop(key, None)
+
+    def view(self, service: str, fields: list):
+        """
+        Set the fields of every key of a service ("VIEW")
+        :param service: service
+        :type service: str
+        :param fields: list of fields
+        :type fields: list
+        """
+        self.version += 1
+        mask = self._mask(service, fields)
+        masks = self._masks.setdefault(service, {})
+        for key in masks:
+            masks[key] = mask
+
+    def has(self, service: str, key: str) -> bool:
+        """
+        Whether a key is subscribed
+        """
+        return key in self._masks.get(service, ())
+
+    def fields(self, service: str, key: str) -> list:
+        """
+        Get the fields of a subscribed key
+        :param service: service
+        :type service: str
+        :param key: key
+        :type key: str
+        :return: list of fields (empty if not subscribed)
+        :rtype: list
+        """
+        mask = self._masks.get(service, {}).get(key, 0)
+        return self._fields_string(service, mask).split(",") if mask else []
+
+    def count(self, service: str) -> int:
+        """
+        Get the number of keys subscribed in a service
+        """
+        return len(self._masks.get(service, ()))
+
+    def services(self) -> list:
+        """
+        Get the services that have subscribed keys
+        """
+        return [service for service, masks in self._masks.items() if masks]
+
+    def groups(self, service: str) -> dict:
+        """
+        Group the keys of a service by their fields (one pass)
+        :param service: service
+        :type service: str
+        :return: fields string -> list of keys
+        :rtype: dict
+        """
+        by_mask = {}
+        for key, mask in self._masks.get(service, {}).items():
+            by_mask.setdefault(mask, []).append(key)
+        return {self._fields_string(service, mask): keys for mask, keys in by_mask.items()}
+
+    def clear(self):
+        """
+        Remove all subscriptions
+        """
+        self.version += 1
+        self._masks.clear()
+
+    def snapshot(self) -> dict:
+        """
+        Get the subscriptions grouped by fields, used to persist them (service -> fields string -> list of keys)
+        :return: snapshot
+        :rtype: dict
+        """
+        return {service: self.groups(service) for service in self.services()}
+
+    def load(self, snapshot: dict):
+        """
+        Add the subscriptions of a snapshot
+        :param snapshot: snapshot from snapshot()
+        :type snapshot: dict
+        """
+        for service, groups in snapshot.items():
+            for fields, keys in groups.items():
+                self.add(service, keys, fields.split(","))
+
+    def to_dict(self) -> dict:
+        """
+        Get the subscriptions as a dictionary (service -> key -> list of fields)
+        :return: subscriptions
+        :rtype: dict
+        """
+        return {service: {key: self.fields(service, key) for key in masks} for service, masks in self._masks.items() if masks}
+
+    def __len__(self):
+        return len(self.services())
+
+    def __contains__(self, service):
+        return bool(self._masks.get(service, None))
+
+    def __iter__(self):
+        return iter(self.services())
+
+    def __getitem__(self, service):
+        if service not in self._masks:  # an emptied service is still viewable (registry[service] = {} then registry[service][key] = fields)
+            raise KeyError(service)
+        return SubscriptionView(self, service)
+
+    def __setitem__(self, service, keys: dict):
+        self.version += 1
+        self._masks[service] = {sys.intern(key): self._mask(service, fields.split(",") if isinstance(fields, str) else list(fields))
+                                for key, fields in dict(keys).items()}
+
+    def __delitem__(self, service):
+        if service not in self:
+            raise KeyError(service)
+        self.version += 1
+        del self._masks[service]
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+
+class SubscriptionManager:
+
+    def __init__(self, stream, max_keys: int = None):
+        """
+        Initialize a subscription manager, interest in each (service, key, field) is reference counted across owners and only the changes are sent to the stream
+        :param stream: stream to send requests with
+        :type stream: Stream
+        :param max_keys: maximum number of keys subscribed per service, default: stream.max_keys (500)
+        :type max_keys: int | None
+        """
+        self._stream = stream                                   # stream to send requests with
+        self.max_keys = max_keys or stream.max_keys             # maximum keys per service
+        self._counts = {}                                       # service -> key -> Counter(field -> references)
+        self._owners = {}                                       # owner -> Counter((service, key, field) -> references)
+        self._external = {}                                     # service -> keys subscribed directly (with stream.send) before the manager used them
+        self._rotations = {}                                    # service -> rotation state
+        self._lock = threading.RLock()                          # guards counts, owners and rotations
+        self._logger = logging.getLogger("Schwabdev.Subscriptions")
+
+    def _fields(self, service: str, key: str) -> set:
+        """
+        Get the fields that have interest for a key
+        :param service: service
+        :type service: str
+        :param key: key
+        :type key: str
+        :return: set of fields
+        :rtype: set
+        """
+        return set(self._counts.get(service, {}).get(key, ()))
+
+    def _apply(self, changes: list) -> list:
+        """
+        Apply reference count changes and send the minimal requests to get from the old to the new subscriptions
+        :param changes: list of (owner, service, key, field, +1 | -1)
+        :type changes: list
+        :return: futures from stream.send for the requests sent
+        :rtype: list
+        """
+        registry = self._stream.subscriptions
+        with self._lock:
+            touched = dict.fromkeys((service, key) for owner, service, key, field, delta in changes)
+            before = {sk: self._fields(*sk) for sk in touched}
+            with self._stream._outbox_lock:  # the registry is changed by stream.send
+                direct = {service: set(registry._masks.get(service, ())) for service, key in touched}
+                direct_fields = {(service, key): registry.fields(service, key) for service, key in touched if key in direct[service]}
+
+            # check the key limit before changing anything, keys subscribed directly with stream.send count too
+            after_counts = collections.defaultdict(collections.Counter)
+            for owner, service, key, field, delta in changes:
+                after_counts[(service, key)][field] += delta
+            for service in {service for service, key in touched}:
+                current = self._counts.get(service, {})
+                subscribed = set(current) | direct[service]
+                external = self._external.get(service, set())
+                added = {key for (s, key), counter in after_counts.items() if s == service and key not in subscribed
+                         and any(count > 0 for count in counter.values())}
+                removed = {key for (s, key), counter in after_counts.items() if s == service and key in current and key not in external
+                           and all(current[key][field] + counter.get(field, 0) <= 0 for field in set(current[key]) | set(counter))}
+                if len(subscribed) + len(added) - len(removed) > self.max_keys:
+                    raise Exception(f"[Schwabdev] Subscription would exceed the {self.max_keys} key limit for {service} "
+                                    f"({len(subscribed) - len(removed)} subscribed, {len(added)} requested).")
+
+            # keys that were subscribed directly are never unsubscribed by the manager
+            for service, key in touched:
+                if not before[(service, key)] and key in direct[service]:
+                    self._external.setdefault(service, set()).add(key)
+
+            for owner, service, key, field, delta in changes:
+                owned = self._owners.setdefault(owner, collections.Counter())
+                if delta < 0 and owned[(service, key, field)] <= 0:
+                    continue  # owner never had this interest
+                owned[(service, key, field)] += delta
+                if owned[(service, key, field)] <= 0:
+                    del owned[(service, key, field)]
+                counter = self._counts.setdefault(service, {}).setdefault(key, collections.Counter())
+                counter[field] += delta
+                if counter[field] <= 0:
+                    del counter[field]
+                if not counter:
+                    del self._counts[service][key]
+            for owner in [owner for owner, owned in self._owners.items() if not owned]:
+                del self._owners[owner]
+
+            # group keys with the same fields into one request per service
+            adds, unsubs = {}, {}
+            for (service, key), old in before.items():
+                new = self._fields(service, key)
+                external = key in self._external.get(service, ())
+                if not new and old:
+                    if external:
+                        self._external[service].discard(key)  # left as it was subscribed
+                    else:
+                        unsubs.setdefault(service, []).append(key)
+                elif new - old:
+                    if external:
+                        new |= set(direct_fields.get((service, key), ()))  # keep the fields of the direct subscription
+                    adds.setdefault(service, {}).setdefault(tuple(sorted(new, key=_field_order)), []).append(key)
+            requests = [self._stream.basic_request(service, "UNSUBS", parameters={"keys": self._stream._list_to_string(keys)})
+                        for service, keys in unsubs.items()]
+            requests += [self._stream.basic_request(service, "ADD", parameters={"keys": self._stream._list_to_string(keys), "fields": self._stream._list_to_string(fields)})
+                         for service, groups in adds.items() for fields, keys in groups.items()]
+        if requests:
+            return self._stream.send(requests)
+        return []
+
+    def subscribe(self, owner, service: str, keys: str | list, fields: str | list) -> list:
+        """
+        Add interest in keys and fields for an owner, only keys (or fields) that are new to the stream are sent
+        :param owner: anything that identifies the caller (e.g. a strategy name)
+        :type owner: any
+        :param service: service (e.g. "LEVELONE_EQUITIES")
+        :type service: str
+        :param keys: list of keys to use (e.g. ["AMD", "INTC"])
+        :type keys: list | str
+        :param fields: list of fields to use
+        :type fields: list | str
+        :return: futures from stream.send for the requests sent
+        :rtype: list
+        """
+        keys, fields = self._stream._string_to_list(keys), self._stream._string_to_list(fields)
+        return self._apply([(owner, service.upper(), key, str(field), 1) for key in keys for field in fields])
+
+    def unsubscribe(self, owner, service: str, keys: str | list, fields: str | list = None) -> list:
+        """
+        Remove interest in keys (and fields) for an owner, keys are only unsubscribed when no owner is left
+        :param owner: the owner used to subscribe
+        :type owner: any
+        :param service: service (e.g. "LEVELONE_EQUITIES")
+        :type service: str
+        :param keys: list of keys to remove
+        :type keys: list | str
+        :param fields: list of fields to remove, None = all fields of the owner
+        :type fields: list | str | None
+        :return: futures from stream.send for the requests sent
+        :rtype: list
+        """
+        service = service.upper()
+        keys = self._stream._string_to_list(keys)
+        with self._lock:
+            owned = self._owners.get(owner, {})
+            if fields is None:
+                changes = [(owner, s, k, f, -count) for (s, k, f), count in owned.items() if s == service and k in keys]
+            else:
+                changes = [(owner, service, key, str(field), -owned.get((service, key, str(field)), 0))
+                           for key in keys for field in self._stream._string_to_list(fields)]
+            return self._apply([change for change in changes if change[4] < 0])
+
+    def release(self, owner) -> list:
+        """
+        Remove all interest of an owner
+        :param owner: the owner used to subscribe
+        :type owner: any
+        :return: futures from stream.send for the requests sent
+        :rtype: list
+        """
+        with self._lock:
+            return self._apply([(owner, s, k, f, -count) for (s, k, f), count in self._owners.get(owner, {}).items()])
+
+    def usage(self) -> dict:
+        """
+        Get the number of subscribed keys per service
+        :return: service -> number of keys
+        :rtype: dict
+        """
+        with self._lock:
+            return {service: len(keys) for service, keys in self._counts.items() if keys}
+
+    def subscribed(self, service: str) -> dict:
+        """
+        Get the subscribed keys and fields of a service
+        :param service: service
+        :type service: str
+        :return: key -> list of fields
+        :rtype: dict
+        """
+        with self._lock:
+            return {key: sorted(counter, key=_field_order) for key, counter in self._counts.get(service.upper(), {}).items()}
+
+    def rotate(self, service: str, universe: list, fields: str | list, size: int = None, interval: float = 60.0) -> None:
+        """
+        Cycle a universe larger than the key limit through the remaining room of a service, each step unsubscribes the previous window and subscribes the next one
+        :param service: service (e.g. "LEVELONE_EQUITIES")
+        :type service: str
+        :param universe: list of keys to cycle through
+        :type universe: list | str
+        :param fields: list of fields to use
+        :type fields: list | str
+        :param size: number of keys in each window, None = all room left under the limit
+        :type size: int | None
+        :param interval: seconds between steps
+        :type interval: float
+        """
+        service = service.upper()
+        self.stop_rotation(service)
+        universe = list(dict.fromkeys(self._stream._string_to_list(universe)))
+        owner = ("rotation", service)
+        state = {"owner": owner, "universe": universe, "fields": self._stream._string_to_list(fields), "size": size,
+                 "interval": interval, "position": 0, "job": None, "steps": 0}
+        with self._lock:
+            self._rotations[service] = state
+        self._rotate_step(service)
+        state["job"] = self._stream._client.scheduler.every(interval, self._rotate_step, service, name=f"rotate {service}")
+
+    def _rotate_step(self, service: str):
+        """
+        Move a rotation to its next window
+        :param service: service of the rotation
+        :type service: str
+        """
+        with self._lock:
+            state = self._rotations.get(service, None)
+            if state is None or not state["universe"]:
+                return
+            owner, universe = state["owner"], state["universe"]
+            others = {k for o, owned in self._owners.items() if o != owner for (s, k, f) in owned if s == service}
+            rotating = {k for (s, k, f) in self._owners.get(owner, {}) if s == service} - others - self._external.get(service, set())
+            with self._stream._outbox_lock:
+                others |= set(self._stream.subscriptions._masks.get(service, ())) - rotating  # including keys subscribed directly
+            room = self.max_keys - len(others)
+            size = min(state["size"] or room, room, len(universe))
+            if size <= 0:
+                self._logger.warning(f"No room left under the {self.max_keys} key limit to rotate {service}.")
+                return
+            start = state["position"]
+            window = [universe[(start + i) % len(universe)] for i in range(size)]
+            state["position"] = (start + size) % len(universe)
+            state["steps"] += 1
+            changes = [(owner, s, k, f, -count) for (s, k, f), count in self._owners.get(owner, {}).items()]
+            changes += [(owner, service, key, field, 1) for key in window for field in state["fields"]]
+            self._apply(changes)
+
+    def stop_rotation(self, service: str, unsubscribe: bool = True):
+        """
+        Stop a rotation
+        :param service: service of the rotation
+        :type service: str
+        :param unsubscribe: whether to remove the current window
+        :type unsubscribe: bool
+        """
+        with self._lock:
+            state = self._rotations.pop(service.upper(), None)
+        if state is not None:
+            if state["job"] is not None:
+                state["job"].cancel()
+            if unsubscribe:
+                self.release(state["owner"])
+
+    def rotations(self) -> dict:
+        """
+        Get the state of the running rotations
+        :return: service -> (universe size, window position, steps taken)
+        :rtype: dict
+        """
+        with self._lock:
+            return {service: {"universe": len(state["universe"]), "position": state["position"], "steps": state["steps"]}
+                    for service, state in self._rotations.items()}
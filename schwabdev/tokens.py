@@ -6,7 +6,6 @@ Github: https://github.com/tylerebowers/Schwab-API-Python
 import os
 import ssl
 import json
-import time
 import base64
 import logging
 import requests
@@ -81,14 +80,9 @@ class Tokens:
             if update_tokens_auto:
                 self.update_refresh_token()
 
-        # Spawns a thread to check the access token and update if necessary
+        # Schedule a check of the tokens for when they are due to be updated (on the client's scheduler)
         if update_tokens_auto:
-            def checker():
-                while True:
-                    self.update_tokens()
-                    time.sleep(30)
-
-            threading.Thread(target=checker, daemon=True).start()
+            self._schedule_update()
         else:
             self._logger.warning("Warning: Tokens will not be updated automatically.")
 
@@ -181,6 +175,36 @@ class Tokens:
             self._logger.info("The access token has expired, updating automatically.")
             self.update_access_token()
 
+    def _schedule_update(self):
+        """
+        Schedule the next check of the tokens for when the access token (or refresh token) is due, or in 30 seconds if it is already due (a failed update is retried)
+        """
+        now = datetime.datetime.now(datetime.timezone.utc)
+        at_due = self._access_token_timeout - (now - self._access_token_issued).total_seconds() - 61
+        rt_due = self._refresh_token_timeout - (now - self._refresh_token_issued).total_seconds() - 3600
+        delay = min(at_due, rt_due)
+        self._client.scheduler.call_later(delay if delay > 0 else 30, self._scheduled_update, blocking=True, name="tokens")
+
+    def _scheduled_update(self):
+        """
+        Update the tokens if needed then schedule the next check (runs on a scheduler worker), the next check is scheduled even if the update raises.
+        The refresh token update waits on the user (browser and input), so it runs on its own thread instead of holding a worker of the shared scheduler.
+        """
+        rt_delta = self._refresh_token_timeout - (datetime.datetime.now(datetime.timezone.utc) - self._refresh_token_issued).total_seconds()
+        if rt_delta < 3600:
+            threading.Thread(target=self._update_and_schedule, name="Tokens", daemon=True).start()
+        else:
+            self._update_and_schedule()
+
+    def _update_and_schedule(self):
+        """
+        Update the tokens if needed then schedule the next check, even if the update raises
+        """
+        try:
+            self.update_tokens()
+        finally:
+            self._schedule_update()
+
     """
         Access Token functions below
     """
@@ -0,0 +1,255 @@
+"""
+This file contains a warmup routine that primes tokens, connections, and caches before a market session
+Github: https://github.com/tylerebowers/Schwab-API-Python
+"""
+
+import time
+import logging
+import datetime
+import concurrent.futures
+from .market_calendar import MarketCalendar
+
+
+class Warmup:
+
+    def __init__(self, client, symbols: list | str = None, calendar: MarketCalendar = None, token_window: float = 900.0, connections: int = 2,
+                 keepalive: float = 30.0, connect_stream: bool = True, receiver=print, daemon: bool = True, **kwargs):
+        """
+        Initialize a warmup routine so the first calls of a session do not pay for cold connections, tokens, or lookups
+        A run refreshes the access token if it expires within token_window, opens pooled connections, caches the streamer info,
+        market hours, and instrument metadata, and connects the stream; the connections are then kept alive until the session starts.
+        Use run() directly, schedule(...) to run before every session, or pass it as StreamScheduler(..., on_warmup=warmup).
+        :param client: client to warm up
+        :type client: Client
+        :param symbols: symbols to cache instrument metadata for (e.g. ["SPY", "QQQ"])
+        :type symbols: list | str | None
+        :param calendar: market calendar to load the market hours into, None = a new calendar for the equity and option markets
+        :type calendar: MarketCalendar | None
+        :param token_window: seconds, the access token is refreshed if it expires within this window
+        :type token_window: float
+        :param connections: number of connections to open at once (one per thread that trades at the open)
+        :type connections: int
+        :param keepalive: seconds between requests that keep the connections open, 0 = no keepalive
+        :type keepalive: float
+        :param connect_stream: whether to start the stream (if it is not already running)
+        :type connect_stream: bool
+        :param receiver: function to call when stream data is received
+        :type receiver: function
+        :param daemon: whether to run the stream thread as a daemon
+        :type daemon: bool
+        :param kwargs: kwargs for stream.start (e.g. standby=True)
+        :type kwargs: dict
+        """
+        self._client = client                                   # client to warm up
+        self.symbols = client._format_list(symbols)             # symbols for instrument metadata
+        self.calendar = calendar or MarketCalendar(client, ("equity", "option"))  # market hours cache
+        self.token_window = token_window                        # refresh the access token if it expires within this
+        self.connections = max(connections, 1)                  # connections to open at once
+        self.keepalive = keepalive                              # seconds between keepalive requests
+        self.connect_stream = connect_stream                    # whether to start the stream
+        self.receiver = receiver                                # receiver for the stream
+        self.daemon = daemon                                    # whether the stream thread is a daemon
+        self._kwargs = kwargs                                   # kwargs for stream.start
+        self.accounts = {}                                      # account number -> hash
+        self.instruments = {}                                   # symbol -> instrument metadata
+        self.timings = {}                                       # step -> seconds taken in the last run
+        self._plan = None                                       # (market, lead, extended) of scheduled runs
+        self._job = None                                        # scheduled run
+        self._keepalive_job = None                              # keepalive requests
+        self._logger = logging.getLogger("Schwabdev.Warmup")
+
+    def __call__(self, market: str = None, session: tuple = None):
+        """
+        Hook interface so the warmup can be passed directly to StreamScheduler(..., on_warmup=warmup)
+        :param market: market that is about to open
+        :type market: str | None
+        :param session: (start, end) of the session
+        :type session: tuple | None
+        """
+        self.run(market, session)
+
+    def _tokens(self):
+        """
+        Refresh the access token if it expires within the window (the refresh token is updated if it is due)
+        """
+        tokens = self._client.tokens
+        now = datetime.datetime.now(datetime.timezone.utc)
+        if tokens._refresh_token_timeout - (now - tokens._refresh_token_issued).total_seconds() < 3600:
+            tokens.update_tokens()
+        elif tokens._access_token_timeout - (now - tokens._access_token_issued).total_seconds() < self.token_window:
+            self._logger.info("Refreshing the access token before the session.")
+            tokens.update_access_token()
+
+    def _linked(self) -> list:
+        """
+        Send one linked accounts request per connection at once, so every pooled connection is used
+        :return: responses
+        :rtype: list[requests.Response]
+        """
+        client = self._client
+        def linked(_):  # straight to the session, coalescing would share one connection
+            return client._session.get(f'{client._base_api_url}/trader/v1/accounts/accountNumbers',
+                                       headers={'Authorization': f'Bearer {client.tokens.access_token}'},
+                                       timeout=client.timeout)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.connections, thread_name_prefix="Warmup") as executor:
+            return list(executor.map(linked, range(self.connections)))
+
+    def _connections(self):
+        """
+        Open the pooled connections with concurrent requests, the linked accounts are cached
+        """
+        responses = self._linked()
+        for response in responses:
+            if response.ok:
+                self.accounts = {account.get("accountNumber"): account.get("hashValue") for account in response.json()}
+                return
+        raise Exception(f"[Schwabdev] Linked accounts request failed ({responses[0].status_code}): {responses[0].text}")
+
+    def _streamer_info(self):
+        """
+        Cache the streamer info (used by the stream to log in)
+        """
+        if not self._client.stream._get_streamer_info():
+            raise Exception("[Schwabdev] Could not get streamerInfo")
+
+    def _market_hours(self):
+        """
+        Cache today's market hours in the calendar
+        """
+        self.calendar.load(datetime.datetime.now(self.calendar.timezone).date())
+
+    def _instruments(self):
+        """
+        Cache the instrument metadata of the symbols
+        """
+        if not self.symbols:
+            return
+        response = self._client.instruments(self.symbols, "fundamental")
+        if not response.ok:
+            raise Exception(f"[Schwabdev] Instruments request failed ({response.status_code}): {response.text}")
+        for instrument in response.json().get("instruments", []):
+            self.instruments[instrument.get("symbol")] = instrument
+
+    def _stream(self):
+        """
+        Start the stream if it is not running
+        """
+        if self.connect_stream and not self._client.stream.active:
+            self._client.stream.start(self.receiver, daemon=self.daemon, **self._kwargs)
+
+    def run(self, market: str = None, session: tuple = None) -> dict:
+        """
+        Run every warmup step, a failed step is logged and does not stop the others
+        :param market: market that is about to open (for logs)
+        :type market: str | None
+        :param session: (start, end) of the session, the keepalive stops when it starts (None = keep alive until stop())
+        :type session: tuple | None
+        :return: step -> seconds taken (None if the step failed)
+        :rtype: dict
+        """
+        self._logger.info(f"Warming up{f' for the {market} session' if market else ''}.")
+        timings = {}
+        for step, func in (("tokens", self._tokens), ("connections", self._connections), ("streamer_info", self._streamer_info),
+                           ("market_hours", self._market_hours), ("instruments", self._instruments), ("stream", self._stream)):
+            start = time.perf_counter()
+            try:
+                func()
+                timings[step] = time.perf_counter() - start
+            except Exception as e:
+                self._logger.error(f"Warmup step {step} failed: {e}")
+                timings[step] = None
+        self.timings = timings
+        self._start_keepalive(session)
+        return timings
+
+    def _start_keepalive(self, session: tuple = None):
+        """
+        Keep the pooled connections open with periodic requests
+        :param session: (start, end) of the session, the keepalive stops when it starts
+        :type session: tuple | None
+        """
+        if self._keepalive_job is not None:
+            self._keepalive_job.cancel()
+            self._keepalive_job = None
+        if self.keepalive <= 0:
+            return
+        scheduler = self._client.scheduler
+        self._keepalive_job = scheduler.every(self.keepalive, self._ping, blocking=True, name="keepalive")
+        if session is not None:
+            scheduler.call_at(session[0], self._stop_keepalive, self._keepalive_job, name="keepalive end")
+
+    def _ping(self):
+        """
+        Send a keepalive request on every pooled connection
+        """
+        failed = [response.status_code for response in self._linked() if not response.ok]
+        if failed:
+            self._logger.warning(f"Keepalive requests failed ({', '.join(map(str, failed))}).")
+
+    def _stop_keepalive(self, job):
+        """
+        Stop a keepalive (if it is still the current one)
+        :param job: keepalive job
+        :type job: Job
+        """
+        job.cancel()
+        if self._keepalive_job is job:
+            self._keepalive_job = None
+
+    def schedule(self, market: str = "equity", lead: float = 300.0, extended: bool = False):
+        """
+        Run the warmup lead seconds before every session of a market (from the calendar), on the client's scheduler
+        :param market: market ("equity", "option", ...), must be one of calendar.markets
+        :type market: str
+        :param lead: seconds before the session starts to run
+        :type lead: float
+        :param extended: whether the session includes pre market hours
+        :type extended: bool
+        """
+        if market not in self.calendar.markets:
+            raise Exception(f"[Schwabdev] Market {market} is not loaded by the calendar; options are {self.calendar.markets}")
+        self._plan = (market, lead, extended)
+        self._arm()
+
+    def _arm(self, after: datetime.datetime = None):
+        """
+        Schedule the run for the next session
+        :param after: time to look for a session after, None = now
+        :type after: datetime.datetime | None
+        """
+        if self._job is not None:
+            self._job.cancel()
+        market, lead, extended = self._plan
+        try:
+            session = self.calendar.next_session(market, after, extended)
+        except Exception as e:
+            self._logger.error(f"Could not load market hours: {e}")
+            session = None
+        if session is None:
+            self._job = self._client.scheduler.call_later(3600, self._arm, after, blocking=True, name="warmup")
+            return
+        when = session[0] - datetime.timedelta(seconds=lead)
+        self._logger.info(f"Warmup for the {market} session scheduled at {when}.")
+        self._job = self._client.scheduler.call_at(when, self._scheduled, market, session, blocking=True, name="warmup")
+
+    def _scheduled(self, market: str, session: tuple):
+        """
+        Run the warmup then schedule it for the following session (runs on a scheduler worker)
+        :param market: market
+        :type market: str
+        :param session: (start, end) of the session
+        :type session: tuple
+        """
+        self.run(market, session)
+        self._arm(session[1])
+
+    def stop(self):
+        """
+        Cancel the scheduled runs and the keepalive
+        """
+        if self._job is not None:
+            self._job.cancel()
+            self._job = None
+        if self._keepalive_job is not None:
+            self._keepalive_job.cancel()
+            self._keepalive_job = None
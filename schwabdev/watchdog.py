@@ -0,0 +1,210 @@
+"""
+This file contains a watchdog that detects stalled stream connections and tracks heartbeats
+Github: https://github.com/tylerebowers/Schwab-API-Python
+"""
+
+import time
+import logging
+
+
+def _scan(message: str):
+    """
+    Find the services and content keys of a data message without parsing it (a substring search, much cheaper than json.loads)
+    :param message: data message from the stream
+    :type message: str
+    :return: [(service, [key, ...]), ...]
+    :rtype: list
+    """
+    services = []
+    start = message.find('"service"')
+    while start != -1:
+        end = message.find('"service"', start + 9)
+        name = _string_value(message, start + 9)
+        keys = []
+        position = message.find('"key"', start, None if end == -1 else end)
+        while position != -1:
+            keys.append(_string_value(message, position + 5))
+            position = message.find('"key"', position + 5, None if end == -1 else end)
+        services.append((name, keys))
+        start = end
+    return services
+
+
+def _string_value(message: str, position: int) -> str | None:
+    """
+    Read the string value that follows a name ("name": "value")
+    :param message: message
+    :type message: str
+    :param position: position just after the quoted name
+    :type position: int
+    :return: value, None if it is not a string
+    :rtype: str | None
+    """
+    start = message.find('"', position)
+    if start == -1 or message[position:start].strip() != ":":
+        return None
+    end = message.find('"', start + 1)
+    return None if end == -1 else message[start + 1:end]
+
+
+class StreamWatchdog:
+
+    def __init__(self, stream, multiplier: float = 10.0, min_threshold: float = 30.0, heartbeat_timeout: float = 60.0,
+                 min_samples: int = 20, alpha: float = 0.05, check_interval: float = 1.0, max_stalls: int = 1):
+        """
+        Initialize a watchdog that tracks when each service last received a message and decides when a connection has gone quiet
+        A service is stalled when it has been quiet for longer than multiplier times its normal (average) time between messages.
+        :param stream: stream that is watched (used for the recorded subscriptions)
+        :type stream: Stream
+        :param multiplier: how many normal intervals a service can be quiet for
+        :type multiplier: float
+        :param min_threshold: smallest quiet time (seconds) that counts as a stall
+        :type min_threshold: float
+        :param heartbeat_timeout: seconds without any message (once heartbeats have been seen) that counts as a stall
+        :type heartbeat_timeout: float
+        :param min_samples: number of messages of a service before its normal interval is trusted
+        :type min_samples: int
+        :param alpha: weight of the newest interval in the average (exponentially weighted)
+        :type alpha: float
+        :param check_interval: seconds between checks
+        :type check_interval: float
+        :param max_stalls: reconnects for a quiet service before it is treated as closed (e.g. after market close), it is checked again once data arrives
+        :type max_stalls: int
+        """
+        self._stream = stream                                   # stream being watched
+        self.enabled = True                                     # whether stalls force a reconnect
+        self.multiplier = multiplier                            # quiet time limit in normal intervals
+        self.min_threshold = min_threshold                      # minimum quiet time limit
+        self.heartbeat_timeout = heartbeat_timeout              # quiet time limit for the whole connection
+        self.min_samples = min_samples                          # messages needed before a service is checked
+        self.alpha = alpha                                      # weight of new intervals
+        self.check_interval = check_interval                    # seconds between checks
+        self.max_stalls = max_stalls                            # reconnects for a quiet service until data arrives
+        self._interval = {}                                     # service -> average seconds between messages
+        self._samples = {}                                      # service -> number of messages
+        self._stalls = {}                                       # service -> consecutive stalls (no reconnects after max_stalls)
+        self._key_last = {}                                     # (service, key) -> time of last update
+        self._connections = {}                                  # connection -> {service: time of last message, None: time of last message of any kind}
+        self._opened = {}                                       # connection -> time it started being watched
+        self.heartbeats = 0                                     # heartbeats received
+        self.last_heartbeat = None                              # time of the last heartbeat
+        self.stalls = 0                                         # reconnects forced by the watchdog
+        self._logger = logging.getLogger("Schwabdev.Watchdog")
+
+    def begin(self, connection):
+        """
+        Start watching a connection (after it logs in)
+        :param connection: connection
+        :type connection: any
+        """
+        now = time.monotonic()
+        self._connections[connection] = {None: now}
+        self._opened[connection] = now
+
+    def end(self, connection):
+        """
+        Stop watching a connection
+        :param connection: connection
+        :type connection: any
+        """
+        self._connections.pop(connection, None)
+        self._opened.pop(connection, None)
+
+    def observe(self, message: str, connection=None):
+        """
+        Record a received message
+        :param message: message from the stream
+        :type message: str
+        :param connection: connection the message was received on
+        :type connection: any
+        """
+        now = time.monotonic()
+        last = self._connections.get(connection, None)
+        if last is None:
+            self.begin(connection)
+            last = self._connections[connection]
+        last[None] = now
+        if message.startswith('{"data"'):
+            for name, keys in _scan(message):
+                previous = last.get(name, None)
+                last[name] = now
+                self._stalls[name] = 0
+                self._samples[name] = self._samples.get(name, 0) + 1
+                if previous is not None:
+                    interval = self._interval.get(name, None)
+                    self._interval[name] = now - previous if interval is None else interval + self.alpha * (now - previous - interval)
+                for key in keys:
+                    self._key_last[(name, key)] = now
+        elif message.startswith('{"notify"'):
+            self.heartbeats += 1
+            self.last_heartbeat = now
+
+    def threshold(self, service: str) -> float | None:
+        """
+        Get how long a service can be quiet for before it counts as a stall
+        :param service: service name
+        :type service: str
+        :return: seconds, None if there are not enough messages to know the normal interval
+        :rtype: float | None
+        """
+        if self._samples.get(service, 0) < self.min_samples or service not in self._interval:
+            return None
+        return max(self.min_threshold, self.multiplier * self._interval[service])
+
+    def check(self, connection) -> tuple | None:
+        """
+        Check whether a connection has stalled, a service that stays quiet after max_stalls reconnects is not checked until data arrives again (e.g. after market close)
+        :param connection: connection
+        :type connection: any
+        :return: (service (None for the whole connection), quiet seconds, limit seconds) if stalled, else None
+        :rtype: tuple | None
+        """
+        last = self._connections.get(connection, None)
+        if last is None or not self.enabled:
+            return None
+        now = time.monotonic()
+        if self.heartbeats and now - last[None] > self.heartbeat_timeout:
+            self.stalls += 1
+            return None, now - last[None], self.heartbeat_timeout
+        for service in self._stream.subscriptions.services():
+            if self._stalls.get(service, 0) >= self.max_stalls:
+                continue  # reconnecting did not help, the service is closed
+            limit = self.threshold(service)
+            quiet = now - last.get(service, self._opened[connection])
+            if limit is not None and quiet > limit:
+                self._stalls[service] = self._stalls.get(service, 0) + 1
+                self.stalls += 1
+                return service, quiet, limit
+        return None
+
+    def staleness(self, service: str = None) -> dict:
+        """
+        Get the seconds since each subscribed key was last updated
+        :param service: service name, None = all services
+        :type service: str | None
+        :return: {service: {key: seconds (None if never updated)}}
+        :rtype: dict
+        """
+        now = time.monotonic()
+        services = self._stream.subscriptions.services() if service is None else [service]
+        staleness = {}
+        for name in services:
+            keys = staleness[name] = {}
+            for key in self._stream.subscriptions.get(name, {}):
+                last = self._key_last.get((name, key), None)
+                keys[key] = None if last is None else now - last
+        return staleness
+
+    def stats(self) -> dict:
+        """
+        Get per service message counts, normal intervals, and limits
+        :return: {service: {"messages", "interval", "threshold", "last"}, ...} where last is the seconds since the last message on any connection
+        :rtype: dict
+        """
+        now = time.monotonic()
+        stats = {}
+        for service, samples in self._samples.items():
+            times = [last[service] for last in self._connections.values() if service in last]
+            stats[service] = {"messages": samples, "interval": self._interval.get(service, None),
+                              "threshold": self.threshold(service), "last": now - max(times) if times else None}
+        return stats
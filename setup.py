@@ -23,6 +23,9 @@ setup(
         'websockets',
         'cryptography',
     ],
+    extras_require={
+        'numpy': ['numpy'],  # order books, bars, recorder, and archive
+    },
     keywords=['python', 'schwab', 'api', 'client', 'finance', 'trading', 'stocks', 'equities', 'options', 'forex', 'futures'],
     classifiers=[
         'Topic :: Office/Business :: Financial :: Investment',
@@ -0,0 +1,293 @@
+"""
+This file contains a local stand-in for the streaming server, used by the tests to run streams without an account or market hours
+Github: https://github.com/tylerebowers/Schwab-API-Python
+"""
+
+import json
+import time
+import asyncio
+import logging
+import threading
+import websockets
+
+
+class LocalStreamer:
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, heartbeat: float = None):
+        """
+        Initialize a local streaming server that speaks the same protocol as the Schwab streamer (login, ADD/SUBS/UNSUBS/VIEW, LOGOUT)
+        Data is only sent when published with publish(...), connections can be dropped with drop(...) or go quiet with stall(...)
+        :param host: host to listen on
+        :type host: str
+        :param port: port to listen on (0 = any free port)
+        :type port: int
+        :param heartbeat: seconds between "notify" heartbeats sent to each connection (None = no heartbeats)
+        :type heartbeat: float | None
+        """
+        self.host = host                                        # host to listen on
+        self.port = port                                        # port (set once started)
+        self.heartbeat = heartbeat                              # seconds between heartbeats
+        self._loop = None                                       # event loop of the server thread
+        self._server = None                                     # websockets server
+        self._thread = None                                     # server thread
+        self._connections = []                                  # [{"websocket", "subscriptions": {service: {key: fields}}, "data", "heartbeats"}, ...] in connect order
+        self._started = threading.Event()                       # set once the server is listening
+        self._stopped = None                                    # asyncio future, set to stop the server
+        self._logger = logging.getLogger("Schwabdev.LocalStreamer")
+        self.received = []                                      # all requests received, in order
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}"
+
+    @property
+    def streamer_info(self) -> dict:
+        """
+        Streamer info in the same format as client.preferences()["streamerInfo"][0]
+        :return: streamer info
+        :rtype: dict
+        """
+        return {"streamerSocketUrl": self.url, "schwabClientCustomerId": "local", "schwabClientCorrelId": "local",
+                "schwabClientChannel": "N9", "schwabClientFunctionId": "APIAPP"}
+
+    @property
+    def connections(self) -> int:
+        """
+        Number of open connections
+        :return: number of open connections
+        :rtype: int
+        """
+        return len(self._connections)
+
+    def attach(self, stream):
+        """
+        Point a stream at this server (replaces its cached streamer info, so no api call is made)
+        :param stream: stream to attach
+        :type stream: Stream
+        """
+        stream._streamer_info = self.streamer_info
+
+    def start(self):
+        """
+        Start the server on a background thread
+        :return: this server
+        :rtype: LocalStreamer
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=lambda: asyncio.run(self._serve()), daemon=True)
+            self._thread.start()
+            self._started.wait()
+        return self
+
+    async def _serve(self):
+        """
+        Run the server until stopped
+        """
+        self._loop = asyncio.get_running_loop()
+        self._stopped = self._loop.create_future()
+        async with websockets.serve(self._handler, self.host, self.port) as self._server:
+            self.port = self._server.sockets[0].getsockname()[1]
+            self._started.set()
+            if self.heartbeat:
+                heartbeats = asyncio.create_task(self._send_heartbeats())
+            await self._stopped
+            if self.heartbeat:
+                heartbeats.cancel()
+
+    async def _send_heartbeats(self):
+        """
+        Send "notify" heartbeats to connections that are not stalled (with heartbeats off)
+        """
+        while True:
+            await asyncio.sleep(self.heartbeat)
+            message = json.dumps({"notify": [{"heartbeat": str(int(time.time() * 1000))}]})
+            for connection in list(self._connections):
+                if connection["heartbeats"]:
+                    try:
+                        await connection["websocket"].send(message)
+                    except websockets.exceptions.ConnectionClosed:
+                        pass
+
+    @staticmethod
+    def _response(request: dict, code: int = 0, msg: str = "ok") -> str:
+        return json.dumps({"response": [{"service": request.get("service"), "command": request.get("command"),
+                                         "requestid": str(request.get("requestid")), "SchwabClientCorrelId": "local",
+                                         "timestamp": int(time.time() * 1000), "content": {"code": code, "msg": msg}}]})
+
+    async def _handler(self, websocket):
+        """
+        Handle one client connection
+        :param websocket: connection
+        :type websocket: websockets.ServerConnection
+        """
+        subscriptions = {}
+        entry = {"websocket": websocket, "subscriptions": subscriptions, "data": True, "heartbeats": True}
+        self._connections.append(entry)
+        self._logger.debug(f"Connection opened ({len(self._connections)} open).")
+        try:
+            async for message in websocket:
+                message = json.loads(message)
+                for request in message.get("requests", [message]):
+                    self.received.append(request)
+                    command = request.get("command")
+                    params = request.get("parameters", {}) or {}
+                    keys = [k for k in params.get("keys", "").split(",") if k]
+                    fields = set(f for f in params.get("fields", "").split(",") if f)
+                    service = subscriptions.setdefault(request.get("service"), {})
+                    if command == "SUBS":
+                        service.clear()
+                    if command in ("ADD", "SUBS"):
+                        service.update((key, fields) for key in keys)
+                    elif command == "UNSUBS":
+                        for key in keys:
+                            service.pop(key, None)
+                    elif command == "VIEW":
+                        for key in service:
+                            service[key] = fields
+                    await websocket.send(self._response(request))
+                    if command == "LOGOUT":
+                        await websocket.close()
+                        return
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            if entry in self._connections:
+                self._connections.remove(entry)
+
+    async def _publish(self, service: str, content: list, timestamp: int) -> int:
+        sent = 0
+        for connection in list(self._connections):
+            if not connection["data"]:
+                continue  # stalled
+            websocket = connection["websocket"]
+            subscribed = connection["subscriptions"].get(service, {})
+            entries = [{f: v for f, v in entry.items() if not f.isdigit() or f == "0" or f in subscribed[entry.get("key")]}
+                       for entry in content if entry.get("key") in subscribed]
+            if entries:
+                try:
+                    await websocket.send(json.dumps({"data": [{"service": service, "timestamp": timestamp, "command": "SUBS", "content": entries}]}))
+                    sent += 1
+                except websockets.exceptions.ConnectionClosed:
+                    pass
+        return sent
+
+    def publish(self, service: str, content: list | dict, timestamp: int = None) -> int:
+        """
+        Send data to every connection subscribed to the keys (only subscribed keys and fields are sent)
+        :param service: service name (e.g. "LEVELONE_EQUITIES")
+        :type service: str
+        :param content: content entries, each with a "key" and numbered fields
+        :type content: list | dict
+        :param timestamp: timestamp in ms (default: now)
+        :type timestamp: int | None
+        :return: number of connections the data was sent to
+        :rtype: int
+        """
+        if isinstance(content, dict):
+            content = [content]
+        if timestamp is None:
+            timestamp = int(time.time() * 1000)
+        return asyncio.run_coroutine_threadsafe(self._publish(service, content, timestamp), self._loop).result()
+
+    def drop(self, index: int = None) -> int:
+        """
+        Drop connections without a close handshake (like a lost network connection), clients get ConnectionClosedError
+        :param index: index of the connection to drop in connect order (None = all)
+        :type index: int | None
+        :return: number of connections dropped
+        :rtype: int
+        """
+        def _drop():
+            entries = self._select(index)
+            for connection in entries:
+                connection["websocket"].transport.abort()
+            return len(entries)
+        return self._call(_drop)
+
+    def _select(self, index: int = None) -> list:
+        """
+        Get connections by index in connect order
+        :param index: index of the connection (None = all)
+        :type index: int | None
+        :return: list of connections
+        :rtype: list
+        """
+        return list(self._connections) if index is None else list(self._connections)[index:index + 1]
+
+    def stall(self, index: int = None, heartbeats: bool = True) -> int:
+        """
+        Stop sending data to connections while keeping them open (like a stalled server), undo with resume(...)
+        :param index: index of the connection to stall in connect order (None = all)
+        :type index: int | None
+        :param heartbeats: whether heartbeats are still sent to the stalled connections
+        :type heartbeats: bool
+        :return: number of connections stalled
+        :rtype: int
+        """
+        def _stall():
+            entries = self._select(index)
+            for connection in entries:
+                connection["data"] = False
+                connection["heartbeats"] = heartbeats
+            return len(entries)
+        return self._call(_stall)
+
+    def resume(self, index: int = None) -> int:
+        """
+        Resume sending data and heartbeats to stalled connections
+        :param index: index of the connection to resume in connect order (None = all)
+        :type index: int | None
+        :return: number of connections resumed
+        :rtype: int
+        """
+        def _resume():
+            entries = self._select(index)
+            for connection in entries:
+                connection["data"] = connection["heartbeats"] = True
+            return len(entries)
+        return self._call(_resume)
+
+    def _call(self, func):
+        """
+        Run a function on the server loop and return its result
+        :param func: function to run
+        :type func: function
+        :return: result of the function
+        :rtype: any
+        """
+        async def _run():
+            return func()
+        return asyncio.run_coroutine_threadsafe(_run(), self._loop).result()
+
+    def wait_for_connections(self, count: int, timeout: float = 5.0) -> bool:
+        """
+        Wait until (at least) a number of connections are open
+        :param count: number of connections
+        :type count: int
+        :param timeout: maximum time to wait for
+        :type timeout: float
+        :return: whether the connections are open
+        :rtype: bool
+        """
+        end = time.monotonic() + timeout
+        while time.monotonic() < end:
+            if len(self._connections) >= count:
+                return True
+            time.sleep(0.01)
+        return False
+
+    def stop(self):
+        """
+        Stop the server
+        """
+        if self._thread is not None:
+            self._loop.call_soon_threadsafe(lambda: self._stopped.done() or self._stopped.set_result(None))
+            self._thread.join(5)
+            self._thread = None
+            self._connections.clear()
@@ -0,0 +1,25 @@
+"""
+Stand-ins used by the tests
+"""
+
+import types
+
+
+class StubClient:
+    """Client stand-in, only what the stream uses without a connection"""
+
+    def __init__(self, url: str = "ws://127.0.0.1:0"):
+        self.url = url
+        self.tokens = types.SimpleNamespace(access_token="token")
+
+    def preferences(self):
+        client = self
+
+        class Response:
+            ok = True
+
+            def json(self):
+                return {"streamerInfo": [{"streamerSocketUrl": client.url, "schwabClientCustomerId": "customer",
+                                          "schwabClientCorrelId": "correl", "schwabClientChannel": "channel",
+                                          "schwabClientFunctionId": "function"}]}
+        return Response()
@@ -0,0 +1,53 @@
+import json
+import unittest
+from schwabdev.bars import BarAggregator
+
+T = 1731596400  # a multiple of 60 seconds
+
+
+def trade(key, price, total_volume, seconds):
+    return json.dumps({"data": [{"service": "LEVELONE_EQUITIES", "timestamp": 1, "command": "SUBS",
+                                 "content": [{"key": key, "3": price, "8": total_volume, "35": int(seconds * 1000)}]}]})
+
+
+class TestBarAggregator(unittest.TestCase):
+
+    def setUp(self):
+        self.bars = []
+        self.aggregator = BarAggregator(("5s", "1m", "300v", "3t"), on_bar=self.bars.append, clock=False)
+
+    def tearDown(self):
+        self.aggregator.stop()
+
+    def test_time_bar_boundaries(self):
+        for price, volume, seconds in ((10.0, 1000, T + 1), (10.5, 1100, T + 2), (9.5, 1150, T + 4.999), (10.2, 1250, T + 5)):
+            self.aggregator(trade("AMD", price, volume, seconds))
+        five = [bar for bar in self.bars if bar["timeframe"] == "5s"]
+        self.assertEqual(len(five), 1)  # closed by the first trade at the boundary
+        self.assertEqual({k: five[0][k] for k in ("start", "end", "open", "high", "low", "close", "volume", "ticks")},
+                         {"start": T, "end": T + 5, "open": 10.0, "high": 10.5, "low": 9.5, "close": 9.5, "volume": 150.0, "ticks": 3})
+        self.assertEqual(self.aggregator.current("AMD", "5s")["open"], 10.2)
+        self.assertEqual(self.aggregator.current("AMD", "1m")["ticks"], 4)
+        self.assertEqual(self.aggregator.close(T + 10), 1)  # only the 5s bar has ended
+        self.assertEqual(self.aggregator.close(T + 60), 1)
+        self.assertEqual(len(self.aggregator.bars("AMD", "1m")), 1)
+
+    def test_volume_and_tick_bars(self):
+        for i, volume in enumerate((1000, 1200, 1350, 1400)):  # the first trade has no volume
+            self.aggregator(trade("AMD", 10.0 + i, volume, T + i))
+        volume_bars = [bar for bar in self.bars if bar["timeframe"] == "300v"]
+        tick_bars = [bar for bar in self.bars if bar["timeframe"] == "3t"]
+        self.assertEqual([(bar["volume"], bar["ticks"]) for bar in volume_bars], [(350.0, 3)])
+        self.assertEqual([(bar["open"], bar["close"]) for bar in tick_bars], [(10.0, 12.0)])
+
+    def test_history_ring(self):
+        aggregator = BarAggregator(("1t",), history=3, clock=False)
+        for i in range(5):
+            aggregator.tick("AMD", float(i), 1, T + i)
+        self.assertEqual(list(aggregator.bars("AMD", "1t")[:, 0]), [2.0, 3.0, 4.0])  # oldest first
+        self.assertEqual(len(aggregator.bars("INTC", "1t")), 0)
+        aggregator.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import json
+import unittest
+import requests
+from schwabdev.batching import QuoteBatcher
+
+
+class StubClient:
+    """Client stand-in, quotes calls are recorded and answered for the known symbols"""
+
+    def __init__(self, known=("AAPL", "AMD", "$SPX")):
+        self.known = known
+        self.calls = []
+
+    def quotes(self, symbols, fields=None):
+        self.calls.append((symbols, fields))
+        body = {symbol.upper(): {"symbol": symbol.upper()} for symbol in symbols if symbol.upper() in self.known}
+        missing = [symbol for symbol in symbols if symbol.upper() not in self.known]
+        if missing:
+            body["errors"] = {"invalidSymbols": missing}
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps(body).encode("utf-8")
+        return response
+
+
+class TestQuoteBatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.client = StubClient()
+        self.batcher = QuoteBatcher(self.client, window=0.05)
+
+    def tearDown(self):
+        self.batcher.stop()
+
+    def test_calls_in_a_window_share_one_quotes_call(self):
+        futures = [self.batcher.submit(symbol) for symbol in ("AAPL", "AMD", "AAPL", "MISSING")]
+        responses = [future.result(5) for future in futures]
+        self.assertEqual(len(self.client.calls), 1)
+        self.assertEqual(sorted(self.client.calls[0][0]), ["AAPL", "AMD", "MISSING"])  # repeated symbols are requested once
+        self.assertEqual(responses[1].json(), {"AMD": {"symbol": "AMD"}})
+        self.assertIs(responses[0], responses[2])
+        self.assertEqual((responses[3].status_code, responses[3].json()), (404, {"errors": {"invalidSymbols": ["MISSING"]}}))
+
+    def test_symbols_match_case_insensitively(self):
+        response = self.batcher.quote("aapl", timeout=5)
+        self.assertEqual((response.status_code, response.json()), (200, {"AAPL": {"symbol": "AAPL"}}))
+        self.assertEqual(self.batcher.quote("$spx", timeout=5).status_code, 200)
+
+    def test_calls_are_grouped_by_fields(self):
+        futures = [self.batcher.submit("AAPL", "quote"), self.batcher.submit("AMD", "fundamental")]
+        for future in futures:
+            future.result(5)
+        self.assertEqual(sorted(fields for symbols, fields in self.client.calls), ["fundamental", "quote"])
+
+    def test_full_batch_is_sent_at_once(self):
+        self.batcher.window = 60
+        self.batcher.max_symbols = 2
+        futures = [self.batcher.submit("AAPL"), self.batcher.submit("AMD")]
+        self.assertEqual([future.result(5).status_code for future in futures], [200, 200])
+
+
+if __name__ == "__main__":
+    unittest.main()
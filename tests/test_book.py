@@ -0,0 +1,47 @@
+import json
+import unittest
+from schwabdev.book import BookEngine
+
+
+def book(key, time, bids, asks, service="NASDAQ_BOOK"):
+    levels = lambda side: [{"0": price, "1": size, "2": count} for price, size, count in side]
+    return json.dumps({"data": [{"service": service, "timestamp": time, "command": "SUBS",
+                                 "content": [{"key": key, "1": time, "2": levels(bids), "3": levels(asks)}]}]})
+
+
+class TestBookEngine(unittest.TestCase):
+
+    def test_snapshot_values(self):
+        engine = BookEngine(depth=2)
+        engine(book("AMD", 1, [(10.0, 100, 1), (9.9, 300, 2), (9.8, 50, 1)], [(10.1, 200, 1)]))
+        amd = engine.book("AMD")
+        self.assertEqual((amd.best_bid, amd.best_bid_size, amd.best_ask, amd.best_ask_size), (10.0, 100.0, 10.1, 200.0))
+        self.assertAlmostEqual(amd.mid, 10.05)
+        self.assertAlmostEqual(amd.spread, 0.1)
+        self.assertEqual(list(amd.bids()[0]), [10.0, 9.9])  # only depth levels are kept
+        self.assertAlmostEqual(amd.imbalance, (400 - 200) / 600)
+        self.assertEqual((amd.time, amd.updates), (1, 1))
+
+    def test_snapshot_diffs(self):
+        changes = []
+        engine = BookEngine(on_change=lambda b, c: changes.append((b.key, sorted(c))))
+        engine(book("AMD", 1, [(10.0, 100, 1), (9.9, 300, 2)], [(10.1, 200, 1)]))
+        changes.clear()
+        engine(book("AMD", 2, [(10.0, 150, 2), (9.8, 50, 1)], [(10.1, 200, 1)]))
+        engine(book("AMD", 3, [(10.0, 150, 2), (9.8, 50, 1)], [(10.1, 200, 1)]))  # unchanged, no callback
+        self.assertEqual(changes, [("AMD", [("bid", "add", 9.8, 50.0, 1), ("bid", "remove", 9.9, 0.0, 0),
+                                            ("bid", "update", 10.0, 150.0, 2)])])
+
+    def test_other_messages_are_forwarded(self):
+        others = []
+        engine = BookEngine(other_receiver=others.append)
+        engine('{"notify": [{"heartbeat": "1"}]}')
+        engine(book("AMD", 1, [], [], service="LEVELONE_EQUITIES"))
+        engine(book("AMD", 1, [(10.0, 1, 1)], [], service="NYSE_BOOK"))
+        self.assertEqual(len(others), 2)
+        self.assertIsNone(engine.book("AMD", "NASDAQ_BOOK"))
+        self.assertIsNone(engine.book("AMD").mid)
+
+
+if __name__ == "__main__":
+    unittest.main()
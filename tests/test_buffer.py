@@ -0,0 +1,100 @@
+import json
+import queue
+import asyncio
+import unittest
+import threading
+from schwabdev.buffer import StreamBuffer
+
+
+def level_one(key, **fields):
+    return json.dumps({"data": [{"service": "LEVELONE_EQUITIES", "timestamp": 1, "command": "SUBS",
+                                 "content": [{"key": key, **fields}]}]})
+
+
+class TestStreamBuffer(unittest.TestCase):
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(Exception):
+            StreamBuffer(maxsize=0)
+        with self.assertRaises(Exception):
+            StreamBuffer(policy="newest")
+
+    def test_fifo_order(self):
+        buffer = StreamBuffer(maxsize=10)
+        for i in range(5):
+            buffer.put(i)
+        self.assertEqual([buffer.get() for _ in range(5)], [0, 1, 2, 3, 4])
+        self.assertRaises(queue.Empty, buffer.get, block=False)
+
+    def test_block_policy_waits_for_room(self):
+        buffer = StreamBuffer(maxsize=1, policy="block")
+        self.assertTrue(buffer.put("a"))
+        self.assertFalse(buffer.put("b", timeout=0.01))  # full, times out
+        self.assertEqual(buffer.dropped, 1)
+        threading.Timer(0.05, buffer.get).start()
+        self.assertTrue(buffer.put("c", timeout=5))  # room is made by the consumer
+        self.assertEqual(buffer.get(), "c")
+
+    def test_drop_oldest_policy(self):
+        buffer = StreamBuffer(maxsize=3, policy="drop_oldest")
+        for i in range(5):
+            self.assertTrue(buffer.put(i))
+        self.assertEqual(buffer.drain(), [2, 3, 4])
+        self.assertEqual(buffer.dropped, 2)
+
+    def test_conflate_policy_keeps_position(self):
+        buffer = StreamBuffer(maxsize=10, policy="conflate")
+        buffer.put(level_one("AMD", **{"1": 1.0}))
+        buffer.put(level_one("INTC", **{"1": 2.0}))
+        buffer.put('{"notify": [{"heartbeat": "1"}]}')
+        buffer.put(level_one("AMD", **{"1": 3.0}))
+        messages = buffer.drain()
+        self.assertEqual(len(messages), 3)
+        self.assertEqual(json.loads(messages[0])["data"][0]["content"][0], {"key": "AMD", "1": 3.0})
+        self.assertEqual(buffer.conflated, 1)
+
+    def test_conflate_policy_merges_changed_fields(self):
+        buffer = StreamBuffer(maxsize=10, policy="conflate")
+        buffer.put(level_one("AMD", **{"1": 1.0}))
+        buffer.put(level_one("AMD", **{"3": 5.0}))
+        buffer.put(level_one("AMD", **{"1": 1.5}))
+        messages = buffer.drain()
+        self.assertEqual(len(messages), 1)
+        self.assertEqual(json.loads(messages[0])["data"][0]["content"][0], {"key": "AMD", "1": 1.5, "3": 5.0})
+        self.assertEqual(buffer.conflated, 2)
+        buffer.put({"data": [{"service": "NYSE_BOOK", "content": [{"key": "AMD", "2": [1]}]}]})
+        buffer.put({"data": [{"service": "NYSE_BOOK", "content": [{"key": "AMD", "3": [2]}]}]})
+        self.assertEqual(buffer.get()["data"][0]["content"], [{"key": "AMD", "3": [2]}])  # whole data is replaced
+
+    def test_drain_max_items_and_stats(self):
+        buffer = StreamBuffer(maxsize=10)
+        for i in range(6):
+            buffer.put(i)
+        self.assertEqual(buffer.drain(max_items=4), [0, 1, 2, 3])
+        stats = buffer.stats()
+        self.assertEqual((stats["size"], stats["put"], stats["get"], stats["high_water"]), (2, 6, 4, 6))
+
+    def test_close_wakes_consumers(self):
+        buffer = StreamBuffer()
+        results = []
+        consumer = threading.Thread(target=lambda: results.extend(buffer))
+        consumer.start()
+        buffer.put("a")
+        buffer.close()
+        consumer.join(5)
+        self.assertFalse(consumer.is_alive())
+        self.assertEqual(results, ["a"])
+        self.assertFalse(buffer.put("b"))
+
+    def test_async_iteration(self):
+        buffer = StreamBuffer()
+
+        async def consume():
+            return [message async for message in buffer]
+
+        threading.Timer(0.02, lambda: (buffer.put("a"), buffer.put("b"), buffer.close())).start()
+        self.assertEqual(asyncio.run(consume()), ["a", "b"])
+
+
+if __name__ == "__main__":
+    unittest.main()
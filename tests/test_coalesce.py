@@ -0,0 +1,96 @@
+import types
+import threading
+import unittest
+from schwabdev.client import Client
+from schwabdev.coalesce import RequestCoalescer
+
+
+class SlowSession:
+    """Session stand-in, every GET waits until released"""
+
+    def __init__(self, callers: int):
+        self.calls = []
+        self.entered = threading.Barrier(callers + 1)  # the callers that reach the session and the test
+        self.release = threading.Event()
+
+    def get(self, url, headers=None, params=None, timeout=None):
+        self.calls.append(url)
+        self.entered.wait(5)
+        self.release.wait(5)
+        return url
+
+
+class TestRequestCoalescer(unittest.TestCase):
+
+    def test_key_ignores_param_order_and_types(self):
+        self.assertEqual(RequestCoalescer.key("url", {"a": 1, "b": "x"}), RequestCoalescer.key("url", {"b": "x", "a": "1"}))
+        self.assertNotEqual(RequestCoalescer.key("url", {"a": 1}), RequestCoalescer.key("url", {"a": 2}))
+
+    def test_concurrent_calls_share_one_request(self):
+        coalescer = RequestCoalescer()
+        session = SlowSession(1)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(coalescer.call("key", session.get, "url"))) for _ in range(4)]
+        threads[0].start()
+        session.entered.wait(5)  # the leader is in flight
+        for thread in threads[1:]:
+            thread.start()
+        while coalescer.stats()["coalesced"] < 3:
+            threading.Event().wait(0.001)
+        session.release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual((results, session.calls), (["url"] * 4, ["url"]))
+        self.assertEqual(coalescer.stats(), {"requests": 1, "coalesced": 3, "in_flight": 0})
+        self.assertEqual(coalescer.call("key", lambda: "new"), "new")  # nothing is cached once finished
+
+    def test_exception_reaches_every_caller(self):
+        coalescer = RequestCoalescer()
+
+        def fail():
+            raise ValueError("failed")
+        self.assertRaises(ValueError, coalescer.call, "key", fail)
+        self.assertEqual(coalescer.stats()["in_flight"], 0)
+
+
+class TestClientCoalescing(unittest.TestCase):
+
+    def client(self, session):
+        client = Client.__new__(Client)  # no tokens or network, only what the requests use
+        client.tokens = types.SimpleNamespace(access_token="token")
+        client.timeout = 5
+        client.coalescer = RequestCoalescer()
+        client.quote_batcher = None
+        client._session = session
+        return client
+
+    def test_order_reads_are_never_shared(self):
+        session = SlowSession(2)
+        client = self.client(session)
+        threads = [threading.Thread(target=client.order_details, args=("hash", 1)) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        session.entered.wait(5)  # both reached the session
+        session.release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(len(session.calls), 2)
+        self.assertEqual(client.coalescer.stats()["requests"], 0)
+
+    def test_market_data_is_shared(self):
+        session = SlowSession(1)
+        client = self.client(session)
+        threads = [threading.Thread(target=client.quote, args=("AMD",)) for _ in range(2)]
+        threads[0].start()
+        session.entered.wait(5)
+        threads[1].start()
+        while client.coalescer.stats()["coalesced"] < 1:
+            threading.Event().wait(0.001)
+        session.release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(len(session.calls), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
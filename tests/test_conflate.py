@@ -0,0 +1,69 @@
+import json
+import threading
+import unittest
+from schwabdev.conflate import StreamConflator
+
+
+def data(service, *contents, timestamp=1):
+    return json.dumps({"data": [{"service": service, "timestamp": timestamp, "command": "SUBS", "content": list(contents)}]})
+
+
+class TestStreamConflator(unittest.TestCase):
+
+    def setUp(self):
+        self.received = []
+        self.busy = threading.Event()
+        self.release = threading.Event()
+
+        def handler(message):  # the first message holds the consumer until released
+            self.received.append(json.loads(message))
+            if len(self.received) == 1:
+                self.busy.set()
+                self.release.wait(5)
+        self.handler = handler
+
+    def hold(self, conflator):
+        conflator.put('{"notify": [{"heartbeat": "1"}]}')
+        self.assertTrue(self.busy.wait(5))
+
+    def test_changes_merge_per_key_in_order(self):
+        conflator = StreamConflator(self.handler)
+        self.hold(conflator)
+        conflator.put(data("LEVELONE_EQUITIES", {"key": "AMD", "1": 1.0}))
+        conflator.put(data("LEVELONE_EQUITIES", {"key": "INTC", "1": 2.0}))
+        conflator.put(data("LEVELONE_EQUITIES", {"key": "AMD", "3": 5.0}, timestamp=2))
+        conflator.put(data("NYSE_BOOK", {"key": "AMD", "2": [1]}))
+        conflator.put(data("NYSE_BOOK", {"key": "AMD", "3": [2]}))
+        self.release.set()
+        conflator.stop(5)
+        entries = {entry["service"]: entry for entry in self.received[1]["data"]}
+        self.assertEqual(entries["LEVELONE_EQUITIES"]["content"], [{"key": "AMD", "1": 1.0, "3": 5.0}, {"key": "INTC", "1": 2.0}])
+        self.assertEqual(entries["NYSE_BOOK"]["content"], [{"key": "AMD", "3": [2]}])  # whole data is replaced
+        stats = conflator.stats()
+        self.assertEqual((stats["received"], stats["delivered"], stats["conflated"], stats["pending"]), (6, 4, 2, 0))
+        self.assertEqual(stats["by_service"], {"LEVELONE_EQUITIES": 1, "NYSE_BOOK": 1})
+
+    def test_sequenced_services_keep_their_order(self):
+        conflator = StreamConflator(self.handler, batch=False)
+        self.hold(conflator)
+        conflator.put(data("LEVELONE_EQUITIES", {"key": "AMD", "1": 1.0}))
+        conflator.put(data("CHART_EQUITY", {"key": "AMD", "1": 1}))
+        conflator.put(data("CHART_EQUITY", {"key": "AMD", "1": 2}))
+        conflator.put(data("LEVELONE_EQUITIES", {"key": "AMD", "1": 1.5}))
+        self.release.set()
+        conflator.stop(5)
+        self.assertEqual([(message["data"][0]["service"], message["data"][0]["content"][0]["1"]) for message in self.received[1:]],
+                         [("LEVELONE_EQUITIES", 1.5), ("CHART_EQUITY", 1), ("CHART_EQUITY", 2)])
+
+    def test_stop_delivers_pending_updates(self):
+        conflator = StreamConflator(self.handler)
+        self.hold(conflator)
+        conflator.put(data("LEVELONE_EQUITIES", {"key": "AMD", "1": 1.0}))
+        threading.Timer(0.05, self.release.set).start()
+        conflator.stop(5)
+        self.assertEqual(len(self.received), 2)
+        self.assertFalse(conflator._thread.is_alive())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import json
+import time
+import threading
+import unittest
+from schwabdev.dispatch import StreamDispatcher
+
+
+def level_one(*contents):
+    return json.dumps({"data": [{"service": "LEVELONE_EQUITIES", "timestamp": 1, "command": "SUBS", "content": list(contents)}]})
+
+
+class TestStreamDispatcher(unittest.TestCase):
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(Exception):
+            StreamDispatcher(print, workers=0)
+        with self.assertRaises(Exception):
+            StreamDispatcher(print, mode="fiber")
+
+    def test_updates_of_a_key_stay_in_order_on_one_worker(self):
+        handled = []  # (key, value, worker thread)
+        lock = threading.Lock()
+
+        def handler(service, content, timestamp):
+            with lock:
+                handled.append((content["key"], content["1"], threading.current_thread()))
+
+        dispatcher = StreamDispatcher(handler, workers=3)
+        keys = ["AMD", "INTC", "MU", "NVDA", "SPY"]
+        for i in range(50):
+            dispatcher.dispatch(level_one(*({"key": key, "1": i} for key in keys)))
+        dispatcher.stop(5)
+        self.assertEqual(len(handled), 250)
+        for key in keys:
+            updates = [(value, thread) for handled_key, value, thread in handled if handled_key == key]
+            self.assertEqual([value for value, _ in updates], list(range(50)))
+            self.assertEqual(len({thread for _, thread in updates}), 1)
+        self.assertEqual(dispatcher.worker_for("AMD"), StreamDispatcher(print, workers=3).worker_for("AMD"))  # stable
+
+    def test_other_messages_and_stats(self):
+        others = []
+        dispatcher = StreamDispatcher(lambda service, content, timestamp: None, workers=2, other_handler=others.append)
+        dispatcher.dispatch('{"notify": [{"heartbeat": "1"}]}')
+        dispatcher.dispatch(level_one({"key": "AMD"}, {"key": "INTC"}))
+        self.assertEqual(others, [{"notify": [{"heartbeat": "1"}]}])
+        deadline = time.monotonic() + 5
+        while sum(s["processed"] for s in dispatcher.stats()) < 2 and time.monotonic() < deadline:
+            time.sleep(0.001)
+        stats = dispatcher.stats()
+        dispatcher.stop(5)
+        self.assertEqual([s["worker"] for s in stats], [0, 1])
+        self.assertEqual(sum(s["processed"] for s in stats), 2)
+        self.assertEqual(sum(s["queued"] for s in stats), 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import stat
+import socket
+import tempfile
+import unittest
+from schwabdev.stream import Stream
+from schwabdev.fanout import StreamPublisher, RemoteStream, default_address, default_authkey_path
+from stubs import StubClient
+
+
+@unittest.skipIf(os.name == "nt", "Unix sockets")
+class TestStreamPublisher(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.tempdir, tempfile.tempdir = tempfile.tempdir, self.directory.name  # keep the per user directory inside the test
+        self.stream = Stream(StubClient())
+
+    def tearDown(self):
+        tempfile.tempdir = self.tempdir
+        self.directory.cleanup()
+
+    def test_random_key_in_private_directory(self):
+        publisher = StreamPublisher(self.stream).start()
+        try:
+            self.assertEqual(stat.S_IMODE(os.stat(os.path.dirname(default_address())).st_mode), 0o700)
+            self.assertEqual(stat.S_IMODE(os.stat(default_authkey_path()).st_mode), 0o600)
+            remote = RemoteStream()  # reads the key of this user's publisher
+            remote.start(lambda message: None)
+            remote.stop()
+        finally:
+            publisher.stop()
+
+    def test_authkey_required_for_other_addresses(self):
+        with self.assertRaises(Exception):
+            StreamPublisher(self.stream, address=os.path.join(self.directory.name, "other.sock"))
+
+    def test_foreign_files_are_not_removed(self):
+        address = os.path.join(self.directory.name, "other.sock")
+        with open(address, "w") as f:
+            f.write("not a socket")
+        with self.assertRaises(Exception):
+            StreamPublisher(self.stream, address=address, authkey=b"key").start()
+        self.assertTrue(os.path.isfile(address))
+
+    def test_stale_socket_is_replaced(self):
+        address = os.path.join(self.directory.name, "stale.sock")
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(address)
+        stale.close()  # the socket file stays but nothing listens on it
+        publisher = StreamPublisher(self.stream, address=address, authkey=b"key").start()
+        try:
+            with self.assertRaises(Exception):
+                StreamPublisher(self.stream, address=address, authkey=b"key").start()  # in use, not removed
+        finally:
+            publisher.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+from unittest import mock
+from schwabdev.gaps import ChartGapFiller
+
+MINUTE = ChartGapFiller.minute
+
+
+def futures(key, time, seq):
+    return {"data": [{"service": "CHART_FUTURES", "timestamp": time, "command": "SUBS",
+                      "content": [{"key": key, "seq": seq, "1": time, "2": 1.0, "3": 1.0, "4": 1.0, "5": 1.0, "6": 1}]}]}
+
+
+def equity(key, time, seq):
+    return {"data": [{"service": "CHART_EQUITY", "timestamp": 1, "command": "SUBS",
+                      "content": [{"key": key, "seq": 1, "1": 1.0, "2": 1.0, "3": 1.0, "4": 1.0, "5": 1, "6": seq, "7": time}]}]}
+
+
+class TestChartGapFiller(unittest.TestCase):
+
+    def setUp(self):
+        self.client = mock.Mock()
+        self.bars = []
+        self.filler = ChartGapFiller(self.client, self.bars.append)
+
+    def tearDown(self):
+        self.filler.stop()
+
+    def test_quiet_futures_minutes_are_not_backfilled(self):
+        self.filler.process(futures("/ES", 0, 1))
+        self.filler.process(futures("/ES", 3 * MINUTE, 2))  # no trades for two minutes, the sequence continues
+        self.assertEqual(self.filler.stats()["gaps"], 0)
+        self.client.price_history.assert_not_called()
+        self.assertEqual(len(self.bars), 2)
+
+    def test_equity_bar_without_time(self):
+        self.filler.process(equity("AMD", None, 1))
+        self.filler.process(equity("AMD", 2 * MINUTE, 3))  # missing by sequence, but the last bar has no time
+        self.assertEqual(self.filler.stats()["gaps"], 0)
+        self.client.price_history.assert_not_called()
+        self.assertEqual(len(self.bars), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+import types
+import datetime
+import threading
+import unittest
+import zoneinfo
+from schwabdev.scheduler import Scheduler
+from schwabdev.market_calendar import MarketCalendar, StreamScheduler
+
+NEW_YORK = zoneinfo.ZoneInfo("America/New_York")
+
+
+class HoursClient:
+    """Client stand-in, market_hours answers from a date -> {market: (pre start, open, close)} table (other days are closed)"""
+
+    def __init__(self, days: dict):
+        self.days = days
+        self.calls = []
+        self.scheduler = None
+
+    def market_hours(self, markets, date):
+        self.calls.append(date)
+        body = {}
+        for market, (pre, start, end) in self.days.get(date, {}).items():
+            body[market] = {"EQ": {"isOpen": True, "sessionHours": {
+                "preMarket": [{"start": pre.isoformat(), "end": start.isoformat()}],
+                "regularMarket": [{"start": start.isoformat(), "end": end.isoformat()}]}}}
+        for market in markets.split(","):
+            body.setdefault(market, {"eq": {"isOpen": False}})
+        return types.SimpleNamespace(ok=True, json=lambda: body)
+
+
+def at(day, hour, minute=0):
+    return datetime.datetime(2024, 11, day, hour, minute, tzinfo=NEW_YORK)
+
+
+class TestMarketCalendar(unittest.TestCase):
+
+    def setUp(self):
+        self.client = HoursClient({"2024-11-27": {"equity": (at(27, 7), at(27, 9, 30), at(27, 16))},
+                                   "2024-11-29": {"equity": (at(29, 7), at(29, 9, 30), at(29, 13))}})  # 28th: holiday, 29th: early close
+        self.calendar = MarketCalendar(self.client, ("equity", "option"))
+
+    def test_sessions_and_holidays(self):
+        self.assertEqual(self.calendar.session("equity", datetime.date(2024, 11, 29)), (at(29, 9, 30), at(29, 13)))
+        self.assertEqual(self.calendar.session("equity", datetime.date(2024, 11, 29), extended=True), (at(29, 7), at(29, 13)))
+        self.assertIsNone(self.calendar.session("equity", datetime.date(2024, 11, 28)))
+        self.assertIsNone(self.calendar.session("option", datetime.date(2024, 11, 29)))
+        self.calendar.session("equity", datetime.date(2024, 11, 29))
+        self.assertEqual(self.client.calls.count("2024-11-29"), 1)  # cached
+
+    def test_open_and_next_session(self):
+        self.assertTrue(self.calendar.is_open("equity", at(27, 15, 59)))
+        self.assertFalse(self.calendar.is_open("equity", at(27, 16)))
+        self.assertFalse(self.calendar.is_open("equity", at(27, 8)))
+        self.assertTrue(self.calendar.is_open("equity", at(27, 8), extended=True))
+        self.assertEqual(self.calendar.next_session("equity", at(27, 17)), (at(29, 9, 30), at(29, 13)))  # skips the holiday
+        self.assertEqual(self.calendar.next_session("equity", at(27, 12)), (at(27, 9, 30), at(27, 16)))  # current session
+        self.assertIsNone(self.calendar.next_session("equity", at(29, 14), days=2))
+
+
+class StubStream:
+    """Stream stand-in, records the scheduler's calls"""
+
+    def __init__(self, client):
+        self._client = client
+        self.active = False
+        self.calls = []
+        self.changed = threading.Event()
+        self.manager = types.SimpleNamespace(subscribe=lambda owner, service, keys, fields: self.calls.append(("subscribe", owner, keys)),
+                                             release=lambda owner: self.calls.append(("release", owner)))
+
+    def start(self, receiver, daemon=True, **kwargs):
+        self.active = True
+        self.calls.append(("start",))
+        self.changed.set()
+
+    def stop(self, clear_subscriptions=True):
+        self.active = False
+        self.calls.append(("stop", clear_subscriptions))
+        self.changed.set()
+
+
+class TestStreamScheduler(unittest.TestCase):
+
+    def test_session_open_and_close(self):
+        now = datetime.datetime.now(NEW_YORK)
+        start, end = now - datetime.timedelta(seconds=1), now + datetime.timedelta(seconds=0.3)
+        client = HoursClient({now.strftime("%Y-%m-%d"): {"equity": (start, start, end)}})
+        client.scheduler = Scheduler()
+        stream = StubStream(client)
+        warmups = []
+        scheduler = StreamScheduler(stream, MarketCalendar(client, ("equity",)), on_warmup=lambda market, session: warmups.append(market))
+        scheduler.add_market("equity", [{"service": "LEVELONE_EQUITIES", "command": "ADD", "parameters": {"keys": "AMD", "fields": "0,1"}}])
+        with self.assertRaises(Exception):
+            scheduler.add_market("future")
+        try:
+            scheduler.start()
+            self.assertTrue(stream.changed.wait(5))  # in session, connected immediately
+            stream.changed.clear()
+            self.assertEqual(stream.calls, [("subscribe", "schedule-equity", "AMD"), ("start",)])
+            self.assertTrue(stream.changed.wait(5))  # the session ends
+            self.assertEqual(stream.calls[2:], [("release", "schedule-equity"), ("stop", False)])
+            self.assertEqual(warmups, [])  # the session had already started
+        finally:
+            scheduler.stop()
+            client.scheduler.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import json
+import time
+import asyncio
+import unittest
+from schwabdev.metrics import Histogram, StreamMetrics
+from schwabdev.stream import Stream
+from stubs import StubClient
+
+
+class MessageWebsocket:
+
+    def __init__(self, message):
+        self.message = message
+
+    async def recv(self):
+        return self.message
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_negative_values_are_clamped(self):
+        histogram = Histogram()
+        histogram.add(-250.0)
+        histogram.add(100.0)
+        self.assertEqual((histogram.count, histogram.total, histogram.max), (2, 100.0, 100.0))
+
+    def test_timestamps_in_any_key_order(self):
+        metrics = StreamMetrics()
+        received = 1731596400100 * 1000000
+        metrics.observe(json.dumps({"data": [{"service": "LEVELONE_EQUITIES", "timestamp": 1731596400050, "content": []}]}), received)
+        metrics.observe(json.dumps({"data": [{"timestamp": 1731596400080, "service": "LEVELONE_EQUITIES", "content": []}]}), received)
+        metrics.observe(json.dumps({"data": [{"service": "LEVELONE_EQUITIES", "content": []}]}), received)
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["services"]["LEVELONE_EQUITIES"]["latency"]["count"], 2)
+        self.assertEqual((snapshot["baseline"], snapshot["missed"]), (20, 1))
+        self.assertEqual(snapshot["services"]["LEVELONE_EQUITIES"]["latency_excess"]["count"], 2)
+
+    def test_frames_are_stamped_before_processing(self):
+        stream = Stream(StubClient())
+        message = json.dumps({"data": [{"service": "LEVELONE_EQUITIES", "timestamp": 1, "command": "SUBS", "content": [{"key": "AMD"}]}]})
+        observe = stream.watchdog.observe
+        stream.watchdog.observe = lambda *args: (time.sleep(0.01), observe(*args))  # slow work after the frame arrived
+        before = time.perf_counter_ns()
+        asyncio.run(stream._receive(MessageWebsocket(message)))
+        received, arrived = stream._arrival
+        self.assertLess(arrived - before, 10 ** 7)  # stamped before the watchdog ran
+        metrics = StreamMetrics()
+        metrics.observe(message, received, time.perf_counter_ns() - arrived, 0)
+        self.assertGreaterEqual(metrics.snapshot()["services"]["LEVELONE_EQUITIES"]["queue"]["max"], 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import json
+import math
+import uuid
+import threading
+import unittest
+import multiprocessing
+from schwabdev.quote_table import QuoteTable
+
+
+def read_quote(name, symbol, results):
+    table = QuoteTable(name)
+    results.put(table.quote(symbol))
+    table.close()
+
+
+class TestQuoteTable(unittest.TestCase):
+
+    def setUp(self):
+        self.name = f"schwabdev-test-{uuid.uuid4().hex[:8]}"
+        self.writer = QuoteTable(self.name, create=True, capacity=4)
+
+    def tearDown(self):
+        self.writer.close()
+
+    def test_reader_sees_merged_rows(self):
+        self.writer(json.dumps({"data": [{"service": "LEVELONE_EQUITIES", "timestamp": 1, "command": "SUBS",
+                                          "content": [{"key": "AMD", "1": 150.25, "2": 150.3}]}]}))
+        self.writer.update("AMD", {"last": 150.27})
+        reader = QuoteTable(self.name)
+        try:
+            self.assertEqual(reader.quote("AMD"), (150.25, 150.3, 150.27))
+            self.assertTrue(math.isnan(reader.get("AMD")["bid_size"]))  # never received
+            self.assertIsNone(reader.get("INTC"))
+            self.writer.update("INTC", {"bid": 22.5})  # added after the reader attached
+            self.assertEqual(reader.symbols(), ["AMD", "INTC"])
+            with self.assertRaises(Exception):
+                reader.update("MU", {"bid": 1.0})
+        finally:
+            reader.close()
+
+    def test_reader_in_another_process(self):
+        self.writer.update("AMD", {"bid": 1.0, "ask": 2.0, "last": 1.5})
+        context = multiprocessing.get_context("spawn")
+        results = context.Queue()
+        process = context.Process(target=read_quote, args=(self.name, "AMD", results))
+        process.start()
+        self.assertEqual(results.get(timeout=30), (1.0, 2.0, 1.5))
+        process.join(30)
+
+    def test_rows_are_read_consistently_while_written(self):
+        reader = QuoteTable(self.name)
+        self.writer.update("AMD", {"bid": 0.0, "ask": 0.0, "last": 0.0})
+        stop = threading.Event()
+
+        def write():
+            i = 0
+            while not stop.is_set():
+                i += 1
+                self.writer.update("AMD", {"bid": float(i), "ask": float(i), "last": float(i)})
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        try:
+            for _ in range(20000):
+                bid, ask, last = reader.quote("AMD")
+                self.assertTrue(bid == ask == last)  # never a mix of two versions
+        finally:
+            stop.set()
+            writer.join(5)
+            reader.close()
+
+    def test_full_table_drops_new_symbols(self):
+        for i in range(5):
+            self.writer.update(f"S{i}", {"bid": float(i)})
+        self.assertEqual(len(self.writer), 4)
+        self.assertIsNone(self.writer.get("S4"))
+
+
+if __name__ == "__main__":
+    unittest.main()
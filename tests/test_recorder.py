@@ -0,0 +1,98 @@
+import os
+import json
+import tempfile
+import unittest
+import numpy
+from schwabdev import recorder as fmt
+from schwabdev.recorder import TickRecorder
+from schwabdev.archive import TickArchive
+
+DAY_NS = 1731596400 * 10 ** 9  # 2024-11-14 10:00 New York
+
+
+def level_one(key, ts, **fields):
+    return json.dumps({"data": [{"service": "LEVELONE_EQUITIES", "timestamp": ts, "command": "SUBS",
+                                 "content": [{"key": key, **fields}]}]}, separators=(",", ":"))
+
+
+class TestTickRecorder(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.recorder = TickRecorder(self.directory.name)
+
+    def tearDown(self):
+        self.recorder.stop()
+        self.directory.cleanup()
+
+    def record(self, messages):
+        for i, message in enumerate(messages):
+            self.recorder.record(message, DAY_NS + i * 1000000)
+        self.recorder.flush()
+
+    def read(self, service="LEVELONE_EQUITIES"):
+        with open(os.path.join(self.directory.name, "2024-11-14", f"{service}.seg"), "rb") as f:
+            return f.read()
+
+    def test_messages_are_rebuilt_exactly(self):
+        messages = [level_one("AMD", 1731596400000, **{"1": 150.25, "2": 150.3, "8": 1200, "49": False}),
+                    level_one("INTC", 1731596400001, **{"1": 22.5, "25": "Intel Corp", "33": None}),
+                    json.dumps({"data": [{"service": "LEVELONE_EQUITIES", "timestamp": 1731596400002, "command": "SUBS",
+                                          "content": [{"1": 1.5, "key": "MU"}, {"key": "NVDA"}, {"key": "AMD", "x": [1, {"y": "é"}]}]},
+                                         {"service": "CHART_EQUITY", "timestamp": 1731596400003, "command": "SUBS",
+                                          "content": [{"key": "AMD", "seq": 7, "1": 150.0, "7": 1731596400000}]}]}),
+                    '{"notify": [{"heartbeat": "1731596400004"}]}',
+                    level_one("AMD", 1731596400005, **{"1": 150.5})]
+        self.record(messages)
+        with TickArchive(self.directory.name) as archive:
+            self.assertEqual([message for _, message in archive.messages("2024-11-14")], messages)
+            times, prices = archive.series("LEVELONE_EQUITIES", "AMD", 1)
+            self.assertEqual(list(times), [1731596400000, 1731596400005])
+            self.assertEqual(list(prices), [150.25, 150.5])
+            updates = list(archive.updates("LEVELONE_EQUITIES", "INTC"))
+            self.assertEqual(updates, [{"timestamp": 1731596400001, "key": "INTC", "1": 22.5, "25": "Intel Corp", "33": None}])
+
+    def test_query_uses_cached_block_state(self):
+        self.record([level_one(key, 1731596400000 + i, **{"1": float(i)}) for i, key in enumerate(["AMD", "INTC", "MU", "AMD", "INTC"])])
+        with TickArchive(self.directory.name) as archive:
+            results = archive.query("LEVELONE_EQUITIES", None, 1731596400001, 1731596400003)
+            self.assertEqual(len(results), 1)
+            block, rows = results[0]
+            self.assertTrue(block.ordered)
+            self.assertEqual(list(rows["value"]), [1.0, 2.0, 3.0])  # a slice of the rows in frame order
+            self.assertTrue(numpy.shares_memory(rows, block.by_frame()[0]))
+            self.assertEqual([float(row["value"]) for _, rows in archive.query("LEVELONE_EQUITIES", "AMD") for row in rows], [0.0, 3.0])
+
+    def test_messages_in_a_time_range_only_decode_their_blocks(self):
+        messages = [level_one("AMD", 1731596400000 + i, **{"1": float(i)}) for i in range(10)]
+        for i, message in enumerate(messages):
+            self.recorder.record(message, DAY_NS + i * 1000000)
+            if i % 2:  # one block per two messages
+                self.recorder.flush()
+        with TickArchive(self.directory.name) as archive:
+            start = DAY_NS // 1000000
+            self.assertEqual([message for _, message in archive.messages("2024-11-14", None, start + 5, start + 6)], messages[5:7])
+            blocks = archive.segment("2024-11-14", "LEVELONE_EQUITIES").blocks
+            self.assertEqual(len(blocks), 5)
+            self.assertIsNone(blocks[0]._tables)
+            self.assertIsNone(blocks[4]._tables)
+
+    def test_rows_are_compact(self):
+        self.record([level_one("AMD", 1731596400000 + i, **{"1": 150.0 + i / 100, "2": 150.01 + i / 100, "8": 1000 + i}) for i in range(1000)])
+        # 3000 field values in 1000 frames: 8 bytes per float, a few bytes per int, one byte per other column of a row, and about
+        # 11 bytes per frame (fixed size rows took 24 bytes per value, plus a row for each key and 40 bytes per frame)
+        self.assertLess(len(self.read()), 3000 * 16)
+
+    def test_corrupt_block_is_skipped(self):
+        self.record([level_one("AMD", 1731596400000, **{"1": 1.0})])
+        self.record([level_one("AMD", 1731596400001, **{"1": 2.0})])
+        data = bytearray(self.read())
+        self.assertEqual(len(fmt.scan(data)), 2)
+        data[fmt.HEADER.size + 20] ^= 0xFF  # damage the payload of the first block
+        blocks = fmt.scan(data)
+        self.assertEqual(len(blocks), 1)
+        self.assertEqual(blocks[0][1][8], 1731596400001)
+
+
+if __name__ == "__main__":
+    unittest.main()
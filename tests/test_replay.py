@@ -0,0 +1,59 @@
+import json
+import time
+import tempfile
+import unittest
+from schwabdev.recorder import TickRecorder
+from schwabdev.replay import StreamReplayer
+
+DAY_NS = 1731596400 * 10 ** 9  # 2024-11-14 10:00 New York
+
+
+def level_one(key, ts, **fields):
+    return json.dumps({"data": [{"service": "LEVELONE_EQUITIES", "timestamp": ts, "command": "SUBS",
+                                 "content": [{"key": key, **fields}]}]}, separators=(",", ":"))
+
+
+class TestStreamReplayer(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        recorder = TickRecorder(self.directory.name)
+        self.messages = [level_one("AMD", 1731596400000 + i * 100, **{"1": float(i)}) for i in range(5)]
+        for i, message in enumerate(self.messages):
+            recorder.record(message, DAY_NS + i * 100000000)  # 100 ms apart
+        recorder.record('{"notify": [{"heartbeat": "1731596400400"}]}', DAY_NS + 400000000)
+        recorder.stop()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_speed_multiplier_and_clock(self):
+        replayer = StreamReplayer(self.directory.name, services=["LEVELONE_EQUITIES"], speed=10)
+        received = []
+        start = time.perf_counter()
+        count = replayer.run(lambda message: received.append((replayer.clock.time(), message)))
+        elapsed = time.perf_counter() - start
+        self.assertEqual(count, 5)
+        self.assertEqual([message for _, message in received], self.messages)
+        self.assertEqual([round(t - DAY_NS / 1e9, 3) for t, _ in received], [0.0, 0.1, 0.2, 0.3, 0.4])  # simulated time
+        self.assertGreaterEqual(elapsed, 0.04 - 0.005)  # 400 ms of recording at 10x
+        self.assertLess(elapsed, 1.0)
+
+    def test_time_range_and_all_services(self):
+        replayer = StreamReplayer(self.directory.name, start=DAY_NS // 1000000 + 200, end=DAY_NS // 1000000 + 400)
+        received = []
+        self.assertEqual(replayer.run(received.append), 4)  # as fast as possible
+        self.assertEqual(received, self.messages[2:5] + ['{"notify": [{"heartbeat": "1731596400400"}]}'])  # in the order received
+
+    def test_stop(self):
+        replayer = StreamReplayer(self.directory.name, speed=0.001)  # 400 seconds at this speed
+        received = []
+        replayer.start(received.append)
+        time.sleep(0.05)
+        replayer.stop()
+        self.assertFalse(replayer.active)
+        self.assertEqual(len(received), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import json
+import threading
+import unittest
+from schwabdev.router import StreamRouter
+
+
+def data(*services):
+    return json.dumps({"data": [{"service": service, "timestamp": 1, "command": "SUBS", "content": [{"key": key}]} for service, key in services]})
+
+
+class TestStreamRouter(unittest.TestCase):
+
+    def test_priority_lane_is_not_queued_behind_bulk(self):
+        release = threading.Event()
+        bulk, urgent = [], threading.Event()
+        router = StreamRouter()
+        router.route("LEVELONE_EQUITIES", lambda message: (bulk.append(message["data"][0]["content"][0]["key"]), release.wait(5)))
+        router.route("ACCT_ACTIVITY", lambda message: urgent.set())
+        for i in range(100):
+            router(data(("LEVELONE_EQUITIES", str(i))))
+        router(data(("ACCT_ACTIVITY", "fill")))
+        self.assertTrue(urgent.wait(5))  # delivered while the bulk lane is stuck on its first message
+        self.assertLessEqual(len(bulk), 1)
+        release.set()
+        router.stop(5)
+        self.assertEqual(bulk, [str(i) for i in range(100)])  # the bulk lane keeps the order
+        stats = router.stats()
+        self.assertEqual((stats["priority"]["delivered"], stats["bulk"]["delivered"]), (1, 100))
+
+    def test_messages_are_split_by_service(self):
+        received = {"LEVELONE_EQUITIES": [], "ACCT_ACTIVITY": [], "default": []}
+        router = StreamRouter(default=received["default"].append)
+        router.route("levelone_equities", received["LEVELONE_EQUITIES"].append)  # services are not case sensitive
+        router.route("ACCT_ACTIVITY", received["ACCT_ACTIVITY"].append)
+        router(data(("LEVELONE_EQUITIES", "AMD"), ("ACCT_ACTIVITY", "fill"), ("CHART_EQUITY", "AMD")))
+        router('{"notify": [{"heartbeat": "1"}]}')
+        router.stop(5)
+        self.assertEqual([m["data"][0]["service"] for m in received["LEVELONE_EQUITIES"]], ["LEVELONE_EQUITIES"])
+        self.assertEqual(received["ACCT_ACTIVITY"][0]["data"][0]["content"], [{"key": "fill"}])
+        self.assertEqual(received["default"], [{"data": [{"service": "CHART_EQUITY", "timestamp": 1, "command": "SUBS", "content": [{"key": "AMD"}]}]},
+                                               {"notify": [{"heartbeat": "1"}]}])
+
+    def test_unroute(self):
+        received = []
+        router = StreamRouter(default=lambda message: received.append("default"))
+        handler = lambda message: received.append("handler")
+        router.route("LEVELONE_EQUITIES", handler)
+        router.unroute("LEVELONE_EQUITIES", handler)
+        router(data(("LEVELONE_EQUITIES", "AMD")))
+        router.stop(5)
+        self.assertEqual(received, ["default"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import time
+import types
+import datetime
+import threading
+import unittest
+from schwabdev.tokens import Tokens
+from schwabdev.scheduler import Scheduler
+
+
+class TestScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = Scheduler()
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def test_call_later_order(self):
+        done = threading.Event()
+        calls = []
+        self.scheduler.call_later(0.03, lambda: (calls.append("b"), done.set()))
+        self.scheduler.call_later(0.01, calls.append, "a")
+        self.assertTrue(done.wait(5))
+        self.assertEqual(calls, ["a", "b"])
+
+    def test_cancel(self):
+        calls = []
+        job = self.scheduler.call_later(0.02, calls.append, "a")
+        job.cancel()
+        time.sleep(0.05)
+        self.assertEqual(calls, [])
+
+    def test_missed_runs_are_skipped_on_the_grid(self):
+        runs = []
+        start = time.monotonic()
+        job = self.scheduler.every(0.02, lambda: (runs.append(time.monotonic()), time.sleep(0.05) if len(runs) == 1 else None), first=0)
+        while len(runs) < 3 and time.monotonic() - start < 5:
+            time.sleep(0.005)
+        job.cancel()
+        self.assertGreaterEqual(runs[1] - runs[0], 0.05)  # the runs missed while the first one slept were skipped, not run late
+        self.assertLess(runs[2] - runs[1], 0.035)  # the run after stays on the grid
+        self.assertAlmostEqual((job.deadline - start) / 0.02, round((job.deadline - start) / 0.02), delta=0.25)
+
+
+
+class TestTokenUpdates(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = Scheduler()
+        self.tokens = Tokens.__new__(Tokens)  # no files or network, only what the scheduled update uses
+        self.tokens._client = types.SimpleNamespace(scheduler=self.scheduler)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        self.tokens._access_token_timeout, self.tokens._access_token_issued = 1800, now
+        self.tokens._refresh_token_timeout, self.tokens._refresh_token_issued = 7 * 24 * 3600, now
+        self.threads = []
+        self.updated = threading.Event()
+        self.tokens.update_tokens = lambda: (self.threads.append(threading.current_thread().name), self.updated.set())
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def test_access_token_update_runs_on_the_scheduler(self):
+        self.tokens._scheduled_update()
+        self.assertEqual(self.threads, ["MainThread"])
+        self.assertEqual(len(self.scheduler.jobs()), 1)  # next check
+
+    def test_refresh_token_update_runs_on_its_own_thread(self):
+        self.tokens._refresh_token_issued -= datetime.timedelta(days=7)  # expired, the update asks the user
+        self.tokens._scheduled_update()
+        self.assertTrue(self.updated.wait(5))
+        self.assertEqual(self.threads, ["Tokens"])
+
+
+if __name__ == "__main__":
+    unittest.main()
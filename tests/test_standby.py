@@ -0,0 +1,84 @@
+import json
+import time
+import unittest
+import threading
+from schwabdev.stream import Stream
+from local_streamer import LocalStreamer
+from stubs import StubClient
+
+
+def wait_until(condition, timeout: float = 10.0) -> bool:
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class TestStandbyFailover(unittest.TestCase):
+
+    def setUp(self):
+        self.server = LocalStreamer().start()
+        self.stream = Stream(StubClient())
+        self.server.attach(self.stream)
+        self.stream.backoff_time = 0.05
+        self.messages = []
+        self.lock = threading.Lock()
+
+    def tearDown(self):
+        self.stream.stop()
+        self.server.stop()
+        if self.stream._thread is not None:
+            self.stream._thread.join(5)
+
+    def receive(self, message):
+        with self.lock:
+            self.messages.append(json.loads(message))
+
+    def data(self) -> list:
+        with self.lock:
+            return [content["1"] for message in self.messages for data in message.get("data", []) for content in data["content"]]
+
+    def responses(self, command: str) -> int:
+        with self.lock:
+            return sum(response["command"] == command for message in self.messages for response in message.get("response", []))
+
+    def publish(self, value, timestamp: int):
+        self.server.publish("LEVELONE_EQUITIES", {"key": "AMD", "1": value}, timestamp=timestamp)
+
+    def test_drop_one_connection_loses_and_duplicates_nothing(self):
+        self.stream.send(self.stream.level_one_equities("AMD", "0,1"))
+        self.stream.start(self.receive, standby=True)
+        self.assertTrue(self.server.wait_for_connections(2))
+        self.assertTrue(wait_until(lambda: all(connection["subscriptions"].get("LEVELONE_EQUITIES") for connection in self.server._connections)))
+        self.assertEqual(self.responses("LOGIN"), 1)  # the second connection's responses are not delivered
+
+        expected = []
+        for i in range(20):
+            expected.append(i)
+            self.publish(i, 1000 + i)
+        expected.append(19)
+        self.publish(19, 1019)  # a genuine repeat is delivered again
+        self.assertTrue(wait_until(lambda: len(self.data()) >= len(expected)))
+
+        self.server.drop(0)
+        for i in range(20, 40):
+            expected.append(i)
+            self.publish(i, 1000 + i)
+        self.assertTrue(wait_until(lambda: len(self.data()) >= len(expected)))
+
+        self.assertTrue(wait_until(lambda: sum(request["command"] == "LOGIN" for request in self.server.received) == 3))  # the dropped connection reconnects
+        self.assertTrue(self.server.wait_for_connections(2))
+        self.assertTrue(wait_until(lambda: all(connection["subscriptions"].get("LEVELONE_EQUITIES") for connection in self.server._connections)))
+        for i in range(40, 60):
+            expected.append(i)
+            self.publish(i, 1000 + i)
+        self.assertTrue(wait_until(lambda: len(self.data()) >= len(expected)))
+        time.sleep(0.2)  # any duplicates would have arrived by now
+        self.assertEqual(self.data(), expected)
+        self.assertEqual(self.responses("LOGIN"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
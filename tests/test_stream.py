@@ -0,0 +1,152 @@
+import os
+import json
+import asyncio
+import unittest
+import tempfile
+import threading
+import concurrent.futures
+import websockets
+from schwabdev.stream import Stream
+from stubs import StubClient
+
+
+class TestCoalesce(unittest.TestCase):
+
+    def setUp(self):
+        self.stream = Stream(StubClient())
+
+    def test_opposing_requests_cancel_without_changing_callers_requests(self):
+        add = self.stream.level_one_equities("AMD,INTC", "0,1")
+        unsubs = self.stream.level_one_equities("AMD", "", command="UNSUBS")
+        entries = [[add, concurrent.futures.Future(), {"AMD": None, "INTC": None}], [unsubs, concurrent.futures.Future(), {"AMD": None}]]
+        to_send = self.stream._coalesce(entries)
+        self.assertEqual([request["parameters"]["keys"] for request in to_send], ["INTC"])
+        self.assertEqual(add["parameters"]["keys"], "AMD,INTC")  # the caller's requests are reused, so never changed
+        self.assertEqual(unsubs["parameters"]["keys"], "AMD")
+        self.assertIsNone(entries[1][1].result(0))  # cancelled out
+
+    def queue(self, *requests):
+        entries = []
+        for request in requests:
+            info = self.stream._coalesce_info(request)
+            self.stream._record_request(request)
+            entries.append([request, concurrent.futures.Future(), info])
+        return self.stream._coalesce(entries)
+
+    def test_repeated_add_then_unsubs_sends_nothing(self):
+        add = self.stream.level_one_equities("AMD", "0,1")
+        to_send = self.queue(add, add, self.stream.level_one_equities("AMD", "", command="UNSUBS"))
+        self.assertEqual(to_send, [])
+        self.assertEqual(self.stream.subscriptions.to_dict(), {})
+
+    def test_net_change_is_sent(self):
+        self.queue(self.stream.level_one_equities("AMD", "0,1"))
+        unsubs = self.stream.level_one_equities("AMD", "", command="UNSUBS")
+        to_send = self.queue(unsubs, self.stream.level_one_equities("AMD", "0,1"), unsubs)
+        self.assertEqual([(request["command"], request["parameters"]["keys"]) for request in to_send], [("UNSUBS", "AMD")])
+        to_send = self.queue(self.stream.level_one_equities("AMD", "0"), unsubs, self.stream.level_one_equities("AMD", "2"))
+        self.assertEqual([(request["command"], request["parameters"]["keys"]) for request in to_send], [("ADD", "AMD")])
+        self.assertEqual(to_send[0]["parameters"]["fields"], "2")
+        self.assertEqual(self.stream.subscriptions.fields("LEVELONE_EQUITIES", "AMD"), ["2"])
+
+
+class FakeWebsocket:
+
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, frame):
+        self.sent.append(frame)
+
+
+class ClosingWebsocket(FakeWebsocket):
+
+    async def recv(self):
+        raise websockets.exceptions.ConnectionClosedError(None, None)
+
+
+class TestConnectionState(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "subscriptions.json")
+        self.stream = Stream(StubClient(), subscriptions_file=self.path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_flush_writes_subscriptions_off_the_loop(self):
+        threads = []
+        save = self.stream._save_subscriptions
+        self.stream._save_subscriptions = lambda: threads.append(threading.current_thread()) or save()
+        websocket = FakeWebsocket()
+
+        async def flush():
+            self.stream._send_lock = asyncio.Lock()
+            self.stream._on_connect(websocket)
+            self.stream._enqueue(self.stream.level_one_equities("AMD", "0,1"))
+            await self.stream._flush()
+
+        asyncio.run(flush())
+        self.assertEqual(len(websocket.sent), 1)
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.current_thread())
+        with open(self.path) as f:
+            self.assertEqual(json.load(f), {"LEVELONE_EQUITIES": {"0,1": ["AMD"]}})
+
+    def test_flush_before_connecting_sends_nothing(self):
+        async def flush():
+            self.stream._send_lock = asyncio.Lock()
+            futures = self.stream._enqueue(self.stream.level_one_equities("AMD", "0,1"))
+            with self.assertNoLogs("Schwabdev.Stream", level="ERROR"):
+                await self.stream._flush()
+            return futures
+
+        futures = asyncio.run(flush())
+        self.assertIsNone(futures[0].result(0))  # sent with the login instead
+        self.assertTrue(self.stream.subscriptions.has("LEVELONE_EQUITIES", "AMD"))
+
+    def test_lost_connection_ends_iteration(self):
+        websocket = ClosingWebsocket()
+        self.stream._on_connect(websocket)
+        self.stream.active = True
+
+        async def receive():
+            with self.assertLogs("Schwabdev.Stream", level="ERROR"):
+                return [message async for message in self.stream]
+
+        self.assertEqual(asyncio.run(receive()), [])
+        self.assertFalse(self.stream.active)
+        self.assertIsNotNone(self.stream._disconnect_time)
+
+    def test_stop_writes_logout_before_returning(self):
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever)
+        thread.start()
+        try:
+            websocket = FakeWebsocket()
+            self.stream.send_window = 60  # the logout must not wait for the window
+            self.stream._loop = loop
+            self.stream._send_lock = asyncio.Lock()
+            self.stream._on_connect(websocket)
+            self.stream.active = True
+            self.stream.stop()
+            self.assertEqual([json.loads(frame)["requests"][0]["command"] for frame in websocket.sent], ["LOGOUT"])
+            self.assertFalse(self.stream.active)
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(5)
+            loop.close()
+
+    def test_reconnect_time_only_after_unexpected_disconnects(self):
+        websocket = FakeWebsocket()
+        self.stream._on_connect(websocket)
+        self.stream._on_disconnect(websocket, clean=True)
+        self.assertIsNone(self.stream._disconnect_time)
+        self.stream._on_connect(websocket)
+        self.stream._on_disconnect(websocket)
+        self.assertIsNotNone(self.stream._disconnect_time)
+
+
+if __name__ == "__main__":
+    unittest.main()
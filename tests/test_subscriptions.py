@@ -0,0 +1,60 @@
+import unittest
+from schwabdev.stream import Stream
+from stubs import StubClient
+
+
+class TestSubscriptionManager(unittest.TestCase):
+
+    def setUp(self):
+        self.stream = Stream(StubClient())  # not connected, requests are only recorded
+        self.manager = self.stream.manager
+        self.sent = []
+        send = self.stream.send
+        self.stream.send = lambda requests: self.sent.extend(requests if isinstance(requests, list) else [requests]) or send(requests)
+
+    def test_reference_counts(self):
+        self.manager.subscribe("a", "LEVELONE_EQUITIES", "AMD,INTC", "0,1")
+        self.manager.subscribe("b", "LEVELONE_EQUITIES", "AMD", "0,1")
+        self.assertEqual(len(self.sent), 1)
+        self.manager.release("a")
+        self.assertEqual(self.sent[-1]["command"], "UNSUBS")
+        self.assertEqual(self.sent[-1]["parameters"]["keys"], "INTC")
+        self.assertEqual(self.manager.usage(), {"LEVELONE_EQUITIES": 1})
+
+    def test_direct_subscriptions_are_not_unsubscribed(self):
+        self.stream.send(self.stream.level_one_equities("AMD", "0,1"))
+        self.manager.subscribe("a", "LEVELONE_EQUITIES", "AMD,INTC", "2")
+        adds = {request["parameters"]["keys"]: request["parameters"]["fields"] for request in self.sent[1:]}
+        self.assertEqual(adds, {"AMD": "0,1,2", "INTC": "2"})  # the fields of the direct subscription are kept
+        self.manager.release("a")
+        self.assertEqual(self.sent[-1]["parameters"]["keys"], "INTC")
+        self.assertTrue(self.stream.subscriptions.has("LEVELONE_EQUITIES", "AMD"))
+        self.assertFalse(self.stream.subscriptions.has("LEVELONE_EQUITIES", "INTC"))
+
+    def test_key_limit_counts_direct_subscriptions(self):
+        self.manager.max_keys = 3
+        self.stream.send(self.stream.level_one_equities("AMD,INTC", "0"))
+        self.manager.subscribe("a", "LEVELONE_EQUITIES", "AMD,MU", "0")  # AMD is already counted
+        with self.assertRaises(Exception):
+            self.manager.subscribe("a", "LEVELONE_EQUITIES", "NVDA", "0")
+        self.assertFalse(self.stream.subscriptions.has("LEVELONE_EQUITIES", "NVDA"))
+
+
+class TestSubscriptionRegistry(unittest.TestCase):
+
+    def test_live_view(self):
+        stream = Stream(StubClient())
+        stream.send(stream.level_one_equities("AMD", "0,1"))
+        stream.subscriptions["LEVELONE_EQUITIES"]["INTC"] = ["0", "2"]
+        self.assertEqual(stream.subscriptions.fields("LEVELONE_EQUITIES", "INTC"), ["0", "2"])
+        del stream.subscriptions["LEVELONE_EQUITIES"]["AMD"]
+        self.assertFalse(stream.subscriptions.has("LEVELONE_EQUITIES", "AMD"))
+        stream.subscriptions["CHART_EQUITY"] = {}
+        stream.subscriptions["CHART_EQUITY"]["AMD"] = "0,1"
+        self.assertEqual(stream.subscriptions.to_dict(), {"LEVELONE_EQUITIES": {"INTC": ["0", "2"]}, "CHART_EQUITY": {"AMD": ["0", "1"]}})
+        with self.assertRaises(AttributeError):
+            stream.subscriptions["CHART_EQUITY"]["AMD"].append("2")  # fields are a tuple, changes are never silently lost
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import types
+import datetime
+import threading
+import unittest
+from schwabdev.client import Client
+from schwabdev.warmup import Warmup
+
+
+class Response:
+
+    def __init__(self, body, status_code=200):
+        self.body, self.status_code, self.ok, self.text = body, status_code, status_code == 200, str(body)
+
+    def json(self):
+        return self.body
+
+
+class ConcurrentSession:
+    """Session stand-in, each GET waits until `connections` requests are in flight at once"""
+
+    def __init__(self, connections: int):
+        self.barrier = threading.Barrier(connections)
+        self.calls = 0
+
+    def get(self, url, headers=None, params=None, timeout=None):
+        self.calls += 1
+        self.barrier.wait(5)  # broken (an exception) if the requests are sent one after another
+        return Response([{"accountNumber": "123", "hashValue": "ABC"}])
+
+
+class StubClient:
+    """Client stand-in, only what the warmup uses"""
+
+    _base_api_url = "https://api.schwabapi.com"
+    _format_list = Client._format_list
+
+    def __init__(self, connections: int, instruments_ok: bool = True):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        self.timeout = 5
+        self.refreshed = []
+        self.tokens = types.SimpleNamespace(access_token="token", _access_token_timeout=1800, _refresh_token_timeout=7 * 24 * 3600,
+                                            _access_token_issued=now - datetime.timedelta(seconds=1500), _refresh_token_issued=now,
+                                            update_access_token=lambda: self.refreshed.append("access"),
+                                            update_tokens=lambda: self.refreshed.append("refresh"))
+        self._session = ConcurrentSession(connections)
+        self.stream = types.SimpleNamespace(active=True, _get_streamer_info=lambda: True)
+        self.instruments_ok = instruments_ok
+
+    def instruments(self, symbols, projection):
+        if not self.instruments_ok:
+            return Response({}, 500)
+        return Response({"instruments": [{"symbol": symbol} for symbol in symbols.split(",")]})
+
+
+class StubCalendar:
+
+    timezone = datetime.timezone.utc
+
+    def __init__(self):
+        self.loaded = []
+
+    def load(self, date):
+        self.loaded.append(date)
+
+
+class TestWarmup(unittest.TestCase):
+
+    def test_run_primes_every_step(self):
+        client = StubClient(connections=3)
+        warmup = Warmup(client, ["SPY", "QQQ"], calendar=StubCalendar(), connections=3, keepalive=0)
+        timings = warmup.run()
+        self.assertEqual(set(timings), {"tokens", "connections", "streamer_info", "market_hours", "instruments", "stream"})
+        self.assertNotIn(None, timings.values())
+        self.assertEqual(client.refreshed, ["access"])  # expires within the 900 second window
+        self.assertEqual(client._session.calls, 3)  # one request per connection, all in flight at once
+        self.assertEqual(warmup.accounts, {"123": "ABC"})
+        self.assertEqual(set(warmup.instruments), {"SPY", "QQQ"})
+        self.assertEqual(len(warmup.calendar.loaded), 1)
+
+    def test_failed_step_does_not_stop_the_others(self):
+        client = StubClient(connections=2, instruments_ok=False)
+        warmup = Warmup(client, "SPY", calendar=StubCalendar(), keepalive=0)
+        with self.assertLogs("Schwabdev.Warmup", level="ERROR") as logs:
+            timings = warmup.run()
+        self.assertIsNone(timings["instruments"])
+        self.assertIsNotNone(timings["stream"])
+        self.assertIn("[Schwabdev] Instruments request failed (500)", logs.output[0])
+
+    def test_keepalive_uses_every_connection(self):
+        client = StubClient(connections=4)
+        warmup = Warmup(client, calendar=StubCalendar(), connections=4, keepalive=0)
+        warmup._ping()
+        self.assertEqual(client._session.calls, 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
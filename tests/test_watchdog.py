@@ -0,0 +1,53 @@
+import json
+import unittest
+from unittest import mock
+from schwabdev.stream import Stream
+from stubs import StubClient
+
+
+def level_one(*keys):
+    return json.dumps({"data": [{"service": "LEVELONE_EQUITIES", "timestamp": 1, "command": "SUBS",
+                                 "content": [{"key": key, "1": 1.0} for key in keys]}]})
+
+
+class TestStreamWatchdog(unittest.TestCase):
+
+    def setUp(self):
+        self.stream = Stream(StubClient())
+        self.stream.send(self.stream.level_one_equities("AMD,INTC", "0,1"))
+        self.watchdog = self.stream.watchdog
+        self.now = 1000.0
+        patcher = mock.patch("schwabdev.watchdog.time.monotonic", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def feed(self, connection, count: int, interval: float = 1.0):
+        for _ in range(count):
+            self.now += interval
+            self.watchdog.observe(level_one("AMD"), connection)
+
+    def test_observe_finds_services_and_keys(self):
+        self.watchdog.observe(level_one("AMD", "INTC"), "a")
+        self.assertEqual(self.watchdog.stats()["LEVELONE_EQUITIES"]["messages"], 1)
+        self.assertEqual(set(self.watchdog.staleness()["LEVELONE_EQUITIES"]), {"AMD", "INTC"})
+        self.assertEqual(self.watchdog.staleness()["LEVELONE_EQUITIES"]["AMD"], 0)
+
+    def test_quiet_service_stops_reconnecting(self):
+        self.watchdog.begin("a")
+        self.feed("a", 25)
+        self.assertIsNone(self.watchdog.check("a"))
+        self.now += 31
+        self.assertEqual(self.watchdog.check("a")[0], "LEVELONE_EQUITIES")
+        self.watchdog.end("a")
+        self.watchdog.begin("b")  # reconnected, the service stays quiet (e.g. the market closed)
+        self.now += 1000
+        self.assertIsNone(self.watchdog.check("b"))
+        self.assertEqual(self.watchdog.stalls, 1)
+        self.feed("b", 1)  # data arrives again, the service is checked again with the same limit
+        self.assertEqual(self.watchdog.threshold("LEVELONE_EQUITIES"), 30)
+        self.now += 31
+        self.assertIsNotNone(self.watchdog.check("b"))
+
+
+if __name__ == "__main__":
+    unittest.main()